@@ -1,26 +1,48 @@
 # standard libraries
+import json
 import os
-from typing import Optional
+import shutil
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import zipfile
 
 
 class Batch:
     """
     Manage batches, which are a sequence of subdirectories named batch00001, batch00002 and so forth.
+    Alternatively, a batch can be a single zip archive named batch00001.zip and so forth.
+
+    The last batch number is kept in a small index file next to them, so the next one is found without scanning the
+    directory, and the batches are listed in a log that is only ever appended to. If either is missing it is rebuilt
+    from the batch directories and archives found.
     """
 
     number: int or None
     path: str or None
     directory: str or None
     path_directory: str or None
+    path_archive: str or None = None
+    _zip: "zipfile.ZipFile" or None = None
     _prefix: str = 'batch'
-    _digits: int = 5
+    _digits: int = 5                # the default minimum width of the number in the name
+    index_name: str = 'rand-sn-batches.json'      # the last batch number and the digits in names
+    log_name: str = 'rand-sn-batches.jsonl'       # a record whenever a batch is started, finished or deleted
+    _archive_extension: str = '.zip'
+    _part: str = '.part'
+    _stored_extensions = ('.png', '.pdf')   # already compressed
 
-    def __init__(self, path: Optional[str] = None) -> None:
+    def __init__(self, path: Optional[str] = None, archive: bool = False, digits: Optional[int] = None,
+                 number: Optional[int] = None) -> None:
         """
-        Initialize FullCycleRandom instance.
+        Initialize Batch instance.
 
         Args:
             path (str): the path where the batch directory will be stored, defaults to the current working directory
+            archive (bool): store the batch in a zip archive instead of a directory
+            digits (int): the minimum width of the number in the name, remembered in the index, default 5
+            number (int): the number of an unfinished batch directory to carry on with, instead of starting a new one
 
         Returns:
             None
@@ -29,45 +51,275 @@ class Batch:
             path = os.getcwd()
         elif not os.path.isdir(path):
             raise ValueError(f"Path {path} is not a directory.")
+        if digits is not None and (not isinstance(digits, int) or digits < 1):
+            raise ValueError("The number of digits must be greater than 0.")
         self.path = path
+        self.archive = archive
+        self.path_index = os.path.join(self.path, self.index_name)
+        self.path_log = os.path.join(self.path, self.log_name)
+
+        index = self._load_index()
+        if number is not None:
+            self._reopen(index, number)
+            return
 
-        self.number = self._next_number()
+        # reserve the next number in the index straight away, so unfinished batches count
+        if digits is not None:
+            index['digits'] = digits
+        self._digits = index['digits']
+        self.number = index['last'] + 1
         self.directory = f"{self._prefix}{str(self.number).zfill(self._digits)}"
-        self.path_directory = os.path.join(self.path, self.directory)
+        if archive:
+            # the archive only gets its final name when closed, a hidden directory holds the files that are streamed
+            self.path_archive = os.path.join(self.path, self.directory + self._archive_extension)
+            import zipfile  # here rather than at the top, only archives need it
+            self._zip = zipfile.ZipFile(self.path_archive + self._part, 'x', allowZip64=True)
+            self.path_directory = os.path.join(self.path, f".{self.directory}{self._part}")
+        else:
+            self.path_directory = os.path.join(self.path, self.directory)
         os.mkdir(self.path_directory)
+        index['last'] = self.number
+        self._save_index(index)
+        self._log({'number': self.number, 'name': self.directory + (self._archive_extension if archive else '')})
+
+    def write(self, name: str, data: bytes) -> None:
+        """
+        Write a file into the batch, straight into the archive when there is one.
+
+        Args:
+            name (str): the file name
+            data (bytes): the file's contents
+
+        Returns:
+            None
+        """
+        if self.archive:
+            self._zip.writestr(self._zip_info(name), data)
+        else:
+            with open(os.path.join(self.path_directory, name), 'wb') as f:
+                f.write(data)
+
+    def close(self) -> None:
+        """
+        Finish the batch. For an archive, move the files in path_directory into it, give it its final name and
+        remove path_directory.
+
+        Returns:
+            None
+        """
+        if self.archive and self._zip is not None:
+            for name in sorted(os.listdir(self.path_directory)):
+                self._zip.write(os.path.join(self.path_directory, name), arcname=name,
+                                compress_type=self._zip_info(name).compress_type)
+            self._zip.close()
+            self._zip = None
+            os.replace(self.path_archive + self._part, self.path_archive)
+            shutil.rmtree(self.path_directory)
+            self.path_directory = None
+
+    def record(self, count: int, seed_from: int, seed_to: int, position_from: Optional[int] = None) -> None:
+        """
+        Record a finished batch in the log: how many serial numbers it holds and where they are in the cycle.
+
+        Args:
+            count (int): how many serial numbers
+            seed_from (int): the seed the batch started from, its first serial number is the one after it
+            seed_to (int): the last serial number, the seed the next batch starts from
+            position_from (int): how many serial numbers were issued before the batch
+
+        Returns:
+            None
+        """
+        record = {'number': self.number, 'count': count, 'seed_from': seed_from, 'seed_to': seed_to}
+        if position_from is not None:
+            record['position_from'] = position_from
+        self._log(record)
+
+    @classmethod
+    def entries(cls, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List the batches in the log, without starting a new one.
+
+        Args:
+            path (str): the path where the batches are, defaults to the current working directory
+
+        Returns:
+            List[Dict[str, Any]]: an entry per batch, finished ones have their count and seeds
+        """
+        batch = cls.__new__(cls)
+        batch.path = os.getcwd() if path is None else path
+        batch.path_index = os.path.join(batch.path, cls.index_name)
+        batch.path_log = os.path.join(batch.path, cls.log_name)
+        return batch._entries()
 
     def delete(self) -> None:
         """
-        Delete the current directory and contents, useful for aborting a batch.
+        Delete the current directory and contents, or archive, useful for aborting a batch, even once closed.
 
         Returns:
             None
         """
-        if self.path_directory is not None:
-            os.rmdir(self.path_directory)
+        if self.number is not None:
+            if self.path_directory is not None:
+                shutil.rmtree(self.path_directory)
+            if self.archive:
+                if self._zip is not None:
+                    self._zip.close()
+                    self._zip = None
+                # the archive has its final name once closed, unless closing it was cut short
+                for path_file in (self.path_archive + self._part, self.path_archive):
+                    if os.path.exists(path_file):
+                        os.remove(path_file)
+
+            # free the number, unless a later batch has been started since
+            self._log({'number': self.number, 'deleted': True})
+            index = self._load_index()
+            if index['last'] == self.number:
+                index['last'] = max((entry['number'] for entry in self._entries()), default=0)
+                self._save_index(index)
+
             self.number = None
             self.path = None
             self.directory = None
             self.path_directory = None
+            self.path_archive = None
+
+    def _zip_info(self, name: str) -> "zipfile.ZipInfo":
+        """
+        Describe a file in the archive, images are stored as is and everything else is compressed.
+
+        Args:
+            name (str): the file name
+
+        Returns:
+            zipfile.ZipInfo: the file's entry
+        """
+        import zipfile  # here rather than at the top, only archives need it
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        if name.endswith(self._stored_extensions):
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+        return info
+
+    def _reopen(self, index: Dict[str, Any], number: int) -> None:
+        """
+        Carry on with an unfinished batch directory.
+
+        Args:
+            index (Dict[str, Any]): the last batch number and the digits in names
+            number (int): the batch number
+
+        Returns:
+            None
+        """
+        if self.archive:
+            raise ValueError("Only batch directories can be carried on with.")
+        self._digits = index['digits']
+        self.number = number
+        entry = next((entry for entry in self._entries() if entry['number'] == number), {})
+        self.directory = entry.get('name', f"{self._prefix}{str(number).zfill(self._digits)}")
+        self.path_directory = os.path.join(self.path, self.directory)
+        if not os.path.isdir(self.path_directory):
+            raise FileNotFoundError(f"Batch directory {self.path_directory} is missing.")
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        """
+        Read the log, merging the records of each batch and leaving out deleted ones. When the log is missing, the
+        entries are rebuilt from the batch directories and archives found.
 
-    def _next_number(self) -> int:
+        Returns:
+            List[Dict[str, Any]]: an entry per batch, by number
         """
-        Return the next batch number, starting at 1.
+        entries: Dict[int, Dict[str, Any]] = {}
+        try:
+            with open(self.path_log, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        number = record['number']
+                    except (ValueError, KeyError, TypeError):
+                        continue    # cut short by a crash
+                    if record.get('deleted'):
+                        entries.pop(number, None)
+                    else:
+                        entries.setdefault(number, {'number': number}).update(record)
+        except FileNotFoundError:
+            return self._rescan()
+        return sorted(entries.values(), key=lambda entry: entry['number'])
 
-        Raises:
-            ValueError: If the next batch number would be out of range.
+    def _log(self, record: Dict[str, Any]) -> None:
+        """
+        Append a record to the log and flush it to disk.
+
+        Args:
+            record (Dict[str, Any]): the batch number and what is new about it
 
         Returns:
-            int: Batch number
-
-        """
-        if os.path.exists(self.path):
-            dirs = os.listdir(self.path)
-            numbers = [int(d[self._digits:]) for d in dirs if d.startswith(self._prefix) and d[self._digits:].isdigit()]
-            if numbers:
-                next_number = max(numbers) + 1
-                if len(str(next_number)) > self._digits:
-                    raise ValueError(f"Next {self._prefix} number has too many digits")
-                else:
-                    return max(numbers) + 1
-        return 1
+            None
+        """
+        line = (json.dumps(record) + '\n').encode()
+        with open(self.path_log, 'a+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line    # finish a line cut short by a crash, so this record stands alone
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load_index(self) -> Dict[str, Any]:
+        """
+        Load the index, or rebuild it when it is missing or unreadable.
+
+        Returns:
+            Dict[str, Any]: the last batch number and the minimum digits in names
+        """
+        try:
+            with open(self.path_index, 'r') as f:
+                index = json.load(f)
+            if isinstance(index.get('last'), int):
+                index.setdefault('digits', self._digits)
+                return index
+        except (OSError, ValueError):
+            pass
+        # the last batch can be in the log but gone from the directory, or the other way round
+        numbers = [entry['number'] for entry in self._entries() + self._rescan()]
+        return {'last': max(numbers, default=0), 'digits': self._digits}
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        """
+        Write the index under a temporary name and rename it, so it is never left half written.
+
+        Args:
+            index (Dict[str, Any]): the last batch number and the digits in names
+
+        Returns:
+            None
+        """
+        path_part = self.path_index + self._part
+        with open(path_part, 'w') as f:
+            json.dump(index, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path_part, self.path_index)
+
+    def _rescan(self) -> List[Dict[str, Any]]:
+        """
+        List the batch directories and archives found, even unfinished ones. Their sizes and seeds are unknown.
+
+        Returns:
+            List[Dict[str, Any]]: an entry per batch, by number
+        """
+        batches = []
+        for entry in os.listdir(self.path):
+            name = entry.lstrip('.')
+            if name.endswith(self._part):
+                name = name[:-len(self._part)]
+            if name.endswith(self._archive_extension):
+                name = name[:-len(self._archive_extension)]
+            if name.startswith(self._prefix) and name[len(self._prefix):].isdigit():
+                batches.append({'number': int(name[len(self._prefix):]), 'name': entry})
+        batches.sort(key=lambda batch: batch['number'])
+        return batches
@@ -0,0 +1,376 @@
+# standard libraries
+from contextlib import ExitStack
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .batch import Batch
+    from .config import Config
+    from .serial_file import JsonWriter
+    from .verify import VerifyIndex
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from batch import Batch
+    from config import Config
+    from serial_file import JsonWriter
+    from verify import VerifyIndex
+
+
+class BatchGenerator:
+    """
+    Issue serial numbers in-process, for applications that embed rand-sn rather than run it. The config is loaded
+    and locked once and the generator is kept, so each call only costs the serial numbers it issues. Every call is
+    journaled before it returns, and the config is saved when closed.
+
+    A batch's serial numbers go to sinks, made for each batch by calling a factory with the batch directory. A sink
+    has write_many(numbers) and close(), and abort() when the batch fails. The serial number files of serial_file.py
+    are sinks, so is ImageSink of renderers.py, and anything else with those methods, for example to send the numbers
+    to a database.
+
+        with BatchGenerator() as generator:
+            numbers = generator.issue(10)
+            config = generator.config
+            images = lambda path: ImageSink(path, config.prefix, digits=len(str(config.biggest)))
+            batch = generator.batch(1000, sinks=(CsvWriter, images))
+
+    Async applications use batch_async instead, which doesn't block the event loop.
+    """
+
+    def __init__(self, path: Optional[str] = None, config_filename: Optional[str] = None,
+                 batches_path: Optional[str] = None, digits: Optional[int] = None) -> None:
+        """
+        Initialize BatchGenerator instance, then open() it, or use it as a context manager.
+
+        Args:
+            path (str): the path where the config file is, defaults to the current working directory
+            config_filename (str): the config's file name with or without extension, default 'rand-sn-config'
+            batches_path (str): the path where the batch directories go, defaults to the config's path
+            digits (int): the minimum number of digits in batch names, remembered for later batches
+
+        Returns:
+            None
+        """
+        self.config = Config(path=path, config_filename=config_filename)
+        self.batches_path = os.path.dirname(self.config.path_file) if batches_path is None else batches_path
+        self.digits = digits
+        self._stack: Optional[ExitStack] = None
+        self._fcr = None
+
+    def open(self) -> None:
+        """
+        Lock and load the config, raises RuntimeError when another process is issuing from it.
+
+        Returns:
+            None
+        """
+        if self._stack is not None:
+            return
+        stack = ExitStack()
+        stack.enter_context(self.config.lock())
+        try:
+            self.config.load()
+        except BaseException:
+            stack.close()
+            raise
+        self._stack = stack
+        self._fcr = self.config.generator()
+
+    def close(self) -> None:
+        """
+        Save the config and release its lock.
+
+        Returns:
+            None
+        """
+        if self._stack is not None:
+            try:
+                self.config.save()
+            finally:
+                self._stack.close()
+                self._stack = None
+                self._fcr = None
+
+    def __enter__(self) -> "BatchGenerator":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def remaining(self) -> int:
+        """
+        Return how many serial numbers are left before the cycle would repeat.
+
+        Returns:
+            int: the count
+        """
+        return self.config.remaining()
+
+    def issue(self, count: int) -> List[int]:
+        """
+        Issue serial numbers without a batch, like the server does.
+
+        Args:
+            count (int): how many serial numbers
+
+        Returns:
+            List[int]: the serial numbers, or raises OverflowError when not enough are left in the cycle
+        """
+        return [number for chunk in self.serial_numbers(count, count) for number in chunk]
+
+    def serial_numbers(self, count: int, chunk_size: int = 1 << 16) -> Iterator[List[int]]:
+        """
+        Issue serial numbers without a batch, a chunk at a time, so memory stays bounded however many there are.
+        Each chunk is journaled before it is handed over, stopping early leaves the rest of them in the cycle.
+
+        Args:
+            count (int): how many serial numbers
+            chunk_size (int): the most serial numbers in a chunk
+
+        Returns:
+            Iterator[List[int]]: the serial numbers, or raises OverflowError straight away when not enough are left
+                in the cycle
+        """
+        self._check(count)
+        return self._chunks(count, chunk_size, journal=True)
+
+    def batch(self, count: int, sinks: Iterable[Callable[[str], object]] = (JsonWriter,)) -> Batch:
+        """
+        Issue a batch of serial numbers into the next batch directory. Should anything fail, the batch is deleted and
+        its serial numbers aren't issued.
+
+        Args:
+            count (int): how many serial numbers
+            sinks (Iterable[Callable[[str], object]]): what makes the sinks, called with the batch directory, by
+                default a serial-numbers.json file
+
+        Returns:
+            Batch: the finished batch, or raises OverflowError when not enough serial numbers are left in the cycle
+        """
+        self._check(count)
+        batch, opened, start = self._start(sinks)
+        try:
+            for chunk in self._chunks(count, 1 << 16):
+                for sink in opened:
+                    sink.write_many(chunk)
+        except BaseException:
+            self._rollback(batch, opened, start)
+            raise
+        self._finish(batch, opened, count, start)
+        self._sync()
+        return batch
+
+    async def batch_async(self, count: int, sinks: Iterable[Callable[[str], object]] = (JsonWriter,),
+                          barcodes: bool = False, qr_codes: bool = False, image_format: str = 'png',
+                          executor: Optional["Executor"] = None, depth: int = 2) -> Batch:
+        """
+        Issue a batch like batch(), without blocking the event loop. The serial numbers are made and written to the
+        sinks in a thread, while the barcodes and QR codes of those before are rendered in the executor and saved
+        in another thread, see render_pipeline. The batch is made and finished in a thread as well. Only one call at
+        a time.
+
+        Args:
+            count (int): how many serial numbers
+            sinks (Iterable[Callable[[str], object]]): what makes the sinks, called with the batch directory, by
+                default a serial-numbers.json file
+            barcodes (bool): save the barcodes in the batch directory
+            qr_codes (bool): save the QR codes in the batch directory
+            image_format (str): the images are 'png' or 'svg'
+            executor (Executor): where the images are rendered, a ProcessPoolExecutor uses all the cores, by default
+                the event loop's threads
+            depth (int): how many chunks are rendered at a time, twice the processes of a pool keeps them all busy
+
+        Returns:
+            Batch: the finished batch, or raises OverflowError when not enough serial numbers are left in the cycle
+        """
+        # here rather than at the top, only async applications need them
+        import asyncio
+        from functools import partial
+        try:
+            from .pipeline import async_chunks, render_pipeline
+            from .renderers import render_chunk
+        except ImportError:
+            from pipeline import async_chunks, render_pipeline
+            from renderers import render_chunk
+
+        self._check(count)
+        loop = asyncio.get_running_loop()
+        # the threads making and finishing the batch can't be called off, a cancellation waits for them to end
+        starting = loop.run_in_executor(None, self._start, sinks)
+        try:
+            batch, opened, start = await asyncio.shield(starting)
+        except asyncio.CancelledError:
+            await asyncio.wait({starting})
+            if not starting.cancelled() and starting.exception() is None:
+                self._rollback(*starting.result())
+            raise
+        try:
+            # images are rendered a chunk at a time, smaller chunks spread them over the executor
+            chunks = self._written(self._chunks(count, 1000 if barcodes or qr_codes else 1 << 16), opened)
+            if barcodes or qr_codes:
+                render = partial(render_chunk, path=None, prefix=self.config.prefix, barcodes=barcodes,
+                                 qr_codes=qr_codes, image_format=image_format, digits=len(str(self.config.biggest)))
+                await render_pipeline(chunks, render, batch.write, executor, depth)
+            else:
+                async for _ in async_chunks(chunks):
+                    pass
+        except BaseException:
+            # on the event loop's thread, so the config is rolled back before the error is raised, even when cancelled
+            self._rollback(batch, opened, start)
+            raise
+        finishing = loop.run_in_executor(None, self._finish, batch, opened, count, start)
+        try:
+            await asyncio.shield(finishing)
+        except asyncio.CancelledError:
+            await asyncio.wait({finishing})
+            raise
+        await loop.run_in_executor(None, self._sync)
+        return batch
+
+    def _check(self, count: int) -> None:
+        if self._stack is None:
+            raise RuntimeError("Open the BatchGenerator first.")
+        if not isinstance(count, int) or count < 1:
+            raise ValueError("The count must be at least 1.")
+        if count > self.config.remaining():
+            raise OverflowError(f"Only {self.config.remaining()} serial numbers are left in the cycle.")
+
+    def _start(self, sinks: Iterable[Callable[[str], object]]) -> Tuple[Batch, List[Any], Dict[str, Any]]:
+        """
+        Make the next batch and its sinks, remembering where the config was, to roll back to should anything fail.
+
+        Args:
+            sinks (Iterable[Callable[[str], object]]): what makes the sinks, called with the batch directory
+
+        Returns:
+            Tuple[Batch, List[Any], Dict[str, Any]]: the batch, its sinks and where the config was
+        """
+        config = self.config
+        start = {'first': config.first, 'seed': config.seed, 'issued': config.issued}
+        batch = Batch(path=self.batches_path, digits=self.digits)
+        opened = []
+        try:
+            for sink in sinks:
+                opened.append(sink(batch.path_directory))
+        except BaseException:
+            abort_batch(batch, opened)
+            raise
+        return batch, opened, start
+
+    def _finish(self, batch: Batch, sinks: List[Any], count: int, start: Dict[str, Any]) -> None:
+        """
+        Close the sinks once the serial numbers are written, then finish the batch. Should that fail, it is rolled
+        back.
+
+        Args:
+            batch (Batch): the batch
+            sinks (List[Any]): its sinks
+            count (int): how many serial numbers
+            start (Dict[str, Any]): where the config was
+
+        Returns:
+            None
+        """
+        try:
+            for sink in sinks:
+                sink.close()
+            finish_batch(batch, self.config, count, start['seed'], start['issued'])
+        except BaseException:
+            self._rollback(batch, sinks, start)
+            raise
+
+    def _rollback(self, batch: Batch, sinks: List[Any], start: Dict[str, Any]) -> None:
+        """
+        Delete a batch that failed and roll the config back, so its serial numbers aren't issued.
+
+        Args:
+            batch (Batch): the batch
+            sinks (List[Any]): its sinks
+            start (Dict[str, Any]): where the config was
+
+        Returns:
+            None
+        """
+        abort_batch(batch, sinks)
+        self.config.first, self.config.seed, self.config.issued = start['first'], start['seed'], start['issued']
+        self._fcr = self.config.generator()
+
+    def _sync(self) -> None:
+        sync_verify_index(self.config, self.batches_path)
+
+    def _chunks(self, count: int, chunk_size: int, journal: bool = False) -> Iterator[List[int]]:
+        while count > 0:
+            chunk = [int(number) for number in self._fcr.batch(min(count, chunk_size))]
+            self.config.seed_cycle_many(chunk)
+            if journal:
+                self.config.journal(None, len(chunk))
+            count -= len(chunk)
+            yield chunk
+
+    @staticmethod
+    def _written(chunks: Iterable[List[int]], sinks: List[Any]) -> Iterator[List[int]]:
+        for chunk in chunks:
+            for sink in sinks:
+                sink.write_many(chunk)
+            yield chunk
+
+
+def finish_batch(batch: Batch, config: Config, count: int, seed_from: int, position_from: Optional[int]) -> None:
+    """
+    Finish a batch once its sinks are closed: close it, record it in the batch log and journal it. Until the journal
+    has it, its serial numbers aren't issued.
+
+    Args:
+        batch (Batch): the batch
+        config (Config): the config the serial numbers were issued from
+        count (int): how many serial numbers
+        seed_from (int): the seed the batch started from
+        position_from (int): how many serial numbers were issued before the batch
+
+    Returns:
+        None
+    """
+    batch.close()
+    batch.record(count, seed_from, config.seed, position_from)
+    config.journal(batch.number, count)
+
+
+def abort_batch(batch: Batch, sinks: Iterable[Any]) -> None:
+    """
+    Abort the sinks of a batch that failed, those that can be, and delete it.
+
+    Args:
+        batch (Batch): the batch
+        sinks (Iterable[Any]): its sinks
+
+    Returns:
+        None
+    """
+    for sink in sinks:
+        if hasattr(sink, 'abort'):
+            try:
+                sink.abort()
+            except OSError:
+                pass    # closed already
+    batch.delete()
+
+
+def sync_verify_index(config: Config, path: Optional[str] = None) -> None:
+    """
+    Once built by --verify, keep the verification index up to date with the batches.
+
+    Args:
+        config (Config): the config
+        path (str): the path where the batches are, defaults to the current working directory
+
+    Returns:
+        None
+    """
+    if os.path.exists(config.path_verify):
+        with VerifyIndex(config, path) as index:
+            index.sync()
@@ -0,0 +1,149 @@
+# standard libraries
+from typing import Dict, List, Optional, Tuple
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .raster import encode_png, encode_svg, pack_row, scale, text_rows
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from raster import encode_png, encode_svg, pack_row, scale, text_rows
+
+
+# The bar and space widths, in modules, of every Code 128 symbol, indexed by symbol value.
+PATTERNS: Tuple[str, ...] = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+)
+START_C: int = 105
+STOP: int = 106
+
+
+def symbols(data: str) -> List[int]:
+    """
+    Encode digits as Code 128C symbol values: start code, one symbol per pair of digits, checksum and stop.
+
+    Args:
+        data (str): an even number of digits
+
+    Returns:
+        List[int]: the symbol values
+    """
+    if not data.isdigit() or len(data) % 2 != 0:
+        raise ValueError("Code 128C encodes an even number of digits.")
+    values = [START_C] + [int(data[i:i + 2]) for i in range(0, len(data), 2)]
+    checksum = (values[0] + sum(position * value for position, value in enumerate(values[1:], start=1))) % 103
+    return values + [checksum, STOP]
+
+
+def modules(data: str) -> str:
+    """
+    Encode digits as the Code 128C sequence of modules.
+
+    Args:
+        data (str): an even number of digits
+
+    Returns:
+        str: one character per module, '1' for a bar and '0' for a space
+    """
+    result = []
+    for value in symbols(data):
+        for i, width in enumerate(PATTERNS[value]):
+            result.append(('1' if i % 2 == 0 else '0') * int(width))
+    return ''.join(result)
+
+
+class Code128CImage:
+    """
+    Draw Code 128C barcodes straight into 1-bit PNGs: one scanline of bars repeated, and the digits underneath.
+    Or into SVGs, with the same pixels as rectangles.
+    """
+
+    dpi: int = 300
+
+    def __init__(self, module_width: float = 0.2, module_height: float = 15.0, quiet_zone: float = 6.5,
+                 text_distance: float = 5.0, font_size: int = 10, compress_level: Optional[int] = None) -> None:
+        """
+        Initialize Code128CImage instance. The sizes are the same as the python-barcode ImageWriter options.
+
+        Args:
+            module_width (float): the width of the narrowest bar in mm
+            module_height (float): the height of the bars in mm
+            quiet_zone (float): the blank space left and right of the bars in mm
+            text_distance (float): the distance from the bottom of the bars to the bottom of the text in mm
+            font_size (int): the height of the text in points, 0 for no text
+            compress_level (int): the zlib level of the PNGs, 0 to 9, by default raster's default_compress_level
+
+        Returns:
+            None
+        """
+        px_per_mm = self.dpi / 25.4
+        self._module_px = max(1, round(module_width * px_per_mm))
+        self._bars_px = round(module_height * px_per_mm)
+        self._quiet_px = round(quiet_zone * px_per_mm)
+        self._margin_px = round(px_per_mm)  # top and bottom
+        # the font is 7 pixels high, digits are about 80% of the point size
+        self._font_scale = max(1, round(font_size * 0.8 * self.dpi / 72 / 7)) if font_size else 0
+        self._text_gap_px = max(0, round(text_distance * px_per_mm) - 7 * self._font_scale)
+        self._compress_level = compress_level
+
+    def rows(self, data: str) -> List[str]:
+        """
+        Draw a barcode as rows of pixels. Repeated rows are the same string, so they only need encoding once.
+
+        Args:
+            data (str): an even number of digits
+
+        Returns:
+            List[str]: the rows, top to bottom, '1' for a dark pixel and '0' for a light one
+        """
+        bars = scale(modules(data), self._module_px)
+        text = text_rows(data, self._font_scale) if self._font_scale else []
+        width = max([len(bars) + 2 * self._quiet_px] + [len(row) for row in text])
+        blank = '0' * width
+        rows = [blank] * self._margin_px
+        rows += [bars.center(width, '0')] * self._bars_px
+        if text:
+            rows += [blank] * self._text_gap_px
+            for row in text:
+                rows += [row.center(width, '0')] * self._font_scale
+        rows += [blank] * self._margin_px
+        return rows
+
+    def render(self, data: str) -> bytes:
+        """
+        Draw a barcode.
+
+        Args:
+            data (str): an even number of digits
+
+        Returns:
+            bytes: the PNG file's contents
+        """
+        rows = self.rows(data)
+        packed: Dict[str, bytes] = {}
+        for row in rows:
+            if row not in packed:
+                packed[row] = pack_row(row)
+        return encode_png([packed[row] for row in rows], len(rows[0]), self.dpi, self._compress_level)
+
+    def render_svg(self, data: str) -> bytes:
+        """
+        Draw a barcode as a vector image.
+
+        Args:
+            data (str): an even number of digits
+
+        Returns:
+            bytes: the SVG file's contents
+        """
+        return encode_svg(self.rows(data), 25.4 / self.dpi)
@@ -1,19 +1,55 @@
 # standard libraries
+from contextlib import contextmanager
 import json
+from numbers import Integral
 import random
 import os
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import warnings
+
+# 3rd party libraries, optional
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# platform specific libraries, for the lock file
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .full_cycle_random import FullCycleRandom
+    from .l_f_s_r import LFSR
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from full_cycle_random import FullCycleRandom
+    from l_f_s_r import LFSR
 
 
 class Config:
     smallest: int                   # the smallest number permitted
     seed: int                       # the last number generated, used to determine the next
     biggest: int                    # the largest number permitted
-    first: Optional[int] = None     # the first number generated, stop if we reach it again
+    first: Optional[int] = None     # the first number generated
+    issued: int = 0                 # how many numbers were generated, stop when the cycle is used up
+    key: Optional[int] = None       # the key of the Feistel permutation, None when the shift register is used
+    taps: Optional[List[int]] = None    # the shift register's taps, so the sequence is followed, None with a key
+    _short_cycle: bool = False      # the taps are old ones that don't cover the range, see LFSR.replaced_taps
     prefix: Optional[str]           # a URL stub placed before the number in the QR code
     _file: str                      # the configuration's file name
     path_file: Optional[str] = None     # the path to the configuration file
+    path_journal: Optional[str] = None  # the path to the journal, the config's file name ending in .journal.jsonl
+    path_verify: Optional[str] = None   # the path to the verification index, ending in .verify.bin, see VerifyIndex
     _extension: str = '.json'       # the mandatory file extension
+    _journal_extension: str = '.journal.jsonl'
+    _verify_extension: str = '.verify.bin'
+    _new_journal: bool = False      # configure() starts a new sequence, so the old journal and index no longer apply
+    engines: Tuple[str, ...] = ('lfsr', 'feistel')  # what can generate the sequence, see FullCycleRandom
 
     def __init__(self,
                  path: Optional[str] = None,
@@ -45,8 +81,11 @@ class Config:
 
         # both
         self.path_file = os.path.join(path, self._file)
+        self.path_journal = self.path_file[:-len(self._extension)] + self._journal_extension
+        self.path_verify = self.path_file[:-len(self._extension)] + self._verify_extension
 
-    def configure(self, biggest: int, smallest: Optional[int] = 1, prefix: Optional[str] = None):
+    def configure(self, biggest: int, smallest: Optional[int] = 1, prefix: Optional[str] = None,
+                  engine: str = 'lfsr'):
         """
         Configure when there is nothing to load from disk.
 
@@ -54,16 +93,132 @@ class Config:
             smallest (int): the smallest integer that the serial number can be
             biggest (int): the biggest integer that the serial number can be
             prefix (str): The prefix to use in QR code generation, example 'https://yourdomain.com/c/'
+            engine (str): 'lfsr' for the shift register, or 'feistel' for a permutation of the exact range, which
+                works the same for every number however far the range is above a power of two
 
         Returns:
             None
         """
+        if engine not in self.engines:
+            raise ValueError(f"The engine must be one of {', '.join(self.engines)}.")
         self.prefix = prefix
         self.smallest = smallest
         self.biggest = biggest
         self.seed = self.smallest    # redo after validation, prevent type errors on the random call
+        self.key = None
+        self.taps = None
+        self._short_cycle = False
         self._validate()
         self.seed = random.randint(self.smallest, self.biggest)
+        if engine == 'feistel':
+            self.key = random.SystemRandom().getrandbits(128)
+        self.taps = None if self.key is not None else list(self.generator().taps)
+        self.first = None
+        self.issued = 0
+        self._new_journal = True
+
+    @property
+    def capacity(self) -> int:
+        """ How many numbers there are in the cycle. """
+        return self.biggest - self.smallest + 1
+
+    def remaining(self) -> int:
+        """
+        Return how many numbers are left before the cycle would repeat.
+
+        Returns:
+            int: the count
+        """
+        return self.capacity - self.issued
+
+    def generator(self, seed: Optional[int] = None, position: Optional[int] = None) -> FullCycleRandom:
+        """
+        Make the generator that continues the sequence, or that repeats it from an earlier point.
+
+        Args:
+            seed (int): the seed to start from, default the config's seed
+            position (int): how many numbers were issued before that seed, default the config's count
+
+        Returns:
+            FullCycleRandom: the generator, with the config's engine
+        """
+        return FullCycleRandom(min_int=self.smallest, max_int=self.biggest,
+                               seed=self.seed if seed is None else seed,
+                               position=self.issued if position is None else position, key=self.key, taps=self.taps)
+
+    def serial_at(self, index: int) -> int:
+        """
+        Look up a serial number by when it was issued, the first is index 0. It is computed straight away with the
+        Feistel engine. The shift register is stepped through instead, from the last point the journal recorded before
+        it, or else from the first number.
+
+        Args:
+            index (int): how many serial numbers were issued before it
+
+        Returns:
+            int: the serial number, or raises IndexError when it hasn't been issued yet
+        """
+        if not 0 <= index < self.issued:
+            raise IndexError(f"Only {self.issued} serial numbers were issued.")
+        if self.key is not None:
+            return self.generator().serial_at(index)
+        if index == 0:
+            return self.first
+        # every record is a point of the sequence, its seed is the serial number issued before position issued
+        seed, position = self.first, 1
+        for record in self.records():
+            issued = record.get('issued')
+            if isinstance(issued, int) and position < issued <= index and record.get('first') == self.first:
+                seed, position = record['seed'], issued
+        fcr = self.generator(seed=seed, position=position)
+        skip = index - position
+        while skip > 0:
+            skip -= len(fcr.batch(min(skip, fcr.chunk_size)))
+        return next(fcr)
+
+    def index_of(self, number: int, path: Optional[str] = None) -> Optional[int]:
+        """
+        Look up when a serial number was issued, the inverse of serial_at(). It is computed straight away with the
+        Feistel engine. With the shift register, once --verify has built the verification index, a serial number in
+        a batch is found by going through that batch alone, the others are stepped through from the first number.
+
+        Args:
+            number (int): the serial number, for example one scanned from a label, an int or a NumPy integer
+            path (str): the path where the batches are, defaults to the current working directory
+
+        Returns:
+            int: how many serial numbers were issued before it, or None when it hasn't been issued
+        """
+        if not isinstance(number, Integral) or isinstance(number, bool) or self.first is None:
+            return None
+        number = int(number)
+        if not self.smallest <= number <= self.biggest:
+            return None
+        if self.key is not None:
+            index = self.generator().index_of(number)
+            return index if index < self.issued else None
+        if number == self.first:
+            return 0
+        if os.path.exists(self.path_verify):
+            # here rather than at the top, verify.py imports this module
+            try:
+                from .verify import VerifyIndex
+            except ImportError:
+                from verify import VerifyIndex
+            with VerifyIndex(self, path) as verify_index:
+                index = verify_index.position(number)
+            if index is not None and index < self.issued:
+                return index
+        fcr = self.generator(seed=self.first, position=1)
+        index = 1
+        while index < self.issued:
+            chunk = fcr.batch(min(self.issued - index, fcr.chunk_size))
+            found = np.flatnonzero(chunk == number) if np is not None and isinstance(chunk, np.ndarray) else \
+                [i for i, serial_number in enumerate(chunk) if serial_number == number]
+            if len(found) > 0:
+                return index + int(found[0])
+            index += len(chunk)
+        return None
 
     def seed_cycle(self, number: int):
         """
@@ -75,26 +230,83 @@ class Config:
         Returns:
             None or raises OverflowError
         """
-        if self.first is None:
-            self.first = number
-        elif self.first == number:
+        self.seed_cycle_many([number])
+
+    def seed_cycle_many(self, numbers: Sequence[int]) -> None:
+        """
+        Update the seed past many numbers at once and check if the cycle is about to repeat. The count of numbers
+        issued is checked, so it takes the same time however many numbers there are. With the old taps of a config
+        made before they were replaced, the cycle is shorter than the range, so the numbers are also searched for the
+        first one, as before.
+
+        Args:
+            numbers (Sequence[int]): the next numbers in the sequence, a list or an array
+
+        Returns:
+            None or raises OverflowError, leaving the seed, first and count as they were
+        """
+        if len(numbers) > 0:
+            if self._short_cycle:
+                first = int(numbers[0]) if self.first is None else self.first
+                if first in numbers[1 if self.first is None else 0:]:
+                    raise OverflowError
+            self.seed_cycle_block(len(numbers), int(numbers[0]), int(numbers[-1]))
+
+    def seed_cycle_block(self, count: int, first: int, last: int) -> None:
+        """
+        Update the seed past a block of numbers known only by its ends, for example computed by the Feistel engine,
+        and check if the cycle is about to repeat.
+
+        Args:
+            count (int): how many numbers are in the block, at least one
+            first (int): the block's first number
+            last (int): the block's last number
+
+        Returns:
+            None or raises OverflowError, leaving the seed, first and count as they were
+        """
+        if count > self.remaining():
             raise OverflowError
-        self.seed = number
+        if self.first is None:
+            self.first = first
+        self.seed = last
+        self.issued += count
 
     def save(self) -> None:
         """
-        Save configuration to file.
+        Save configuration to file. It is written under a temporary name, flushed to disk and renamed, so a crash
+        leaves either the old or the new file, never a half written one.
         :return: None
         """
         self._validate()
         warning = "Preserve the seed! Back-up this file and don't delete it."
-        config_dict = {'*warning*': warning, 'first': self.first, 'smallest': self.smallest, 'seed': self.seed, 'biggest': self.biggest, 'prefix': self.prefix}
-        with open(self.path_file, 'w') as f:
+        config_dict = {
+            '*warning*': warning,
+            'first': self.first,
+            'smallest': self.smallest,
+            'seed': self.seed,
+            'biggest': self.biggest,
+            'prefix': self.prefix,
+            'issued': self.issued,
+            'key': self.key,
+            'taps': self.taps,
+        }
+        path_part = self.path_file + '.part'
+        with open(path_part, 'w') as f:
             json.dump(config_dict, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path_part, self.path_file)
+        if self._new_journal:
+            for path_file in (self.path_journal, self.path_verify):
+                if os.path.exists(path_file):
+                    os.remove(path_file)
+            self._new_journal = False
 
     def load(self) -> None:
         """
-        Load configuration from file.
+        Load configuration from file, then bring the seed up to date with the last record in the journal, in case
+        the program stopped between journaling a batch and saving.
         :return: None.
         """
         with open(self.path_file, 'r') as f:
@@ -102,7 +314,182 @@ class Config:
             config_dict.pop('*warning*')
             for key, value in config_dict.items():
                 setattr(self, key, value)
-            self._validate()
+        self.taps = config_dict.get('taps')
+        self._load_taps()   # before anything steps through the cycle
+        self.issued = config_dict.get('issued')
+        record = self.last_record()
+        if record is not None:
+            self.first = record['first']
+            self.seed = record['seed']
+            self.issued = record.get('issued')
+        if self.issued is None:
+            self.issued = self._count_issued()  # saved by an older version, only needed once
+        self._validate()
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Hold the config's lock file, so only one process issues serial numbers from it at a time.
+        Raises RuntimeError straight away when another process holds it.
+        """
+        with open(self.path_file + '.lock', 'a+') as f:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                raise RuntimeError(f"{self.path_file} is in use by another rand-sn process.") from None
+            yield   # closing the file releases the lock
+
+    def journal(self, batch: Optional[int], count: int, checkpoint: Optional[Dict[str, Any]] = None,
+                lease: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Append a record of the current state to the journal and flush it to disk. Appending is cheap, unlike
+        rewriting the config, so it can be done as often as needed.
+
+        Args:
+            batch (int): the batch number, None for serial numbers handed out by the server
+            count (int): how many serial numbers the batch holds so far
+            checkpoint (Dict[str, Any]): for a batch still in progress, what is needed to resume it
+            lease (Dict[str, Any]): for a block of the cycle handed out whole, where it starts and who has it
+
+        Returns:
+            None
+        """
+        self.append_journal(self.journal_record(batch, count, checkpoint, lease))
+
+    def journal_record(self, batch: Optional[int], count: int, checkpoint: Optional[Dict[str, Any]] = None,
+                       lease: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Make a record of the current state for the journal, see journal(). The first number, seed and count are
+        taken together, so make it where they are updated and only append it elsewhere, for example in a thread.
+
+        Args:
+            batch (int): the batch number, None for serial numbers handed out by the server
+            count (int): how many serial numbers the batch holds so far
+            checkpoint (Dict[str, Any]): for a batch still in progress, what is needed to resume it
+            lease (Dict[str, Any]): for a block of the cycle handed out whole, where it starts and who has it
+
+        Returns:
+            Dict[str, Any]: the record
+        """
+        record = {'batch': batch, 'count': count, 'first': self.first, 'seed': self.seed, 'issued': self.issued}
+        if checkpoint is not None:
+            record['checkpoint'] = checkpoint
+        if lease is not None:
+            record['lease'] = lease
+        return record
+
+    def append_journal(self, record: Dict[str, Any]) -> None:
+        """
+        Append a record to the journal and flush it to disk.
+
+        Args:
+            record (Dict[str, Any]): the record, see journal_record()
+
+        Returns:
+            None
+        """
+        line = (json.dumps(record) + '\n').encode()
+        with open(self.path_journal, 'a+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line    # finish a line cut short by a crash, so this record stands alone
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Read the journal's records from the first to the last, skipping any cut short by a crash.
+
+        Returns:
+            Iterator[Dict[str, Any]]: the records
+        """
+        try:
+            with open(self.path_journal, 'rb') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+
+    def last_record(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the last complete record in the journal, without reading the whole journal.
+
+        Returns:
+            Dict[str, Any]: the batch, count, first, seed, issued and any checkpoint or lease, or None when there is no
+                journal yet
+        """
+        try:
+            with open(self.path_journal, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                tail = b''
+                while size > 0:
+                    step = min(size, 4096)
+                    size -= step
+                    f.seek(size)
+                    tail = f.read(step) + tail
+                    lines = tail.split(b'\n')
+                    # the first line may be incomplete until the start of the file is reached, and a line cut short
+                    # by a crash doesn't end in a newline
+                    for line in reversed(lines[1:-1] if size else lines[:-1]):
+                        try:
+                            return json.loads(line)
+                        except ValueError:
+                            continue
+        except FileNotFoundError:
+            pass
+        return None
+
+    def _load_taps(self) -> None:
+        """
+        Make sure the shift register follows the sequence the config was made with, otherwise serial numbers could be
+        issued again. A config saved before the taps were kept gets those it was made with, the old ones when its
+        register's width is one whose taps were replaced. It carries on with them, with a warning, as they don't
+        cover the whole range.
+
+        Returns:
+            None
+        """
+        self._short_cycle = False
+        if self.key is not None:
+            return
+        taps = list(FullCycleRandom(min_int=self.smallest, max_int=self.biggest, seed=self.smallest).taps)
+        replaced = LFSR.replaced_taps.get(taps[0])
+        if self.taps is None:
+            self.taps = taps if replaced is None else list(replaced)
+        if replaced is not None and list(self.taps) == list(replaced):
+            self._short_cycle = True
+            warnings.warn(f"{self.path_file} was made by an older rand-sn, whose {taps[0]}-bit shift register doesn't "
+                          f"cover the whole range. It carries on with the same taps, so no serial number is issued "
+                          f"twice, and stops when its cycle comes back to the first one, see Upgrade in the README.")
+
+    def _count_issued(self) -> int:
+        """
+        Count the numbers issued by going through the cycle from the first to the seed.
+
+        Returns:
+            int: the count
+        """
+        if self.first is None:
+            return 0
+        fcr = FullCycleRandom(min_int=self.smallest, seed=self.first, max_int=self.biggest, taps=self.taps)
+        issued = 1
+        while self.seed != self.first and issued < self.capacity:
+            chunk = [int(number) for number in fcr.batch(min(self.capacity - issued, fcr.chunk_size))]
+            if self.seed in chunk:
+                return issued + chunk.index(self.seed) + 1
+            issued += len(chunk)
+        if self.seed != self.first:
+            raise ValueError("The seed isn't in the cycle that starts from first.")
+        return issued
 
     def _validate(self) -> None:
         """
@@ -118,6 +505,21 @@ class Config:
         if self.prefix is not None and not isinstance(self.prefix, str):
             raise TypeError("Prefix must be None or a string.")
 
+        if not isinstance(self.issued, int):
+            raise TypeError("Issued must be an int.")
+        elif not (0 <= self.issued <= self.capacity):
+            raise ValueError("Range error, 0 <= issued <= biggest - smallest + 1 is required.")
+
+        if self.key is not None:
+            if not isinstance(self.key, int):
+                raise TypeError("Key must be None or an int.")
+            elif self.key < 0:
+                raise ValueError("Range error, 0 <= key is required.")
+
+        if self.taps is not None and not (isinstance(self.taps, list) and
+                                          all(isinstance(tap, int) for tap in self.taps)):
+            raise TypeError("Taps must be None or a list of ints.")
+
         if self.first is not None:
             if not isinstance(self.first, int):
                 raise TypeError("First must be None or an int.")
@@ -0,0 +1,158 @@
+# standard libraries
+import hashlib
+from math import isqrt
+from typing import List, Union
+
+# 3rd party libraries, optional
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_MASK: int = (1 << 64) - 1
+
+
+def _mix(z: int) -> int:
+    """ The SplitMix64 finalizer, it scrambles the bits of a 64-bit integer. """
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & _MASK
+    return z ^ (z >> 31)
+
+
+class FeistelPermutation:
+    """
+    A keyed permutation of the integers 0 to size - 1, so position i in the cycle maps to a unique number, and back.
+
+    A Feistel network shuffles a rectangle of a x b numbers, with a and b close to the square root of the size, so
+    the rectangle is at most about the square root bigger than the range. Numbers that land outside the range are
+    shuffled again, cycle-walking, which is rarely needed and takes at most a rounds of the network. Every number
+    takes the same fixed work otherwise, unlike skipping the shift register states that are out of range.
+
+    Up to 2**64 numbers, the round function mixes 64-bit integers, and below 2**63 many positions are mapped at once
+    with NumPy when it is installed. Beyond that, it is a keyed BLAKE2 hash.
+    """
+
+    rounds: int = 8
+
+    def __init__(self, size: int, key: int) -> None:
+        """
+        Initialize FeistelPermutation instance.
+
+        Args:
+            size (int): how many numbers to shuffle, at least 1
+            key (int): the secret that picks the permutation, 0 or more
+
+        Returns:
+            None
+        """
+        if not isinstance(size, int) or size < 1:
+            raise ValueError("The size must be at least 1.")
+        if not isinstance(key, int) or key < 0:
+            raise ValueError("The key must be an integer of 0 or more.")
+        self.size = size
+        self._a = isqrt(size - 1) + 1
+        self._b = -(-size // self._a)     # b <= a
+
+        # a key per round
+        key_bytes = key.to_bytes(max(1, -(-key.bit_length() // 8)), 'big')[-64:]
+        self._wide = self._a > 1 << 32
+        if self._wide:
+            # the digest is wide enough to keep the modulo close to unbiased
+            self._width = -(-self._a.bit_length() // 8)
+            digest_size = min(64, self._width + 8)
+            self._hashes = [hashlib.blake2b(bytes([r]), key=key_bytes, digest_size=digest_size)
+                            for r in range(self.rounds)]
+        else:
+            self._keys = [int.from_bytes(hashlib.blake2b(bytes([r]), key=key_bytes, digest_size=8).digest(), 'big')
+                          for r in range(self.rounds)]
+
+    def forward(self, x: int) -> int:
+        """
+        Map a position to its number.
+
+        Args:
+            x (int): the position, 0 to size - 1
+
+        Returns:
+            int: the number, 0 to size - 1
+        """
+        x = self._encrypt(x)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+    def inverse(self, y: int) -> int:
+        """
+        Map a number back to its position.
+
+        Args:
+            y (int): the number, 0 to size - 1
+
+        Returns:
+            int: the position, 0 to size - 1
+        """
+        y = self._decrypt(y)
+        while y >= self.size:
+            y = self._decrypt(y)
+        return y
+
+    def forward_many(self, start: int, count: int) -> Union["np.ndarray", List[int]]:
+        """
+        Map consecutive positions to their numbers, all at once.
+
+        Args:
+            start (int): the first position
+            count (int): how many positions, they wrap around after size - 1
+
+        Returns:
+            Union[np.ndarray, List[int]]: the numbers, an array of uint64 with NumPy, otherwise a list
+        """
+        if np is None or self.size >= 1 << 63:
+            return [self.forward((start + i) % self.size) for i in range(count)]
+        size = np.uint64(self.size)
+        x = self._encrypt_array((np.arange(count, dtype=np.uint64) + np.uint64(start % self.size)) % size)
+        outside = x >= size
+        while outside.any():
+            x[outside] = self._encrypt_array(x[outside])
+            outside = x >= size
+        return x
+
+    def _f(self, r: int, value: int, modulus: int) -> int:
+        if self._wide:
+            h = self._hashes[r].copy()
+            h.update(value.to_bytes(self._width, 'big'))
+            return int.from_bytes(h.digest(), 'big') % modulus
+        return _mix(value ^ self._keys[r]) % modulus
+
+    def _encrypt(self, x: int) -> int:
+        # the halves swap each round, so they alternate between a and b values
+        left, right = divmod(x, self._b)
+        m, n = self._a, self._b
+        for r in range(self.rounds):
+            left, right = right, (left + self._f(r, right, m)) % m
+            m, n = n, m
+        return left * self._b + right
+
+    def _decrypt(self, y: int) -> int:
+        left, right = divmod(y, self._b)
+        m, n = self._a, self._b     # after an even number of rounds the halves are back to a and b
+        for r in reversed(range(self.rounds)):
+            m, n = n, m
+            left, right = (right - self._f(r, left, m)) % m, left
+        return left * self._b + right
+
+    def _encrypt_array(self, x: "np.ndarray") -> "np.ndarray":
+        # the same as _encrypt, for many at once, the halves stay below 2**32 so only the mixing overflows
+        b = np.uint64(self._b)
+        left, right = x // b, x % b
+        m, n = np.uint64(self._a), b
+        with np.errstate(over='ignore'):   # the mixing multiplies modulo 2**64 on purpose
+            for r in range(self.rounds):
+                z = right ^ np.uint64(self._keys[r])
+                z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+                z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+                z = z ^ (z >> np.uint64(31))
+                left, right = right, (left + z % m) % m
+                m, n = n, m
+        return left * b + right
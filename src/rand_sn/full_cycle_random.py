@@ -1,13 +1,21 @@
 # standard libraries
 import random
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple, Union
+
+# 3rd party libraries, optional
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # local imports
 try:
     # attempt relative import (assuming running as part of a package)
+    from .feistel import FeistelPermutation
     from .l_f_s_r import LFSR
 except ImportError:
     # fallback to absolute import (assuming running as standalone script)
+    from feistel import FeistelPermutation
     from l_f_s_r import LFSR
 
 
@@ -15,9 +23,17 @@ class FullCycleRandom:
     """
     Generate pseudo random numbers within a given range in a full cycle.
     Full cycle means that all numbers are used before repeating.
+
+    By default a shift register walks the cycle, it skips the states that are out of range, up to half of them when
+    the range is just above a power of two. With a key, a Feistel permutation of the exact range maps each position
+    to its number instead, with about the same work for every number.
     """
 
-    def __init__(self, seed: Optional[int] = None, min_int: int = 1, max_int: int = 100):
+    chunk_size: int = 1 << 20   # how many numbers to ask batch() for at a time, so the memory used stays bounded
+    _max_draw: int = 1 << 20   # the most registers batch() holds at once
+
+    def __init__(self, seed: Optional[int] = None, min_int: int = 1, max_int: int = 100, position: int = 0,
+                 key: Optional[int] = None, taps: Optional[Sequence[int]] = None):
         """
         Initialize FullCycleRandom instance.
 
@@ -25,12 +41,23 @@ class FullCycleRandom:
             seed (Optional[int]): Start or resume the sequence with a known integer, or None for a random start.
             min_int (int): The smallest random number permitted.
             max_int (int): The largest random number permitted.
+            position (int): When resuming, how many numbers of the cycle were produced before.
+            key (Optional[int]): The key of a Feistel permutation, or None for the shift register. With a key, the
+                position alone decides where the sequence resumes, and the seed isn't used.
+            taps (Optional[Sequence[int]]): The shift register's taps, by default those of a maximal-length register
+                for the range. Not used with a key.
 
         Returns:
             None
         """
         self._min_int = self._validate_input(value=min_int, name='min_int', min_val=1)
         self._max_int = self._validate_input(value=max_int, name='max_int', min_val=min_int)
+        self.position = self._validate_input(value=position, name='position', min_val=0)
+        if key is not None:
+            self._permutation = FeistelPermutation(size=self._max_int - self._min_int + 1, key=key)
+            self._lfsr = None
+            return
+        self._permutation = None
 
         # determine the minimum number of bits needed in the shift register
         bits = (self._max_int - self._min_int + 1).bit_length()
@@ -45,7 +72,7 @@ class FullCycleRandom:
         seed = seed - self._min_int + 1
 
         # instantiate a Linear Feedback Shift Register
-        self._lfsr = LFSR(seed=seed, bits=bits)
+        self._lfsr = LFSR(seed=seed, bits=bits, taps=taps)
 
     @staticmethod
     def _validate_input(value: int, name: str, min_val: Optional[int] = None, max_val: Optional[int] = None) -> int:
@@ -86,8 +113,112 @@ class FullCycleRandom:
         Returns:
             int: The next number in the sequence.
         """
+        if self._permutation is not None:
+            result = self._permutation.forward(self.position % self._permutation.size) + self._min_int
+            self.position += 1
+            return result
         for result in self._lfsr:
             result = result + self._min_int - 1
             assert self._min_int <= result
             if result <= self._max_int:
+                self.position += 1
                 return result
+
+    @property
+    def taps(self) -> Optional[Tuple[int, ...]]:
+        """ The taps of the shift register, None with a key. """
+        return None if self._lfsr is None else tuple(self._lfsr._bits - tap for tap in self._lfsr._taps)
+
+    def serial_at(self, index: int) -> int:
+        """
+        Get the number at a position of the cycle, without producing the ones before it. Only a key makes this
+        possible, the shift register has to be stepped through.
+
+        Args:
+            index (int): The position, zero or more, it wraps around after the whole cycle.
+
+        Returns:
+            int: The number.
+        """
+        if self._permutation is None:
+            raise ValueError("Only the Feistel engine, with a key, maps positions to numbers directly.")
+        self._validate_input(value=index, name='index', min_val=0)
+        return self._permutation.forward(index % self._permutation.size) + self._min_int
+
+    def index_of(self, number: int) -> int:
+        """
+        Get the position of a number in the cycle, the inverse of serial_at().
+
+        Args:
+            number (int): The number, from min_int to max_int.
+
+        Returns:
+            int: The position, below the size of the cycle.
+        """
+        if self._permutation is None:
+            raise ValueError("Only the Feistel engine, with a key, maps numbers to positions directly.")
+        self._validate_input(value=number, name='number', min_val=self._min_int, max_val=self._max_int)
+        return self._permutation.inverse(number - self._min_int)
+
+    def remaining(self) -> int:
+        """
+        Get how many numbers are left before the cycle repeats.
+
+        Returns:
+            int: The count, zero once the whole cycle has been produced.
+        """
+        return max(0, self._max_int - self._min_int + 1 - self.position)
+
+    def batch(self, k: int) -> Union["np.ndarray", List[int]]:
+        """
+        Get the next k numbers in the full cycle random sequence all at once.
+
+        Registers are taken from the shift register in bulk, and the ones that are out of range are filtered out
+        together. When NumPy is installed, and the numbers fit in 64 bits, the filtering and the offset are vectorized.
+        The sequence is exactly the one next() would produce, so it can be resumed from the last number.
+        With a key, the positions are mapped to numbers all at once instead.
+
+        Args:
+            k (int): How many numbers to get, zero or more.
+
+        Returns:
+            Union[np.ndarray, List[int]]: The numbers, an array of uint64 with NumPy, otherwise a list.
+        """
+        self._validate_input(value=k, name='k', min_val=0)
+        if self._permutation is not None:
+            numbers = self._permutation.forward_many(self.position, k)
+            self.position += k
+            if np is not None and isinstance(numbers, np.ndarray) and self._max_int < 2 ** 64:
+                numbers += np.uint64(self._min_int)
+                return numbers
+            return [int(number) + self._min_int for number in numbers]
+        self.position += k
+
+        span = self._max_int - self._min_int + 1
+        offset = self._min_int - 1
+        vectorize = np is not None and self._max_int < 2 ** 64
+        max_register = 2 ** self._lfsr._bits - 1
+        parts = []
+        needed = k
+        while needed > 0:
+            # draw about as many registers as needed to end up with enough in range, but bound the memory used
+            draw = min(-(-needed * max_register // span), self._max_draw)
+            registers = self._lfsr.take(draw)
+            if vectorize:
+                registers = np.frombuffer(registers, dtype=np.uint64)
+                accepted = registers[registers <= span][:needed]
+            else:
+                accepted = [register for register in registers if register <= span][:needed]
+            if len(accepted) > 0:
+                parts.append(accepted)
+                needed -= len(accepted)
+                if needed == 0:
+                    # rewind the overdrawn registers, the last number's register is where the sequence resumes
+                    self._lfsr._register = int(accepted[-1])
+
+        if vectorize:
+            numbers = np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+            numbers += np.uint64(offset)
+            return numbers
+        else:
+            return [register + offset for part in parts for register in part]
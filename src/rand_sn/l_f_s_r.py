@@ -1,6 +1,16 @@
 # standard libraries
+from array import array
+from numbers import Integral
 import random
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from . import primitive
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    import primitive
 
 
 class LFSR:
@@ -39,15 +49,15 @@ class LFSR:
         29: (29, 27),
         30: (30, 6, 4, 1),
         31: (31, 28),
-        32: (31, 30, 29, 28, 26, 25, 24, 22, 21, 19, 18, 17, 14, 13, 12, 10, 8, 7, 5, 3, 2, 1),
+        32: (32, 7, 6, 2),
         33: (33, 20),
-        34: (34, 27),
+        34: (34, 8, 4, 3),
         35: (35, 33),
         36: (36, 25),
         37: (37, 5, 4, 3, 2, 1),
         38: (38, 6, 5, 1),
         39: (39, 4),
-        40: (40, 21),
+        40: (40, 5, 4, 3),
         41: (41, 3),
         42: (42, 41, 20, 19),
         43: (43, 6, 4, 3),
@@ -55,47 +65,73 @@ class LFSR:
         45: (45, 4, 3, 1),
         46: (46, 45, 26, 25),
         47: (47, 5),
-        48: (48, 29),
+        48: (48, 9, 8, 6),
         49: (49, 9),
         50: (50, 49, 24, 23),
         51: (51, 6, 3, 1),
         52: (52, 3),
         53: (53, 6, 2, 1),
+        54: (54, 8, 6, 3),
+        55: (55, 24),
+        56: (56, 7, 4, 2),
+        57: (57, 7),
+        58: (58, 19),
+        59: (59, 7, 6, 2),
+        60: (60, 1),
+        61: (61, 5, 2, 1),
+        62: (62, 6, 5, 3),
+        63: (63, 1),
+        64: (64, 4, 3, 2),
+        # Optimal taps produce the longest possible sequence. The wider ones, up to 128 bits, were generated by
+        # primitive.py and are loaded from its data file when first needed.
+    }
+    _generated_taps: Optional[Dict[int, Tuple[int, ...]]] = None
+    # hand-typed taps that turned out not to be maximal-length, replaced above, configs made with them keep them
+    replaced_taps: Dict[int, Tuple[int, ...]] = {
+        32: (31, 30, 29, 28, 26, 25, 24, 22, 21, 19, 18, 17, 14, 13, 12, 10, 8, 7, 5, 3, 2, 1),
+        34: (34, 27),
+        40: (40, 21),
+        48: (48, 29),
         54: (54, 7, 6, 1),
         55: (55, 7),
-        56: (56, 7, 4, 2),
         57: (57, 7, 4, 3),
-        58: (58, 19),
         59: (59, 6, 5, 1),
-        60: (60, 1),
         61: (61, 6, 5, 1),
         62: (62, 29, 27, 1),
-        63: (63, 1),
         64: (63, 61, 60, 59),
-        # Add more lengths and their optimal taps as needed,
-        # optimal taps produce the longest possible sequence.
     }
 
-    def __init__(self, seed: Optional[int] = None, bits: int = 8):
+    _block: int = 128       # the number of registers take() slices out of each lookup
+    _feedback_tables_cache: Dict[Tuple[int, ...], List[List[int]]] = {}
+
+    def __init__(self, seed: Optional[int] = None, bits: int = 8, taps: Optional[Sequence[int]] = None):
         """
         Initialize LFSR instance.
 
         :param seed: Start or resume the sequence with a known integer, or None for a random start, defaults to None.
         :param bits: The number of bits in the shift register.
+        :param taps: The taps, from 1 to bits, by default those of a maximal-length register, see taps_of.
         :return: Returns nothing.
         """
 
         # determine the number of bits that will be in the shift register
         if not isinstance(bits, int):
             raise TypeError('The bits parameter must be an integer.')
-        elif bits not in self._optimal_taps:
-            available_keys = list(self._optimal_taps.keys())
-            raise ValueError(f"Invalid bits. Please choose from the following integers: {available_keys}")
-        else:
-            self._bits = bits
+        if taps is None:
+            taps = self.taps_of(bits)
+            if taps is None:
+                raise ValueError(f"Invalid bits. Please choose an integer from 2 to {max(self._taps_available())}.")
+        elif not taps or not all(isinstance(tap, Integral) and 1 <= tap <= bits for tap in taps):
+            raise ValueError(f"The taps must be integers from 1 to {bits}.")
+        self._bits = bits
 
         # determine what bits will be tapped and then adjust for how Python indexes bits
-        self._taps = tuple([bits - tap for tap in self._optimal_taps[bits]])
+        self._taps = tuple([bits - int(tap) for tap in taps])
+
+        # the characteristic polynomial of the register's transition as bits of an integer, x^bits + x^tap + ...
+        self._polynomial = 1 << bits
+        for tap in self._taps:
+            self._polynomial |= 1 << tap
 
         # determine the shift register's initial value, the proper term for this is the seed
         max_register = self._max_register(bits)
@@ -108,6 +144,36 @@ class LFSR:
         else:
             self._register = seed
 
+    @classmethod
+    def taps_of(cls, bits: int) -> Optional[Tuple[int, ...]]:
+        """
+        Return the taps of a maximal-length register.
+
+        Args:
+            bits (int): The number of bits in the shift register.
+
+        Returns:
+            Optional[Tuple[int, ...]]: The taps, the first being bits, or None when there are none for that width.
+        """
+        taps = cls._optimal_taps.get(bits)
+        if taps is None:
+            taps = cls._taps_available().get(bits)
+        return taps
+
+    @classmethod
+    def _taps_available(cls) -> Dict[int, Tuple[int, ...]]:
+        """
+        Return the taps of every width, loading the generated ones the first time.
+
+        Returns:
+            Dict[int, Tuple[int, ...]]: The taps by width.
+        """
+        if cls._generated_taps is None:
+            taps = {bits: tuple(entry['taps']) for bits, entry in primitive.load().items()}
+            taps.update(cls._optimal_taps)
+            cls._generated_taps = taps
+        return cls._generated_taps
+
     @staticmethod
     def _max_register(n_bits: int) -> int:
         return 2 ** n_bits - 1
@@ -133,14 +199,171 @@ class LFSR:
             └──────XOR┘ │   │
                     └──XOR──┘ (taps == 7, 5, 4)
 
+        Returns:
+            int: The next register in the sequence.
+        """
+        self._register = self._step(self._register)
+        return self._register
+
+    def _step(self, register: int) -> int:
+        """
+        Return the register that follows the given register, without changing the instance.
+
+        Args:
+            register (int): A register value.
+
         Returns:
             int: The next register in the sequence.
         """
         tap_bits = 0
         for tap in self._taps:
-            tap_bits = tap_bits ^ (self._register >> tap) & 1
+            tap_bits = tap_bits ^ (register >> tap) & 1
         bit = tap_bits
 
-        self._register = (self._register >> 1) | (bit << (self._bits - 1))
+        return (register >> 1) | (bit << (self._bits - 1))
+
+    def take(self, k: int) -> Union[array, List[int]]:
+        """
+        Advance the register by k steps in the series and return every register along the way.
+
+        Each register is a window onto the stream of feedback bits, so rather than stepping, the next block of
+        feedback bits is computed from the register a byte at a time with lookup tables, and the registers within the
+        block are sliced out of the register extended by that block.
+
+        Args:
+            k (int): The number of steps to take, zero or more.
+
+        Returns:
+            Union[array, List[int]]: The next k registers in the sequence, the same values k calls to next() would
+                have returned. An array of unsigned 64-bit integers, or a list when the register is wider.
+        """
+        if not isinstance(k, int):
+            raise TypeError('The k parameter must be an integer.')
+        elif k < 0:
+            raise ValueError('The k parameter can not be negative.')
+
+        bits = self._bits
+        mask = self._max_register(bits)
+        tables = tuple(enumerate(self._feedback_tables()))
+        steps = range(1, self._block + 1)
+        registers = array('Q') if bits <= 64 else []
+        register = self._register
+        while k > 0:
+            if k < self._block:
+                steps = range(1, k + 1)
+            feedback = 0
+            for i, table in tables:
+                feedback ^= table[(register >> (i * 8)) & 0xFF]
+            extended = register | (feedback << bits)
+            registers.extend([(extended >> step) & mask for step in steps])
+            register = registers[-1]
+            k -= self._block
+        self._register = register
+
+        return registers
+
+    def _feedback_tables(self) -> List[List[int]]:
+        """
+        Return lookup tables for the next block of feedback bits, one table per byte of the register.
+
+        Stepping is linear over GF(2), so the feedback for a register is the XOR of the feedback for each of its bytes.
+        The tables only depend on the number of bits and the taps, so they are built once and shared by all instances.
+
+        Returns:
+            List[List[int]]: The feedback block for every value of each byte, byte 0 being the least significant.
+        """
+        tables = self._feedback_tables_cache.get((self._bits,) + self._taps)
+        if tables is None:
+            # the feedback block of each single bit, bit j is the top bit of the register after step j + 1
+            singles = []
+            for position in range(self._bits):
+                register = 1 << position
+                feedback = 0
+                for step in range(self._block):
+                    register = self._step(register)
+                    feedback |= (register >> (self._bits - 1)) << step
+                singles.append(feedback)
+
+            # combine the single bits into every possible byte
+            tables = []
+            for first in range(0, self._bits, 8):
+                table = [0] * 256
+                for value in range(1, 256):
+                    lowest = value & -value
+                    position = first + lowest.bit_length() - 1
+                    table[value] = table[value ^ lowest] ^ (singles[position] if position < self._bits else 0)
+                tables.append(table)
+            self._feedback_tables_cache[(self._bits,) + self._taps] = tables
+
+        return tables
+
+    def jump(self, n: int) -> int:
+        """
+        Advance the register by n steps in the series without visiting the steps in between.
+
+        Stepping is linear over GF(2), so the register n steps ahead is the XOR of the registers 0 to bits - 1 steps
+        ahead selected by the coefficients of x^n mod P(x), where P(x) is the characteristic polynomial of the taps.
+        Square-and-multiply finds x^n mod P(x) in O(log n) polynomial multiplications.
+
+        Args:
+            n (int): The number of steps to advance, zero or more.
+
+        Returns:
+            int: The register after the jump, the same value n calls to next() would have returned last.
+        """
+        if not isinstance(n, int):
+            raise TypeError('The n parameter must be an integer.')
+        elif n < 0:
+            raise ValueError('The n parameter can not be negative.')
+
+        coefficients = self._x_pow_mod(n)
+        register = 0
+        current = self._register
+        while coefficients:
+            if coefficients & 1:
+                register ^= current
+            coefficients >>= 1
+            current = self._step(current)
+        self._register = register
 
         return self._register
+
+    def _x_pow_mod(self, n: int) -> int:
+        """
+        Compute x^n mod P(x) over GF(2), where P(x) is the characteristic polynomial.
+
+        Args:
+            n (int): The exponent, zero or more.
+
+        Returns:
+            int: The remainder polynomial, bit i is the coefficient of x^i.
+        """
+        result = 1
+        for digit in bin(n)[2:]:
+            result = self._mul_mod(result, result)
+            if digit == '1':
+                result <<= 1
+                if result >> self._bits:
+                    result ^= self._polynomial
+        return result
+
+    def _mul_mod(self, a: int, b: int) -> int:
+        """
+        Multiply two polynomials modulo the characteristic polynomial, over GF(2).
+
+        Args:
+            a (int): A polynomial of degree less than bits, bit i is the coefficient of x^i.
+            b (int): Another polynomial of degree less than bits.
+
+        Returns:
+            int: The product modulo P(x).
+        """
+        result = 0
+        while b:
+            if b & 1:
+                result ^= a
+            b >>= 1
+            a <<= 1
+            if a >> self._bits:
+                a ^= self._polynomial
+        return result
@@ -0,0 +1,315 @@
+# standard libraries
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+import zlib
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .code128 import modules
+    from .renderers import BarcodeRenderer, QRRenderer
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from code128 import modules
+    from renderers import BarcodeRenderer, QRRenderer
+
+
+_PT_PER_MM: float = 72 / 25.4
+
+
+class SheetLayout:
+    """
+    Where labels go on a page: a grid of columns and rows inside the page margins, with gaps between labels.
+    All sizes are in mm.
+    """
+
+    pages: Dict[str, Tuple[float, float]] = {
+        'a4': (210.0, 297.0),
+        'letter': (215.9, 279.4),
+    }
+
+    def __init__(self, columns: int = 3, rows: int = 8, page: str = 'a4', margin: float = 10.0,
+                 gap: float = 2.0) -> None:
+        """
+        Initialize SheetLayout instance.
+
+        Args:
+            columns (int): labels across the page
+            rows (int): labels down the page
+            page (str): the paper size, a4 or letter
+            margin (float): the blank space around the edge of the page
+            gap (float): the blank space between labels
+
+        Returns:
+            None
+        """
+        if not isinstance(columns, int) or not isinstance(rows, int) or columns < 1 or rows < 1:
+            raise ValueError("A sheet needs at least one column and one row of labels.")
+        if page not in self.pages:
+            raise ValueError(f"Unknown page {page}, choose from {sorted(self.pages)}.")
+        self.columns = columns
+        self.rows = rows
+        self.page_width, self.page_height = self.pages[page]
+        self.margin = margin
+        self.gap = gap
+        self.label_width = (self.page_width - 2 * margin - (columns - 1) * gap) / columns
+        self.label_height = (self.page_height - 2 * margin - (rows - 1) * gap) / rows
+        if self.label_width <= 0 or self.label_height <= 0:
+            raise ValueError("The labels don't fit on the page.")
+
+    @classmethod
+    def parse(cls, grid: str, page: Optional[str] = None) -> "SheetLayout":
+        """
+        Make a layout from text like 3x8, columns by rows.
+
+        Args:
+            grid (str): columns x rows
+            page (str): the paper size, a4 or letter, default a4
+
+        Returns:
+            SheetLayout: the layout
+        """
+        try:
+            columns, rows = (int(part) for part in grid.lower().split('x'))
+        except ValueError:
+            raise ValueError(f"The sheet layout {grid} should look like 3x8, columns x rows.") from None
+        return cls(columns=columns, rows=rows, page=page or 'a4')
+
+    @property
+    def labels_per_page(self) -> int:
+        return self.columns * self.rows
+
+    def position(self, index: int) -> Tuple[float, float]:
+        """
+        Return where a label goes on its page, left to right then top to bottom.
+
+        Args:
+            index (int): the label's index on the page
+
+        Returns:
+            Tuple[float, float]: the label's bottom left corner, in mm from the bottom left of the page
+        """
+        row, column = divmod(index, self.columns)
+        x = self.margin + column * (self.label_width + self.gap)
+        y = self.page_height - self.margin - row * (self.label_height + self.gap) - self.label_height
+        return x, y
+
+
+class LabelSheet:
+    """
+    Write labels, each a QR code, a barcode and the human-readable number, onto the pages of a single PDF.
+    Everything is drawn as vectors, so it prints sharp at any size. Pages are written as soon as they are full, so
+    memory stays bounded. Like the serial numbers file, the PDF only gets its final name once closed.
+    """
+
+    name: str = 'labels.pdf'
+    _padding: float = 2.0   # mm between the edge of a label and its contents
+
+    def __init__(self, path: str, prefix: Optional[str] = None, layout: Optional[SheetLayout] = None,
+                 barcodes: bool = True, qr_codes: bool = True, digits: Optional[int] = None) -> None:
+        """
+        Initialize LabelSheet instance.
+
+        Args:
+            path (str): the directory where labels.pdf will be stored
+            prefix (str): what should be put before the number in the QR code
+            layout (SheetLayout): where labels go on a page, default 3 x 8 on A4
+            barcodes (bool): put a barcode on each label
+            qr_codes (bool): put a QR code on each label
+            digits (int): the digits of the config's biggest serial number, so every QR code is the same version
+
+        Returns:
+            None
+        """
+        self.layout = layout or SheetLayout()
+        self._barcodes = barcodes
+        self._qr = QRRenderer(prefix, digits) if qr_codes else None
+        self.path_file = os.path.join(path, self.name)
+        self._path_part = self.path_file + '.part'
+        self._file = open(self._path_part, 'wb')
+        self._offsets: Dict[int, int] = {}
+        self._last_object = 3
+        self._pages: List[int] = []
+        self._content: List[str] = []
+        self._on_page = 0
+        self.count = 0
+
+        # objects 1 to 3 are the catalog, the page tree, written last, and the font
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        self._object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    def add(self, number: int) -> None:
+        """
+        Add the label of one serial number.
+
+        Args:
+            number (int): the serial number
+
+        Returns:
+            None
+        """
+        x, y = self.layout.position(self._on_page)
+        self._draw_label(number, x * _PT_PER_MM, y * _PT_PER_MM)
+        self.count += 1
+        self._on_page += 1
+        if self._on_page == self.layout.labels_per_page:
+            self._flush_page()
+
+    def add_many(self, numbers: Iterable[int]) -> None:
+        """
+        Add the labels of serial numbers.
+
+        Args:
+            numbers (Iterable[int]): the serial numbers
+
+        Returns:
+            None
+        """
+        for number in numbers:
+            self.add(int(number))
+
+    def close(self) -> None:
+        """
+        Finish the PDF, with the page tree and cross-reference table, and give it its final name.
+
+        Returns:
+            None
+        """
+        if self._on_page or not self._pages:
+            self._flush_page()
+        kids = ' '.join(f"{page} 0 R" for page in self._pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+
+        size = max(self._offsets) + 1
+        xref = self._file.tell()
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        lines += [f"{self._offsets[number]:010d} 00000 n \n" for number in range(1, size)]
+        lines += [f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"]
+        self._file.write(''.join(lines).encode())
+        self._file.close()
+        os.replace(self._path_part, self.path_file)
+
+    def abort(self) -> None:
+        """
+        Close and delete the partial PDF.
+
+        Returns:
+            None
+        """
+        self._file.close()
+        os.remove(self._path_part)
+
+    def __enter__(self) -> "LabelSheet":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _draw_label(self, number: int, x: float, y: float) -> None:
+        """
+        Draw one label's contents.
+
+        Args:
+            number (int): the serial number
+            x (float): the label's left edge in points
+            y (float): the label's bottom edge in points
+
+        Returns:
+            None
+        """
+        padding = self._padding * _PT_PER_MM
+        width = self.layout.label_width * _PT_PER_MM - 2 * padding
+        height = self.layout.label_height * _PT_PER_MM - 2 * padding
+        x += padding
+        y += padding
+
+        # the QR code is a square on the left, with a quiet zone of 4 modules
+        if self._qr is not None:
+            grid = self._qr.make(number).modules
+            side = min(height, width / 2 if self._barcodes else width)
+            module = side / (len(grid) + 8)
+            self._draw_modules(grid, x + 4 * module, y + (height - side) / 2 + 4 * module, module)
+            x += side + padding
+            width -= side + padding
+
+        # the barcode fills the rest of the top, with a quiet zone of 10 modules each side
+        text_size = min(height * 0.25, 12.0)
+        if self._barcodes:
+            text = BarcodeRenderer.data(number)
+            bars = modules(text)
+            module = width / (len(bars) + 20)
+            self._draw_modules([[bar == '1' for bar in bars]], x + 10 * module, y + text_size * 1.5, module,
+                               height - text_size * 1.5)
+            text_y = y + text_size * 0.3
+        else:
+            text = str(number)
+            text_y = y + height / 2
+
+        # the number, centered under the barcode, Helvetica digits are 0.556 em wide
+        text_size = min(text_size, width / (len(text) * 0.556))
+        text_x = x + (width - len(text) * 0.556 * text_size) / 2
+        self._content.append(f"BT /F1 {text_size:.2f} Tf {text_x:.2f} {text_y:.2f} Td ({text}) Tj ET")
+
+    def _draw_modules(self, grid: List[List[bool]], x: float, y: float, module: float,
+                      row_height: Optional[float] = None) -> None:
+        """
+        Fill the dark modules of a grid, joining each run of dark modules in a row into one rectangle.
+
+        Args:
+            grid (List[List[bool]]): rows of modules, top to bottom, True is dark
+            x (float): the left edge in points
+            y (float): the bottom edge in points
+            module (float): the width of a module in points
+            row_height (float): the height of each row in points, default the same as the width
+
+        Returns:
+            None
+        """
+        row_height = row_height or module
+        top = y + len(grid) * row_height
+        rectangles = []
+        for r, row in enumerate(grid):
+            row_y = top - (r + 1) * row_height
+            start = None
+            for c, dark in enumerate(list(row) + [False]):
+                if dark and start is None:
+                    start = c
+                elif not dark and start is not None:
+                    rectangles.append(f"{x + start * module:.3f} {row_y:.3f} {(c - start) * module:.3f} "
+                                      f"{row_height:.3f} re")
+                    start = None
+        if rectangles:
+            self._content.extend(rectangles)
+            self._content.append("f")
+
+    def _flush_page(self) -> None:
+        """
+        Write the current page, its content stream and page object.
+
+        Returns:
+            None
+        """
+        stream = zlib.compress('\n'.join(self._content).encode())
+        content = self._next_object()
+        self._object(content, f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream +
+                     b"\nendstream")
+        page = self._next_object()
+        width = self.layout.page_width * _PT_PER_MM
+        height = self.layout.page_height * _PT_PER_MM
+        self._object(page, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+                           f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content} 0 R >>".encode())
+        self._pages.append(page)
+        self._content = []
+        self._on_page = 0
+
+    def _next_object(self) -> int:
+        self._last_object += 1
+        return self._last_object
+
+    def _object(self, number: int, body: bytes) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
@@ -0,0 +1,150 @@
+# standard libraries
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .config import Config
+    from .full_cycle_random import FullCycleRandom
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from config import Config
+    from full_cycle_random import FullCycleRandom
+
+
+class Lease:
+    """
+    A block of the cycle handed out whole: the count serial numbers that follow the seed. Whoever holds it generates
+    them offline, without the config, and blocks never overlap each other or the batches.
+    """
+
+    def __init__(self, seed: int, count: int, smallest: int, biggest: int, holder: Optional[str] = None,
+                 position: int = 0, key: Optional[int] = None, taps: Optional[List[int]] = None) -> None:
+        """
+        Initialize Lease instance.
+
+        Args:
+            seed (int): the seed the block starts from, its first serial number is the one after it
+            count (int): how many serial numbers
+            smallest (int): the config's smallest serial number
+            biggest (int): the config's biggest serial number
+            holder (str): who the block was handed to, for the record
+            position (int): how many serial numbers were issued before the block
+            key (int): the config's Feistel key, None when it uses the shift register
+            taps (List[int]): the config's shift register taps, None with a key
+
+        Returns:
+            None
+        """
+        self.seed = seed
+        self.count = count
+        self.smallest = smallest
+        self.biggest = biggest
+        self.holder = holder
+        self.position = position
+        self.key = key
+        self.taps = taps
+
+    def serial_numbers(self) -> Iterator[int]:
+        """
+        Generate the block's serial numbers, in order, a chunk at a time.
+
+        Returns:
+            Iterator[int]: the serial numbers
+        """
+        fcr = FullCycleRandom(min_int=self.smallest, seed=self.seed, max_int=self.biggest, position=self.position,
+                              key=self.key, taps=self.taps)
+        remaining = self.count
+        while remaining > 0:
+            chunk = fcr.batch(min(remaining, fcr.chunk_size))
+            remaining -= len(chunk)
+            yield from (int(number) for number in chunk)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'seed': self.seed, 'count': self.count, 'smallest': self.smallest, 'biggest': self.biggest,
+                'holder': self.holder, 'position': self.position, 'key': self.key, 'taps': self.taps}
+
+    def save(self, path_file: str) -> None:
+        """
+        Save the lease, to send to its holder. It is written under a temporary name, flushed to disk and renamed, so
+        a crash never leaves a half written lease.
+
+        Args:
+            path_file (str): the path and file name
+
+        Returns:
+            None
+        """
+        path_part = path_file + '.part'
+        with open(path_part, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path_part, path_file)
+
+    @classmethod
+    def load(cls, path_file: str) -> "Lease":
+        """
+        Load a lease saved by save().
+
+        Args:
+            path_file (str): the path and file name
+
+        Returns:
+            Lease: the lease
+        """
+        with open(path_file, 'r') as f:
+            return cls(**json.load(f))
+
+
+def take_lease(config: Config, count: int, holder: Optional[str] = None) -> Lease:
+    """
+    Hand out the next count serial numbers of the cycle as a block, moving the seed past them and journaling the
+    lease. Hold the config's lock, and save the config afterwards.
+
+    Args:
+        config (Config): the loaded config
+        count (int): how many serial numbers
+        holder (str): who the block is handed to, for the record
+
+    Returns:
+        Lease: the lease, or raises OverflowError when not enough serial numbers are left in the cycle
+    """
+    if not isinstance(count, int) or count < 1:
+        raise ValueError("A lease needs at least one serial number.")
+    if count > config.remaining():
+        raise OverflowError(f"Only {config.remaining()} serial numbers are left in the cycle.")
+    lease = Lease(config.seed, count, config.smallest, config.biggest, holder, config.issued, config.key,
+                  config.taps)
+
+    fcr = config.generator()
+    if config.key is not None:
+        # the Feistel engine maps positions to numbers, so the block's ends are computed straight away
+        config.seed_cycle_block(count, fcr.serial_at(config.issued), fcr.serial_at(config.issued + count - 1))
+    else:
+        # the shift register has to be stepped through the block, a chunk at a time so the memory used stays bounded
+        remaining = count
+        while remaining > 0:
+            chunk = fcr.batch(min(remaining, fcr.chunk_size))
+            config.seed_cycle_many(chunk)
+            remaining -= len(chunk)
+    config.journal(None, count, lease={'seed': lease.seed, 'holder': holder})
+    return lease
+
+
+def leases(config: Config) -> List[Lease]:
+    """
+    List the leases in the journal, oldest first, for auditing.
+
+    Args:
+        config (Config): the config
+
+    Returns:
+        List[Lease]: the leases
+    """
+    return [Lease(record['lease']['seed'], record['count'], config.smallest, config.biggest,
+                  record['lease']['holder'], record.get('issued', record['count']) - record['count'], config.key,
+                  config.taps)
+            for record in config.records() if 'lease' in record]
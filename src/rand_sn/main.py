@@ -2,108 +2,227 @@
 
 # standard libraries
 from argparse import ArgumentParser, Namespace
-import json
+from itertools import chain, islice
 import os
-from typing import Any, Dict, Optional, Tuple
-
-# 3rd party libraries
-import barcode      # unconventional, instead of barcode, python-barcode must be installed
-from barcode.writer import ImageWriter
-import qrcode
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
 # local libraries
 try:
     # attempt relative import (assuming running as part of a package)
     from .batch import Batch
+    from .batch_generator import abort_batch, finish_batch, sync_verify_index
     from .config import Config
     from .full_cycle_random import FullCycleRandom
+    from .label_sheet import LabelSheet, SheetLayout
+    from .lease import take_lease
+    from .raster import png_complete, svg_complete
+    from .renderers import BarcodeRenderer, QRRenderer, image_formats, render_chunk
+    from .serial_file import WRITERS, SerialWriter, find_serial_file, read_serial_numbers
+    from .verify import VerifyIndex
 except ImportError:
     # fallback to absolute import (assuming running as standalone script)
     from batch import Batch
+    from batch_generator import abort_batch, finish_batch, sync_verify_index
     from config import Config
     from full_cycle_random import FullCycleRandom
+    from label_sheet import LabelSheet, SheetLayout
+    from lease import take_lease
+    from raster import png_complete, svg_complete
+    from renderers import BarcodeRenderer, QRRenderer, image_formats, render_chunk
+    from serial_file import WRITERS, SerialWriter, find_serial_file, read_serial_numbers
+    from verify import VerifyIndex
+
 
+_chunk_size: int = 1000     # the most serial numbers generated and rendered at a time
+_checkpoint_seconds: float = 10.0   # the most time between checkpoints of a batch in progress
+_resumed_options: Tuple[str, ...] = ('format', 'no_images', 'barcode_only', 'qr_only', 'image_format',
+                                     'compress_level')  # kept for --resume
 
-def generate_barcode(number: int, path: str) -> None:
+
+def generate_barcode(number: int, path: str, image_format: str = 'png') -> None:
     """
     Generate a barcode using Code 128C format.
+    To generate many, create a BarcodeRenderer once and call its save method instead.
 
     Args:
         number (int): the number that should be in the barcode
         path (str): the path where the barcode should be stored
+        image_format (str): 'png' or 'svg'
 
     Returns:
         None
     """
-    # Choose the barcode format
-    barcode_format = 'code128'
+    BarcodeRenderer(image_format=image_format).save(number, path)
+
+
+def generate_qrcode(number: int, path: str, prefix: Optional[str], image_format: str = 'png') -> None:
+    """
+    Generate a QR code.
+    To generate many, create a QRRenderer once and call its save method instead.
 
-    # Ensure the number is positive and pad with a leading zero if the length is odd
-    if not isinstance(number, int) or number < 0:
-        raise ValueError("number argument must be a positive integer.")
-    data = str(number)
-    if len(data) % 2 != 0:
-        data = '0' + data  # Pad with leading zero if necessary
+    Args:
+        number (int): the number that should be in the barcode
+        prefix (str): what should be put before the number in the QR code, example, https://mydomain.com/c/.
+        path (str): the path where the barcode should be stored
+        image_format (str): 'png' or 'svg'
 
-    # Adjustments for the ImageWriter
-    options = {
-        'module_width': 0.2,
-        'module_height': 15.0,
-        'quiet_zone': 6.5,
-        'text_distance': 5.0,
-        'font_size': 10,
-        'background': 'white',
-        'foreground': 'black',
-    }
+    Returns:
+        None
+    """
+    QRRenderer(prefix, image_format=image_format).save(number, path)
 
-    # Create the ImageWriter with options
-    writer = barcode.writer.ImageWriter()
 
-    # Apply writer options directly to the writer instance
-    # Note: This step is adjusted to correctly use the writer instance with options
-    writer_options = options  # This line is not needed; options are passed directly to the writer in the save method
+def render_numbers(chunks: Iterable[List[int]], path: str, prefix: Optional[str], args: Namespace,
+                   write: Optional[Callable[[str, bytes], None]] = None, digits: Optional[int] = None) -> None:
+    """
+    Generate the images the command line asked for, in this process or spread over a pool of processes.
 
-    # Create the barcode object without passing writer_options
-    code128_class = barcode.get_barcode_class(barcode_format)
-    code128 = code128_class(data, writer=writer)
+    Args:
+        chunks (Iterable[List[int]]): the serial numbers, in chunks
+        path (str): the path where the images should be stored
+        prefix (str): what should be put before the number in the QR code
+        args: The namespace object returned by argparse.parse_args().
+        write (Callable[[str, bytes], None]): if given, images are passed to it instead of being saved in the path,
+            a label sheet is still saved in the path
+        digits (int): the digits of the config's biggest serial number, so every QR code is the same version
 
-    # Save the barcode as an image with writer options
-    output_filename = f"bar{number}"
-    code128.save(os.path.join(path, output_filename), options=writer_options)
+    Returns:
+        None or raises an error.
+    """
+    barcodes = not (args.no_images or args.qr_only)
+    qr_codes = not (args.no_images or args.barcode_only)
+    workers = args.workers or 1
+    if args.sheet is not None and (barcodes or qr_codes):
+        with LabelSheet(path, prefix, SheetLayout.parse(args.sheet, args.page), barcodes, qr_codes, digits) as sheet:
+            for chunk in chunks:
+                sheet.add_many(chunk)
+    elif not (barcodes or qr_codes):
+        for _ in chunks:    # nothing to render, but the chunks still need generating
+            pass
+    else:
+        render_pipelined(chunks, path, prefix, workers, barcodes, qr_codes, write, args.image_format or 'png',
+                         args.compress_level, digits)
 
 
-def generate_qrcode(number: int, path: str, prefix: Optional[str]) -> None:
+def chunk_size_for(number: int, args: Namespace) -> int:
     """
-    Generate a QR code.
+    Decide how many serial numbers to generate and render at a time.
 
     Args:
-        number (int): the number that should be in the barcode
-        prefix (str): what should be put before the number in the QR code, example, https://mydomain.com/c/.
-        path (str): the path where the barcode should be stored
+        number (int): how many serial numbers there are in all
+        args: The namespace object returned by argparse.parse_args().
 
     Returns:
-        None
+        int: the chunk size
     """
+    # with workers, several chunks per process, so processes that finish early pick up more work
+    workers = args.workers or 1
+    return min(_chunk_size, max(1, -(-number // (workers * 4))))
+
 
-    # Generate QR code
-    qr = qrcode.QRCode(
-        # version=1,      # size 1(small) to 40(large) or omit and use fit=True for auto
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,    # the size of each box (pixel) in the QR code
-        border=4,       # recommended minimum is 4
-    )
-    if prefix is not None:
-        data = f"{prefix}{number}"
+def render_pipelined(chunks: Iterable[List[int]], path: str, prefix: Optional[str], workers: int,
+                     barcodes: bool = True, qr_codes: bool = True,
+                     write: Optional[Callable[[str, bytes], None]] = None, image_format: str = 'png',
+                     compress_level: Optional[int] = None, digits: Optional[int] = None) -> None:
+    """
+    Generate the barcodes and QR codes for chunks of serial numbers, while the next chunks are generated and the
+    images of those done are written, see render_pipeline. With more than one worker, they are rendered by a pool of
+    processes. Only a few chunks per process are pending at any time, so memory stays bounded.
+
+    Args:
+        chunks (Iterable[List[int]]): the serial numbers, in chunks
+        path (str): the path where the images should be stored
+        prefix (str): what should be put before the number in the QR code
+        workers (int): the number of processes
+        barcodes (bool): generate the barcodes
+        qr_codes (bool): generate the QR codes
+        write (Callable[[str, bytes], None]): if given, the images are passed to it instead of being saved in the path
+        image_format (str): 'png' or 'svg'
+        compress_level (int): the zlib level of the PNGs, 0 to 9
+        digits (int): the digits of the config's biggest serial number, so every QR code is the same version
+
+    Returns:
+        None or raises the first error a stage ran into.
+    """
+    # here rather than at the top, only rendering needs them
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    try:
+        from .pipeline import render_pipeline
+    except ImportError:
+        from pipeline import render_pipeline
+
+    if write is None:
+        def write(name: str, data: bytes) -> None:
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(data)
+
+    render = partial(render_chunk, path=None, prefix=prefix, barcodes=barcodes, qr_codes=qr_codes,
+                     image_format=image_format, compress_level=compress_level, digits=digits)
+    if workers == 1:
+        asyncio.run(render_pipeline(chunks, render, write))
     else:
-        data = str(number)
-    qr.add_data(data)
-    qr.make(fit=True)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            executor.submit(int).result()   # start the processes before the pipeline's threads, forking is safer then
+            asyncio.run(render_pipeline(chunks, render, write, executor, workers * 2))
 
-    # Create an image from the QR Code instance
-    img = qr.make_image(fill_color="black", back_color="white")
 
-    # Save the image
-    img.save(os.path.join(path, f"qr{number}.png"))
+def issue(fcr: FullCycleRandom, config: Config, number: int, chunk_size: int,
+          writer: SerialWriter, checkpoint: Optional[Callable[[], None]] = None) -> Iterator[List[int]]:
+    """
+    Generate serial numbers a chunk at a time, updating the seed and writing each chunk as it goes.
+
+    Args:
+        fcr (FullCycleRandom): the generator, resumed from the config's seed
+        config (Config): the config, its seed is updated and checked for overflow
+        number (int): how many serial numbers
+        chunk_size (int): how many serial numbers per chunk
+        writer (SerialWriter): where the serial numbers are written
+        checkpoint (Callable[[], None]): called after each chunk is written, to record the progress
+
+    Returns:
+        Iterator[List[int]]: the chunks of serial numbers
+    """
+    while number > 0:
+        chunk = [int(serial_number) for serial_number in fcr.batch(min(chunk_size, number))]
+        config.seed_cycle_many(chunk)   # update the seed and check for overflow
+        writer.write_many(chunk)
+        number -= len(chunk)
+        if checkpoint is not None:
+            checkpoint()
+        yield chunk
+
+
+def unfinished(fcr: FullCycleRandom, number: int, chunk_size: int, path: str, barcodes: bool = True,
+               qr_codes: bool = True, image_format: str = 'png') -> Iterator[List[int]]:
+    """
+    Go over the serial numbers an interrupted batch already issued, to find those with images missing or cut short.
+
+    Args:
+        fcr (FullCycleRandom): the generator, started from the seed the batch started from
+        number (int): how many serial numbers the batch issued
+        chunk_size (int): how many serial numbers per chunk
+        path (str): the batch directory
+        barcodes (bool): the batch has barcodes
+        qr_codes (bool): the batch has QR codes
+        image_format (str): the batch's images are 'png' or 'svg'
+
+    Returns:
+        Iterator[List[int]]: the chunks of serial numbers whose images need rendering again
+    """
+    names = ([BarcodeRenderer.file_name] if barcodes else []) + ([QRRenderer.file_name] if qr_codes else [])
+    complete = svg_complete if image_format == 'svg' else png_complete
+    if not names:
+        return
+    while number > 0:
+        chunk = [int(serial_number) for serial_number in fcr.batch(min(chunk_size, number))]
+        number -= len(chunk)
+        chunk = [serial_number for serial_number in chunk
+                 if not all(complete(os.path.join(path, name(serial_number, image_format))) for name in names)]
+        if chunk:
+            yield chunk
 
 
 def validate_args() -> Tuple[bool, Namespace]:
@@ -130,10 +249,63 @@ def validate_args() -> Tuple[bool, Namespace]:
                         help="The biggest possible serial number. There is no default.")
     parser.add_argument("-p", "--prefix", type=str,
                         help="A prefix added to the start of every QR code. There is no default.")
+    parser.add_argument("-e", "--engine", choices=Config.engines,
+                        help="What shuffles the serial numbers: lfsr (a shift register) or feistel (a keyed "
+                             "permutation of the exact range, as fast for any range). Default is lfsr.")
 
     # Batching mode arguments
     parser.add_argument("-n", "--number", type=int,
                         help="The number of serial numbers you need in the new batch.")
+    parser.add_argument("-w", "--workers", type=int,
+                        help="The number of processes that render images. Default is 1.")
+    images = parser.add_mutually_exclusive_group()
+    images.add_argument("--no-images", action="store_true",
+                        help="Only issue the serial numbers, render images later with --render.")
+    images.add_argument("--barcode-only", action="store_true",
+                        help="Render barcodes but not QR codes.")
+    images.add_argument("--qr-only", action="store_true",
+                        help="Render QR codes but not barcodes.")
+    parser.add_argument("-i", "--image-format", choices=image_formats,
+                        help="The image files' format: png (1-bit) or svg (vector, prints sharp at any size). "
+                             "Default is png.")
+    parser.add_argument("--compress-level", type=int, metavar="LEVEL",
+                        help="The zlib compression level of PNG images, from 0 (none) to 9. Default is 4.")
+    parser.add_argument("--sheet", nargs="?", const="3x8", metavar="COLUMNSxROWS",
+                        help="Put the labels on the pages of one labels.pdf instead of image files. "
+                             "Default is 3x8 labels per page.")
+    parser.add_argument("--page", choices=sorted(SheetLayout.pages),
+                        help="The paper size of the label sheets. Default is a4.")
+    parser.add_argument("-a", "--archive", action="store_true",
+                        help="Store the batch in a single zip archive instead of a directory.")
+    parser.add_argument("-d", "--digits", type=int,
+                        help="The minimum number of digits in batch names, remembered for later batches. "
+                             "Default is 5.")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS),
+                        help="The serial numbers file format: json, jsonl (JSON Lines), csv or bin (packed unsigned "
+                             "64-bit little-endian). Default is json.")
+
+    # Rendering mode arguments, the images and workers arguments apply too
+    parser.add_argument("-r", "--render", type=str, metavar="BATCH",
+                        help="Render the images for the serial numbers of an existing batch directory.")
+
+    # Resuming mode arguments, the workers argument applies too
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted batch from its last checkpoint.")
+
+    # Server mode arguments
+    parser.add_argument("--serve", nargs="?", const="127.0.0.1:8080", metavar="ADDRESS",
+                        help="Hand out serial numbers over HTTP at host:port, or a Unix socket path. "
+                             "Default is 127.0.0.1:8080.")
+
+    # Leasing mode arguments
+    parser.add_argument("--lease", type=int, metavar="COUNT",
+                        help="Hand out a block of COUNT serial numbers, saved to a lease file, to generate offline.")
+    parser.add_argument("--holder", type=str,
+                        help="Who the lease is for, kept in the journal.")
+
+    # Verifying mode arguments
+    parser.add_argument("--verify", type=int, nargs="+", metavar="SERIAL",
+                        help="Tell which batch each serial number was issued in, for example a scanned label.")
 
     # Parse the command line arguments
     args = parser.parse_args()
@@ -145,11 +317,39 @@ def validate_args() -> Tuple[bool, Namespace]:
         raise ValueError("The biggest serial number must be greater than the smallest serial number.")
     if args.number is not None and args.number < 1:
         raise ValueError("The number of serial numbers must be greater than 0.")
+    if args.digits is not None and args.digits < 1:
+        raise ValueError("The number of digits must be greater than 0.")
+    if args.workers is not None and args.workers < 1:
+        raise ValueError("The number of workers must be greater than 0.")
+    if args.render is not None and args.number is not None:
+        raise ValueError("Render an existing batch or generate a new one, not both.")
+    if args.compress_level is not None and not 0 <= args.compress_level <= 9:
+        raise ValueError("The compression level must be from 0 to 9.")
+    if args.sheet is not None and (args.image_format is not None or args.compress_level is not None):
+        raise ValueError("A label sheet is a PDF, the image format and compression level are for image files.")
+    if args.sheet is not None:
+        SheetLayout.parse(args.sheet, args.page)    # raises ValueError when it isn't a layout that fits
+    if args.render is not None and (args.archive or not os.path.isdir(args.render)):
+        raise ValueError("Only batch directories can be rendered, extract an archive first.")
+    if args.render is not None and args.no_images:
+        raise ValueError("There is nothing to render with --no-images.")
+    if args.resume and (args.number is not None or args.render is not None or args.archive or args.sheet is not None):
+        raise ValueError("Resume the interrupted batch on its own, the options it started with are kept.")
+
+    if args.serve is not None and (args.number is not None or args.render is not None or args.resume):
+        raise ValueError("Serve serial numbers or generate a batch, not both.")
+    if args.lease is not None and (args.lease < 1 or args.number is not None or args.render is not None or
+                                   args.resume or args.serve is not None):
+        raise ValueError("A lease needs at least one serial number, and is taken on its own.")
+    if args.verify is not None and (args.number is not None or args.render is not None or args.resume or
+                                    args.serve is not None or args.lease is not None):
+        raise ValueError("Verify serial numbers on their own.")
 
     # Check if we're in configuration mode or batching mode based on provided arguments.
-    if args.smallest is not None or args.biggest is not None or args.prefix is not None:
+    if args.smallest is not None or args.biggest is not None or args.prefix is not None or args.engine is not None:
         config_mode = True
-    elif args.number is not None:
+    elif (args.number is not None or args.render is not None or args.resume or args.serve is not None or
+          args.lease is not None or args.verify is not None):
         config_mode = False
     else:
         parser.print_help()
@@ -169,14 +369,16 @@ def configure(args: Namespace) -> None:
         None or raises an error.
     """
     config = Config(config_filename=args.config)
-    config.configure(smallest=args.smallest, biggest=args.biggest, prefix=args.prefix)
-    config.save()
+    config.configure(smallest=args.smallest, biggest=args.biggest, prefix=args.prefix, engine=args.engine or 'lfsr')
+    with config.lock():
+        config.save()
     print(f"Configured successfully. Important, keep this backed up: {config.path_file}")
 
 
 def next_batch(args: Namespace) -> None:
     """
-    Generate the next batch of serial numbers, barcodes and QR codes.
+    Generate the next batch of serial numbers, barcodes and QR codes, or carry on with an interrupted one.
+    Only one process at a time issues serial numbers from a config.
 
     Args:
         args: The namespace object returned by argparse.parse_args().
@@ -184,36 +386,185 @@ def next_batch(args: Namespace) -> None:
     Returns:
         None or raises an error.
     """
-    # preparation
     config = Config(config_filename=args.config)
-    config.load()
-    fcr = FullCycleRandom(min_int=config.smallest, seed=config.seed, max_int=config.biggest)
-    batch = Batch()
+    with config.lock():
+        config.load()
+        generate_batch(args, config)
+
+
+def generate_batch(args: Namespace, config: Config) -> None:
+    """
+    Generate the next batch of serial numbers, barcodes and QR codes, or carry on with an interrupted one.
+
+    Args:
+        args: The namespace object returned by argparse.parse_args().
+        config (Config): the loaded config, its lock held
 
-    # proceed, but if anything goes wrong delete the batch, otherwise save the new seed
+    Returns:
+        None or raises an error.
+    """
+    # preparation
+    if args.resume:
+        # carry on from the last checkpoint, with the options the batch started with
+        record = config.last_record()
+        if record is None or 'checkpoint' not in record:
+            raise ValueError("There is no interrupted batch to resume.")
+        progress = record['checkpoint']
+        for option, value in progress['options'].items():
+            setattr(args, option, value)
+        batch = Batch(number=record['batch'])
+        writer = WRITERS[args.format or 'json'](batch.path_directory, record['count'], progress['offset'])
+    else:
+        # reject what can't be done before anything is made
+        if args.number > config.remaining():
+            raise OverflowError(f"Only {config.remaining()} serial numbers are left in the cycle.")
+
+        # only batch directories of image files can be resumed, not archives or label sheets
+        progress = {'total': args.number, 'seed_from': config.seed, 'position_from': config.issued,
+                    'options': {option: getattr(args, option) for option in _resumed_options}}
+        batch = Batch(archive=args.archive, digits=args.digits)
+        writer = WRITERS[args.format or 'json'](batch.path_directory)
+    resumable = not (batch.archive or args.sheet is not None)
+    fcr = config.generator()
+    number = progress['total'] - writer.count
+    chunk_size = chunk_size_for(number, args)
+    checkpointed = args.resume
+    last_checkpoint = time.monotonic()
+
+    def checkpoint() -> None:
+        nonlocal checkpointed, last_checkpoint
+        if resumable and time.monotonic() - last_checkpoint >= _checkpoint_seconds:
+            progress['offset'] = writer.checkpoint()
+            config.journal(batch.number, writer.count, progress)
+            checkpointed = True
+            last_checkpoint = time.monotonic()
+
+    # proceed, but if anything goes wrong delete the batch or keep it to resume, otherwise save the new seed
     try:
-        # for each new serial number generate a bar and QR code
-        serial_numbers: list[int] = []
-        for _ in range(args.number):
-            number = next(fcr)
-            config.seed_cycle(number)   # update the seed and check for overflow
-            serial_numbers.append(number)
-            generate_barcode(number, batch.path_directory)
-            generate_qrcode(number, batch.path_directory, config.prefix)
-
-        # store all new serial numbers in a file
-        with open(os.path.join(batch.path_directory, 'serial-numbers.json'), 'w') as f:
-            json.dump(serial_numbers, f, indent=4)
-
-    # No matter what went wrong, delete the incomplete batch.
-    except Exception as e:
-        batch.delete()  # Call the delete method
+        # generate serial numbers a chunk at a time, for each generate a bar and QR code
+        chunks = issue(fcr, config, number, chunk_size, writer, checkpoint)
+        if args.resume:
+            # first render again what was missing, or cut short, when the batch was interrupted
+            fcr_issued = config.generator(progress['seed_from'], progress.get('position_from', 0))
+            chunks = chain(unfinished(fcr_issued, writer.count, chunk_size, batch.path_directory,
+                                      not (args.no_images or args.qr_only),
+                                      not (args.no_images or args.barcode_only), args.image_format or 'png'), chunks)
+        render_numbers(chunks, batch.path_directory, config.prefix, args, batch.write if batch.archive else None,
+                       len(str(config.biggest)))
+
+        # the serial numbers file only gets its final name once complete, from then on the batch can't be resumed
+        writer.close()
+        checkpointed = False
+        finish_batch(batch, config, writer.count, progress['seed_from'], progress.get('position_from'))
+
+    # No matter what went wrong, keep a checkpointed batch, otherwise delete the incomplete batch.
+    except BaseException:
+        if checkpointed:
+            writer.pause()  # the partial file is kept, to carry on with
+            print(f"Batch {batch.number} was interrupted, continue it with --resume.")
+        else:
+            abort_batch(batch, (writer,))
         raise   # re-raise, let the caller know what went wrong
 
-    # All went well, save the config, so the next batch continues the sequence.
+    # All went well, save the config, so the next batch continues the sequence. Should that fail, the journal has it.
     else:
         config.save()
-        print(f"Batch {batch.number} generated {args.number} serial numbers. Look here: {batch.path_directory}")
+        sync_verify_index(config)
+        print(f"Batch {batch.number} generated {writer.count} serial numbers, {config.remaining()} are left. "
+              f"Look here: {batch.path_archive or batch.path_directory}")
+
+
+def serve(args: Namespace) -> None:
+    """
+    Hand out serial numbers to clients until interrupted, see IssuanceServer.
+
+    Args:
+        args: The namespace object returned by argparse.parse_args().
+
+    Returns:
+        None or raises an error.
+    """
+    # here rather than at the top, only serving needs asyncio
+    import asyncio
+    try:
+        from .server import IssuanceServer
+    except ImportError:
+        from server import IssuanceServer
+
+    config = Config(config_filename=args.config)
+    with config.lock():
+        config.load()
+        print(f"Handing out serial numbers at {args.serve}, stop with Ctrl+C.")
+        try:
+            asyncio.run(IssuanceServer(config).serve(args.serve))
+        except KeyboardInterrupt:
+            pass
+    print(f"Stopped, the config is saved: {config.path_file}")
+
+
+def lease(args: Namespace) -> None:
+    """
+    Hand out a block of the cycle, saved to a lease file for whoever generates the serial numbers offline.
+
+    Args:
+        args: The namespace object returned by argparse.parse_args().
+
+    Returns:
+        None or raises an error.
+    """
+    config = Config(config_filename=args.config)
+    with config.lock():
+        config.load()
+        block = take_lease(config, args.lease, args.holder)
+        config.save()
+    path_file = os.path.abspath(f"rand-sn-lease-{block.seed}.json")
+    block.save(path_file)
+    print(f"Leased {block.count} serial numbers. Send this to the holder: {path_file}")
+
+
+def verify(args: Namespace) -> None:
+    """
+    Tell which batch each serial number was issued in, bringing the verification index up to date first. The
+    config's lock is held meanwhile, so the index isn't synced while a batch is being issued.
+
+    Args:
+        args: The namespace object returned by argparse.parse_args().
+
+    Returns:
+        None or raises an error.
+    """
+    config = Config(config_filename=args.config)
+    with config.lock():
+        config.load()
+        with VerifyIndex(config) as index:
+            index.sync()
+            for number in args.verify:
+                batch = index.lookup(number)
+                print(f"{number}: batch {batch}" if batch is not None else f"{number}: not issued in a batch")
+
+
+def render_batch(args: Namespace) -> None:
+    """
+    Generate the barcodes and QR codes of an existing batch, for example one generated with --no-images.
+
+    Args:
+        args: The namespace object returned by argparse.parse_args().
+
+    Returns:
+        None or raises an error.
+    """
+    config = Config(config_filename=args.config)
+    config.load()
+    path = os.path.abspath(args.render)
+    path_file = find_serial_file(path)
+
+    # count first, so the chunks can be sized for the workers
+    number = sum(1 for _ in read_serial_numbers(path_file))
+    chunk_size = chunk_size_for(number, args)
+    serial_numbers = read_serial_numbers(path_file)
+    chunks = iter(lambda: list(islice(serial_numbers, chunk_size)), [])
+    render_numbers(chunks, path, config.prefix, args, digits=len(str(config.biggest)))
+    print(f"Rendered the images of {number} serial numbers. Look here: {path}")
 
 
 def main() -> None:
@@ -232,6 +583,14 @@ def main() -> None:
     config_mode, validated_args = validate_args()
     if config_mode:
         configure(validated_args)
+    elif validated_args.render is not None:
+        render_batch(validated_args)
+    elif validated_args.serve is not None:
+        serve(validated_args)
+    elif validated_args.lease is not None:
+        lease(validated_args)
+    elif validated_args.verify is not None:
+        verify(validated_args)
     else:
         next_batch(validated_args)
 
@@ -0,0 +1,93 @@
+# standard libraries
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Tuple
+
+
+async def async_chunks(chunks: Iterable[List[int]], executor: Optional[Executor] = None) -> AsyncIterator[List[int]]:
+    """
+    Go through chunks of serial numbers without blocking the event loop. Each chunk is taken in the executor, since
+    making one can mean updating the seed, writing the serial numbers file and journaling.
+
+    Args:
+        chunks (Iterable[List[int]]): the serial numbers, in chunks
+        executor (Executor): where the chunks are taken, by default the event loop's threads
+
+    Returns:
+        AsyncIterator[List[int]]: the chunks
+    """
+    loop = asyncio.get_running_loop()
+    chunks = iter(chunks)
+    while True:
+        chunk = await loop.run_in_executor(executor, next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def render_pipeline(chunks: Iterable[List[int]], render: Callable[[List[int]], List[Tuple[str, bytes]]],
+                          write: Callable[[str, bytes], None], executor: Optional[Executor] = None,
+                          depth: int = 1) -> None:
+    """
+    Render the images of chunks of serial numbers and write them, with the stages overlapping: while chunks are
+    rendered in the executor, the next ones are made in one thread and the images of those done are written in
+    another. The queues between the stages hold at most depth chunks, so a slow stage holds back the ones before it
+    and memory stays bounded.
+
+    Args:
+        chunks (Iterable[List[int]]): the serial numbers, in chunks
+        render (Callable[[List[int]], List[Tuple[str, bytes]]]): makes the file names and contents of a chunk's
+            images, it must pickle to go to a process pool
+        write (Callable[[str, bytes], None]): stores an image, only called from one thread at a time
+        executor (Executor): where the chunks are rendered, a process pool uses all the cores, by default the event
+            loop's threads
+        depth (int): how many chunks are rendered at a time, twice the processes of a pool keeps them all busy
+
+    Returns:
+        None or raises the first error a stage ran into, once the others are stopped.
+    """
+    loop = asyncio.get_running_loop()
+    numbers: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    images: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    rendering = depth
+
+    def write_all(files: List[Tuple[str, bytes]]) -> None:
+        for name, data in files:
+            write(name, data)
+
+    async def produce(io: Executor) -> None:
+        async for chunk in async_chunks(chunks, io):
+            await numbers.put(chunk)
+        for _ in range(depth):
+            await numbers.put(None)     # a stop for every renderer
+
+    async def render_chunks() -> None:
+        nonlocal rendering
+        while True:
+            chunk = await numbers.get()
+            if chunk is None:
+                break
+            await images.put(await loop.run_in_executor(executor, render, chunk))
+        rendering -= 1
+        if rendering == 0:
+            await images.put(None)      # the last renderer stops the writer
+
+    async def write_images(io: Executor) -> None:
+        while True:
+            files = await images.get()
+            if files is None:
+                return
+            await loop.run_in_executor(io, write_all, files)
+
+    # one thread makes the chunks and the other writes, leaving the block waits for what they are doing
+    with ThreadPoolExecutor(max_workers=2) as io:
+        tasks = [loop.create_task(produce(io)), loop.create_task(write_images(io))]
+        tasks += [loop.create_task(render_chunks()) for _ in range(depth)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # cancelling a task waiting for the executor cancels its chunk unless it is already being rendered
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
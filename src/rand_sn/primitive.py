@@ -0,0 +1,303 @@
+"""
+Find and check the taps of maximal-length shift registers, the ones whose characteristic polynomial is primitive.
+
+A polynomial P(x) of degree n over GF(2) with P(0) = 1 is primitive when the order of x modulo P(x) is 2^n - 1:
+x^(2^n - 1) = 1 and x^((2^n - 1) / q) != 1 for every prime factor q of 2^n - 1. Checking it takes a few hundred
+squarings, however long the cycle is, given the factors.
+
+Run it to regenerate the data file LFSR loads for the widths it has no hand-typed taps for:
+    python -m rand_sn.primitive [BITS]
+"""
+
+# standard libraries
+from itertools import combinations
+import json
+from math import gcd
+import os
+import random
+import sys
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+data_file: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'primitive_polynomials.json')
+max_bits: int = 128     # the widest register in the data file
+_small_primes: Tuple[int, ...] = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def polynomial(taps: Sequence[int]) -> int:
+    """
+    Return the characteristic polynomial of a shift register's taps, the same as LFSR uses.
+
+    Args:
+        taps (Sequence[int]): the taps, counting from 1 at the input, the first being the width
+
+    Returns:
+        int: the polynomial, bit i is the coefficient of x^i
+    """
+    bits = taps[0]
+    result = 1 << bits
+    for tap in taps:
+        result |= 1 << (bits - tap)
+    return result
+
+
+def _square_mod(a: int, p: int, bits: int) -> int:
+    """ Square a polynomial modulo p, over GF(2). Squaring spreads the bits out, base 4 does that in one go. """
+    a = int(bin(a)[2:], 4)
+    return _reduce(a, p, bits)
+
+
+def _reduce(a: int, p: int, bits: int) -> int:
+    # p is sparse, so reduce the high part by all of p's lower terms at once
+    low = p ^ (1 << bits)
+    while a >> bits:
+        high = a >> bits
+        a &= (1 << bits) - 1
+        term = low
+        while term:
+            lowest = term & -term
+            a ^= high * lowest     # a shift, lowest is a power of two
+            term ^= lowest
+    return a
+
+
+def x_pow_mod(n: int, p: int) -> int:
+    """
+    Compute x^n mod p over GF(2).
+
+    Args:
+        n (int): the exponent, zero or more
+        p (int): the modulus, bit i is the coefficient of x^i
+
+    Returns:
+        int: the remainder polynomial
+    """
+    bits = p.bit_length() - 1
+    result = 1
+    for digit in bin(n)[2:]:
+        result = _square_mod(result, p, bits)
+        if digit == '1':
+            result = _reduce(result << 1, p, bits)
+    return result
+
+
+def is_primitive(p: int, factors: Sequence[int]) -> bool:
+    """
+    Check a polynomial is primitive by the order of x modulo it.
+
+    Args:
+        p (int): the polynomial, bit i is the coefficient of x^i
+        factors (Sequence[int]): the distinct prime factors of 2^n - 1, n being the degree of p
+
+    Returns:
+        bool: True when p is primitive
+    """
+    bits = p.bit_length() - 1
+    if bits < 1 or not p & 1:
+        return False
+    order = (1 << bits) - 1
+    if x_pow_mod(order, p) != 1:
+        return False
+    return all(x_pow_mod(order // factor, p) != 1 for factor in factors if factor < order)
+
+
+def is_prime(n: int) -> bool:
+    """
+    Miller-Rabin with the first 13 primes as bases, which is exact below 3.3 * 10^24 and a strong test above it.
+
+    Args:
+        n (int): the number
+
+    Returns:
+        bool: True when n is prime
+    """
+    if n < 2:
+        return False
+    for prime in _small_primes:
+        if n % prime == 0:
+            return n == prime
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for base in _small_primes:
+        x = pow(base, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _pollard_brent(n: int) -> int:
+    """ Find a non-trivial factor of a composite n. """
+    if n % 2 == 0:
+        return 2
+    while True:
+        y, c, m = random.randrange(1, n), random.randrange(1, n), 128
+        g, r, q = 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+
+def prime_factors(n: int) -> List[int]:
+    """
+    Find the distinct prime factors of n.
+
+    Args:
+        n (int): the number, 1 or more
+
+    Returns:
+        List[int]: the prime factors, smallest first
+    """
+    factors = set()
+    for prime in range(2, 1 << 12):
+        if n % prime == 0:
+            factors.add(prime)
+            while n % prime == 0:
+                n //= prime
+    pending = [n] if n > 1 else []
+    while pending:
+        n = pending.pop()
+        if is_prime(n):
+            factors.add(n)
+        else:
+            factor = _pollard_brent(n)
+            pending.extend((factor, n // factor))
+    return sorted(factors)
+
+
+def mersenne_factors(bits: int) -> List[int]:
+    """
+    Find the distinct prime factors of 2^bits - 1. It is split by 2^d - 1 for every divisor d of bits first, which
+    leaves far smaller numbers to factor.
+
+    Args:
+        bits (int): the exponent, 1 or more
+
+    Returns:
+        List[int]: the prime factors, smallest first
+    """
+    parts = [(1 << bits) - 1]
+    for d in range(1, bits):
+        if bits % d == 0:
+            divisor = (1 << d) - 1
+            split = []
+            for part in parts:
+                g = gcd(part, divisor)
+                split.extend((g, part // g) if 1 < g < part else (part,))
+            parts = split
+    return sorted({factor for part in parts for factor in prime_factors(part)})
+
+
+def candidates(bits: int) -> Iterator[Tuple[int, ...]]:
+    """
+    Go through the taps of a width, the fewest taps first, then the ones nearest the output.
+
+    Args:
+        bits (int): the width of the register
+
+    Returns:
+        Iterator[Tuple[int, ...]]: taps, the first being the width
+    """
+    for count in (1, 3, 5):
+        for last in range(count, bits):
+            for others in combinations(range(last - 1, 0, -1), count - 1):
+                yield (bits, last) + others
+
+
+def search(bits: int, factors: Optional[Sequence[int]] = None) -> Tuple[int, ...]:
+    """
+    Find the taps of a maximal-length register, as few as possible.
+
+    Args:
+        bits (int): the width of the register, 2 or more
+        factors (Sequence[int]): the prime factors of 2^bits - 1, found when not given
+
+    Returns:
+        Tuple[int, ...]: the taps, the first being the width
+    """
+    if factors is None:
+        factors = mersenne_factors(bits)
+    for taps in candidates(bits):
+        if is_primitive(polynomial(taps), factors):
+            return taps
+    raise ValueError(f"No taps for {bits} bits.")     # there are always some, this isn't expected
+
+
+def generate(bits: int = max_bits, known: Optional[Dict[int, Sequence[int]]] = None) -> Dict[str, Dict[str, list]]:
+    """
+    Work out the taps of every width from 2 to bits, with the prime factors that prove them.
+
+    Args:
+        bits (int): the widest register
+        known (Dict[int, Sequence[int]]): taps to keep when they are maximal-length, by width
+
+    Returns:
+        Dict[str, Dict[str, list]]: the taps and factors by width, as in the data file
+    """
+    known = known or {}
+    result = {}
+    for width in range(2, bits + 1):
+        factors = mersenne_factors(width)
+        taps = known.get(width)
+        if taps is None or not is_primitive(polynomial(taps), factors):
+            taps = search(width, factors)
+        result[str(width)] = {'taps': list(taps), 'factors': factors}
+    return result
+
+
+def load() -> Dict[int, Dict[str, list]]:
+    """
+    Load the data file.
+
+    Returns:
+        Dict[int, Dict[str, list]]: the taps and factors by width
+    """
+    with open(data_file, 'r') as f:
+        return {int(width): entry for width, entry in json.load(f).items()}
+
+
+def main() -> None:
+    """
+    Regenerate the data file, keeping the hand-typed taps of LFSR that are maximal-length.
+
+    Returns:
+        None
+    """
+    # here rather than at the top, l_f_s_r imports this module
+    try:
+        from .l_f_s_r import LFSR
+    except ImportError:
+        from l_f_s_r import LFSR
+    bits = int(sys.argv[1]) if len(sys.argv) > 1 else max_bits
+    result = generate(bits, LFSR._optimal_taps)
+    path_part = data_file + '.part'
+    with open(path_part, 'w') as f:
+        f.write('{\n' + ',\n'.join(f'"{width}": {json.dumps(entry)}' for width, entry in result.items()) + '\n}\n')
+    os.replace(path_part, data_file)
+    print(f"Wrote the taps of 2 to {bits} bits: {data_file}")
+
+
+if __name__ == "__main__":
+    main()
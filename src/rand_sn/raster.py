@@ -0,0 +1,181 @@
+# standard libraries
+import os
+import re
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+import zlib
+
+
+# The zlib level of the PNGs, see benchmark_image_formats in tests/benchmark.py. Level 4 compresses a QR code in about
+# half the time of level 6, a barcode in about the same, and its files are 4-8% larger than those of levels 6 and 9.
+# Level 9 is barely smaller than level 6, and 4 to 6 times as slow.
+default_compress_level: int = 4
+
+
+# A tiny bitmap font for the human-readable digits under a barcode, 5 columns by 7 rows, '1' is dark.
+DIGITS: Dict[str, Tuple[str, ...]] = {
+    '0': ('01110', '10001', '10011', '10101', '11001', '10001', '01110'),
+    '1': ('00100', '01100', '00100', '00100', '00100', '00100', '01110'),
+    '2': ('01110', '10001', '00001', '00010', '00100', '01000', '11111'),
+    '3': ('11111', '00010', '00100', '00010', '00001', '10001', '01110'),
+    '4': ('00010', '00110', '01010', '10010', '11111', '00010', '00010'),
+    '5': ('11111', '10000', '11110', '00001', '00001', '10001', '01110'),
+    '6': ('00110', '01000', '10000', '11110', '10001', '10001', '01110'),
+    '7': ('11111', '00001', '00010', '00100', '01000', '01000', '01000'),
+    '8': ('01110', '10001', '10001', '01110', '10001', '10001', '01110'),
+    '9': ('01110', '10001', '10001', '01111', '00001', '00010', '01100'),
+}
+
+
+def scale(dark: str, factor: int) -> str:
+    """
+    Widen a row of pixels.
+
+    Args:
+        dark (str): the row, '1' for a dark pixel and '0' for a light one
+        factor (int): how many pixels wide each pixel should become
+
+    Returns:
+        str: the wider row
+    """
+    return ''.join(pixel * factor for pixel in dark)
+
+
+def text_rows(text: str, factor: int) -> List[str]:
+    """
+    Draw digits with the bitmap font, widened but not heightened, repeat each row factor times for that.
+
+    Args:
+        text (str): the digits
+        factor (int): how many pixels wide each font pixel should become
+
+    Returns:
+        List[str]: the 7 rows of pixels, '1' is dark, with one font pixel of space between digits
+    """
+    return [scale('0'.join(DIGITS[digit][line] for digit in text), factor) for line in range(7)]
+
+
+def pack_row(dark: str) -> bytes:
+    """
+    Pack a row of pixels into a PNG scanline with one bit per pixel.
+
+    Args:
+        dark (str): the row, '1' for a dark pixel and '0' for a light one
+
+    Returns:
+        bytes: the packed row, where like PNG grayscale a 0 bit is black and a 1 bit is white
+    """
+    padded = dark + '0' * (-len(dark) % 8)
+    light = int(padded, 2) ^ ((1 << len(padded)) - 1)
+    return light.to_bytes(len(padded) // 8, 'big')
+
+
+def encode_png(rows: Sequence[bytes], width: int, dpi: int = 300, compress_level: Optional[int] = None) -> bytes:
+    """
+    Encode a black and white image as a 1-bit grayscale PNG.
+
+    Args:
+        rows (Sequence[bytes]): the packed rows, top to bottom, see pack_row
+        width (int): the width in pixels
+        dpi (int): the resolution recorded in the file, so the image prints at its intended size
+        compress_level (int): the zlib compression level, 0 to 9, by default default_compress_level
+
+    Returns:
+        bytes: the PNG file's contents
+    """
+    if compress_level is None:
+        compress_level = default_compress_level
+    raw = b''.join([b'\x00' + row for row in rows])     # filter type 0, none, on every row
+    pixels_per_meter = round(dpi / 0.0254)
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, len(rows), 1, 0, 0, 0, 0)),
+        _chunk(b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1)),
+        _chunk(b'IDAT', zlib.compress(raw, compress_level)),
+        _chunk(b'IEND', b''),
+    ))
+
+
+def encode_svg(rows: Sequence[str], pixel_size: float) -> bytes:
+    """
+    Encode a black and white image as an SVG, a vector image that prints sharp at any size. Each run of dark pixels
+    in a row becomes a rectangle, taller where the rows below have the same runs, so the bars of a barcode are one
+    rectangle each.
+
+    Args:
+        rows (Sequence[str]): the rows of pixels, top to bottom, '1' for a dark pixel and '0' for a light one
+        pixel_size (float): the width and height of a pixel in mm
+
+    Returns:
+        bytes: the SVG file's contents
+    """
+    width, height = len(rows[0]), len(rows)
+    rectangles = []
+    tops: Dict[Tuple[int, int], int] = {}   # the runs still growing downwards, and the row each started at
+    previous = None
+    for y, row in enumerate(list(rows) + ['']):
+        if row is previous:
+            continue    # the same row repeated, as in the rows of a barcode, the same runs carry on
+        runs = {(match.start(), match.end() - match.start()) for match in re.finditer('1+', row)}
+        for run in [run for run in tops if run not in runs]:
+            rectangles.append((tops.pop(run), run, y))
+        for run in runs:
+            tops.setdefault(run, y)
+        previous = row
+    path = ''.join(f"M{x} {top}h{length}v{bottom - top}h-{length}z"
+                   for top, (x, length), bottom in sorted(rectangles))
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * pixel_size:.4g}mm" '
+            f'height="{height * pixel_size:.4g}mm" viewBox="0 0 {width} {height}" shape-rendering="crispEdges">'
+            f'<rect width="{width}" height="{height}" fill="white"/><path d="{path}" fill="black"/></svg>\n'
+            ).encode()
+
+
+def svg_complete(path_file: str) -> bool:
+    """
+    Check that an SVG file made by encode_svg was written to the end, for example after a crash.
+
+    Args:
+        path_file (str): the path and file name
+
+    Returns:
+        bool: True when the file ends with the closing tag
+    """
+    try:
+        with open(path_file, 'rb') as f:
+            f.seek(max(0, f.seek(0, os.SEEK_END) - 7))
+            return f.read() == b'</svg>\n'
+    except OSError:
+        return False
+
+
+def png_complete(path_file: str) -> bool:
+    """
+    Check that a PNG file was written to the end, for example after a crash. It is not decoded.
+
+    Args:
+        path_file (str): the path and file name
+
+    Returns:
+        bool: True when the file starts with the PNG signature and ends with the IEND chunk
+    """
+    try:
+        with open(path_file, 'rb') as f:
+            start = f.read(8)
+            f.seek(max(0, f.seek(0, os.SEEK_END) - 12))
+            return start == b'\x89PNG\r\n\x1a\n' and f.read() == _chunk(b'IEND', b'')
+    except OSError:
+        return False
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    """
+    Frame a PNG chunk with its length and CRC.
+
+    Args:
+        kind (bytes): the four letter chunk type
+        data (bytes): the chunk's data
+
+    Returns:
+        bytes: the chunk
+    """
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
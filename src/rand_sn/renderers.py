@@ -0,0 +1,353 @@
+# standard libraries
+from io import BytesIO
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import qrcode
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .code128 import Code128CImage
+    from .raster import encode_png, encode_svg, pack_row, scale
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from code128 import Code128CImage
+    from raster import encode_png, encode_svg, pack_row, scale
+
+
+image_formats: Tuple[str, ...] = ('png', 'svg')    # 1-bit PNGs, or vector images
+
+
+class BarcodeRenderer:
+    """
+    Render Code 128C barcodes. Create one per batch; the writer and options are reused for every number.
+    By default the barcode is drawn directly by Code128CImage, python-barcode's ImageWriter or SVGWriter is the
+    alternative.
+    """
+
+    _format: str = 'code128'
+    options: Dict[str, Any] = {     # adjustments for the ImageWriter
+        'module_width': 0.2,
+        'module_height': 15.0,
+        'quiet_zone': 6.5,
+        'text_distance': 5.0,
+        'font_size': 10,
+        'background': 'white',
+        'foreground': 'black',
+    }
+
+    def __init__(self, direct: bool = True, image_format: str = 'png', compress_level: Optional[int] = None) -> None:
+        """
+        Initialize BarcodeRenderer instance.
+
+        Args:
+            direct (bool): draw the barcode with Code128CImage, otherwise with python-barcode and Pillow
+            image_format (str): 'png' or 'svg', see image_formats
+            compress_level (int): the zlib level of the PNGs drawn directly, 0 to 9, by default
+                raster's default_compress_level
+
+        Returns:
+            None
+        """
+        if image_format not in image_formats:
+            raise ValueError(f"The image format must be one of {', '.join(image_formats)}.")
+        self.image_format = image_format
+        self._options = dict(self.options)
+        if direct:
+            self._image = Code128CImage(**{key: value for key, value in self._options.items()
+                                           if key not in ('background', 'foreground')}, compress_level=compress_level)
+        else:
+            # only the python-barcode writer needs these
+            import barcode      # unconventional, instead of barcode, python-barcode must be installed
+            from barcode.writer import ImageWriter, SVGWriter
+            self._image = None
+            self._class = barcode.get_barcode_class(self._format)
+            self._writer = SVGWriter() if image_format == 'svg' else ImageWriter()
+
+    @staticmethod
+    def data(number: int) -> str:
+        """
+        Return what the barcode encodes for a number.
+
+        Args:
+            number (int): the number that should be in the barcode
+
+        Returns:
+            str: the digits, with a leading zero when needed to make pairs
+        """
+        # Ensure the number is positive and pad with a leading zero if the length is odd
+        if not isinstance(number, int) or number < 0:
+            raise ValueError("number argument must be a positive integer.")
+        data = str(number)
+        if len(data) % 2 != 0:
+            data = '0' + data  # Pad with leading zero if necessary
+        return data
+
+    @staticmethod
+    def file_name(number: int, image_format: str = 'png') -> str:
+        return f"bar{number}.{image_format}"
+
+    def render(self, number: int) -> bytes:
+        """
+        Generate a barcode image.
+
+        Args:
+            number (int): the number that should be in the barcode
+
+        Returns:
+            bytes: the image file's contents
+        """
+        if self._image is not None and self.image_format == 'svg':
+            return self._image.render_svg(self.data(number))
+        elif self._image is not None:
+            return self._image.render(self.data(number))
+        else:
+            code128 = self._class(self.data(number), writer=self._writer)
+            buffer = BytesIO()
+            code128.write(buffer, options=self._options)
+            return buffer.getvalue()
+
+    def save(self, number: int, path: str) -> str:
+        """
+        Generate a barcode image file named bar{number}.png, or .svg.
+
+        Args:
+            number (int): the number that should be in the barcode
+            path (str): the path where the barcode should be stored
+
+        Returns:
+            str: the path and file name of the image
+        """
+        path_file = os.path.join(path, self.file_name(number, self.image_format))
+        with open(path_file, 'wb') as f:
+            f.write(self.render(number))
+        return path_file
+
+
+class QRRenderer:
+    """
+    Render QR codes. Create one per batch; the QR code instance, its version and mask are reused for every number.
+    The prefix is the same every time, so it is encoded once and only the number's digits are encoded for each code,
+    in numeric mode, which takes less room than the bytes of a whole URL.
+    """
+
+    dpi: int = 300      # the resolution recorded in the PNGs, the size of a module in the SVGs follows from it
+
+    def __init__(self, prefix: Optional[str] = None, digits: Optional[int] = None, image_format: str = 'png',
+                 compress_level: Optional[int] = None) -> None:
+        """
+        Initialize QRRenderer instance.
+
+        Args:
+            prefix (str): what should be put before the number in the QR code, example, https://mydomain.com/c/.
+            digits (int): the most digits of the numbers, fits the version to them straight away, otherwise it is
+                fitted to the first number
+            image_format (str): 'png' or 'svg', see image_formats
+            compress_level (int): the zlib level of the PNGs, 0 to 9, by default raster's default_compress_level
+
+        Returns:
+            None
+        """
+        if image_format not in image_formats:
+            raise ValueError(f"The image format must be one of {', '.join(image_formats)}.")
+        self.image_format = image_format
+        self._compress_level = compress_level
+        import qrcode   # here rather than at the top, so barcodes alone don't need it
+        from qrcode.exceptions import DataOverflowError
+        from qrcode.util import MODE_NUMBER, QRData
+        self._overflow = DataOverflowError
+        self._segment = QRData
+        self._numeric = MODE_NUMBER
+        self.prefix = prefix
+        self._prefix = QRData(prefix) if prefix else None   # the encoded prefix
+        self._mask: Optional[int] = None
+        self._qr = qrcode.QRCode(
+            version=None,   # size 1(small) to 40(large), fitted once and kept while numbers fit
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,    # the size of each box (pixel) in the QR code
+            border=4,       # recommended minimum is 4
+        )
+        if digits is not None:
+            self.make(10 ** (digits - 1))   # the numeric segment's size only depends on the number of digits
+
+    def data(self, number: int) -> str:
+        """
+        Return what the QR code encodes for a number.
+
+        Args:
+            number (int): the number that should be in the QR code
+
+        Returns:
+            str: the prefix, if any, followed by the number
+        """
+        if self.prefix is not None:
+            return f"{self.prefix}{number}"
+        else:
+            return str(number)
+
+    def make(self, number: int) -> "qrcode.QRCode":
+        """
+        Encode a number, keeping the version and mask of the previous number unless the version is too small.
+        Choosing the mask means making the code with each of the 8 and scoring them, far more work than the code
+        itself, and any mask reads the same.
+
+        Args:
+            number (int): the number that should be in the QR code
+
+        Returns:
+            qrcode.QRCode: the QR code, ready to make an image from
+        """
+        qr = self._qr
+        qr.clear()
+        if self._prefix is not None:
+            qr.add_data(self._prefix)
+        qr.add_data(self._segment(str(number), self._numeric))
+        if self._mask is not None:
+            try:
+                qr.makeImpl(False, self._mask)
+                return qr
+            except self._overflow:
+                pass    # a longer number, find a bigger version starting from the current one
+        qr.best_fit(start=qr.version)
+        self._mask = qr.best_mask_pattern()
+        qr.makeImpl(False, self._mask)
+        return qr
+
+    @staticmethod
+    def file_name(number: int, image_format: str = 'png') -> str:
+        return f"qr{number}.{image_format}"
+
+    def rows(self, number: int) -> List[str]:
+        """
+        Draw a QR code as rows of modules, with the quiet zone around it.
+
+        Args:
+            number (int): the number that should be in the QR code
+
+        Returns:
+            List[str]: the rows, top to bottom, '1' for a dark module and '0' for a light one
+        """
+        qr = self.make(number)
+        margin = '0' * qr.border
+        blank = '0' * (qr.modules_count + 2 * qr.border)
+        return ([blank] * qr.border + [margin + ''.join(['1' if module else '0' for module in row]) + margin
+                                       for row in qr.modules] + [blank] * qr.border)
+
+    def render(self, number: int) -> bytes:
+        """
+        Generate a QR code image, drawn straight into a 1-bit PNG, or an SVG, rather than with Pillow.
+
+        Args:
+            number (int): the number that should be in the QR code
+
+        Returns:
+            bytes: the image file's contents
+        """
+        rows = self.rows(number)
+        box_size = self._qr.box_size
+        if self.image_format == 'svg':
+            return encode_svg(rows, box_size * 25.4 / self.dpi)
+        packed = [pack_row(scale(row, box_size)) for row in rows]
+        return encode_png([row for row in packed for _ in range(box_size)], len(rows[0]) * box_size, self.dpi,
+                          self._compress_level)
+
+    def save(self, number: int, path: str) -> str:
+        """
+        Generate a QR code image file named qr{number}.png, or .svg.
+
+        Args:
+            number (int): the number that should be in the QR code
+            path (str): the path where the QR code should be stored
+
+        Returns:
+            str: the path and file name of the image
+        """
+        path_file = os.path.join(path, self.file_name(number, self.image_format))
+        with open(path_file, 'wb') as f:
+            f.write(self.render(number))
+        return path_file
+
+
+class ImageSink:
+    """
+    Save the barcode and QR code images of serial numbers into a directory, a sink for BatchGenerator.batch.
+    """
+
+    def __init__(self, path: str, prefix: Optional[str] = None, barcodes: bool = True, qr_codes: bool = True,
+                 image_format: str = 'png', compress_level: Optional[int] = None, digits: Optional[int] = None) -> None:
+        """
+        Initialize ImageSink instance.
+
+        Args:
+            path (str): the directory where the images will be stored
+            prefix (str): what should be put before the number in the QR codes
+            barcodes (bool): save barcodes
+            qr_codes (bool): save QR codes
+            image_format (str): 'png' or 'svg', see image_formats
+            compress_level (int): the zlib level of the PNGs, 0 to 9
+            digits (int): the digits of the config's biggest serial number, so every QR code is the same version
+
+        Returns:
+            None
+        """
+        self.path = path
+        self._renderers = (
+            ([BarcodeRenderer(image_format=image_format, compress_level=compress_level)] if barcodes else []) +
+            ([QRRenderer(prefix, digits, image_format, compress_level)] if qr_codes else []))
+
+    def write_many(self, numbers: Iterable[int]) -> None:
+        """
+        Save the images of serial numbers.
+
+        Args:
+            numbers (Iterable[int]): the serial numbers
+
+        Returns:
+            None
+        """
+        for number in numbers:
+            for renderer in self._renderers:
+                renderer.save(int(number), self.path)
+
+    def close(self) -> None:
+        """ Nothing to finish, each image is complete once saved. """
+
+    def abort(self) -> None:
+        """ Nothing to undo, the batch directory is deleted with the images. """
+
+
+def render_chunk(numbers: List[int], path: Optional[str], prefix: Optional[str], barcodes: bool = True,
+                 qr_codes: bool = True, image_format: str = 'png', compress_level: Optional[int] = None,
+                 digits: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """
+    Generate the barcodes and QR codes for a chunk of serial numbers.
+
+    Args:
+        numbers (List[int]): the serial numbers
+        path (str): the path where the images should be stored, or None to return them instead
+        prefix (str): what should be put before the number in the QR code
+        barcodes (bool): generate the barcodes
+        qr_codes (bool): generate the QR codes
+        image_format (str): 'png' or 'svg', see image_formats
+        compress_level (int): the zlib level of the PNGs, 0 to 9
+        digits (int): the digits of the config's biggest serial number, so every QR code of a batch is the same
+            version whatever the chunk, by default those of the chunk's biggest
+
+    Returns:
+        List[Tuple[str, bytes]]: the file names and contents of the images when the path is None, otherwise empty
+    """
+    renderers = []
+    if barcodes:
+        renderers.append(BarcodeRenderer(image_format=image_format, compress_level=compress_level))
+    if qr_codes and numbers:
+        renderers.append(QRRenderer(prefix, digits or len(str(max(numbers))), image_format, compress_level))
+    images = []
+    for number in numbers:
+        for renderer in renderers:
+            if path is None:
+                images.append((renderer.file_name(number, image_format), renderer.render(number)))
+            else:
+                renderer.save(number, path)
+    return images
@@ -0,0 +1,249 @@
+# standard libraries
+from abc import ABC, abstractmethod
+from array import array
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterable, Iterator, Optional, Type
+
+
+class SerialWriter(ABC):
+    """
+    Write serial numbers to a file as they are generated, so memory stays bounded however big the batch is.
+    The file is written under a temporary name and only renamed when closed, so a partial file is never mistaken for
+    a complete list. Use as a context manager, or call close() when done and abort() when something went wrong.
+    A partial file can be carried on with after a checkpoint(). Subclasses implement write_many() for their format.
+    """
+
+    extension: str
+    _mode: str = 'w'
+    name: str = 'serial-numbers'
+
+    def __init__(self, path: str, count: int = 0, offset: Optional[int] = None) -> None:
+        """
+        Initialize SerialWriter instance.
+
+        Args:
+            path (str): the directory where the file will be stored
+            count (int): when carrying on with a partial file, how many serial numbers it held at the checkpoint
+            offset (int): when carrying on with a partial file, its size at the checkpoint, anything after is dropped
+
+        Returns:
+            None
+        """
+        self.path_file = os.path.join(path, self.name + self.extension)
+        self._path_part = self.path_file + '.part'
+        if offset is None:
+            self._file = open(self._path_part, self._mode)
+            self.count = 0
+            self._begin()
+        else:
+            self._file = open(self._path_part, self._mode.replace('w', 'r+'))
+            self._file.truncate(offset)
+            self._file.seek(offset)
+            self.count = count
+
+    def checkpoint(self) -> int:
+        """
+        Flush what has been written to disk.
+
+        Returns:
+            int: the size of the partial file, to carry on from
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def write(self, number: int) -> None:
+        """
+        Write one serial number.
+
+        Args:
+            number (int): the serial number
+
+        Returns:
+            None
+        """
+        self.write_many([number])
+
+    @abstractmethod
+    def write_many(self, numbers: Iterable[int]) -> None:
+        """
+        Write serial numbers.
+
+        Args:
+            numbers (Iterable[int]): the serial numbers
+
+        Returns:
+            None
+        """
+
+    def close(self) -> None:
+        """
+        Finish the file, flush it to disk and give it its final name.
+
+        Returns:
+            None
+        """
+        self._end()
+        self.checkpoint()
+        self._file.close()
+        os.replace(self._path_part, self.path_file)
+
+    def pause(self) -> None:
+        """
+        Close the partial file but keep it, to carry on with from the last checkpoint.
+
+        Returns:
+            None
+        """
+        self._file.close()
+
+    def abort(self) -> None:
+        """
+        Close and delete the partial file.
+
+        Returns:
+            None
+        """
+        self._file.close()
+        os.remove(self._path_part)
+
+    def _begin(self) -> None:
+        """ Write what comes before the first number. """
+
+    def _end(self) -> None:
+        """ Write what comes after the last number. """
+
+    def __enter__(self) -> "SerialWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonWriter(SerialWriter):
+    """
+    A JSON array, formatted like json.dump(numbers, f, indent=4).
+    """
+
+    extension = '.json'
+
+    def write_many(self, numbers: Iterable[int]) -> None:
+        lines = [f"\n    {int(number)}" for number in numbers]
+        if lines:
+            self._file.write((',' if self.count else '') + ','.join(lines))
+            self.count += len(lines)
+
+    def _begin(self) -> None:
+        self._file.write('[')
+
+    def _end(self) -> None:
+        self._file.write('\n]' if self.count else ']')
+
+
+class JsonLinesWriter(SerialWriter):
+    """
+    JSON Lines, one number per line.
+    """
+
+    extension = '.jsonl'
+
+    def write_many(self, numbers: Iterable[int]) -> None:
+        lines = [f"{int(number)}\n" for number in numbers]
+        self._file.write(''.join(lines))
+        self.count += len(lines)
+
+
+class CsvWriter(JsonLinesWriter):
+    """
+    CSV with a header row and one number per row.
+    """
+
+    extension = '.csv'
+    header: str = 'serial_number'
+
+    def _begin(self) -> None:
+        self._file.write(f"{self.header}\n")
+
+
+class BinaryWriter(SerialWriter):
+    """
+    Packed unsigned 64-bit little-endian integers, 8 bytes per number, for downstream tooling.
+    """
+
+    extension = '.bin'
+    _mode = 'wb'
+
+    def write_many(self, numbers: Iterable[int]) -> None:
+        packed = array('Q', [int(number) for number in numbers])    # raises OverflowError above 64 bits
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        self._file.write(packed.tobytes())
+        self.count += len(packed)
+
+
+WRITERS: Dict[str, Type[SerialWriter]] = {
+    'json': JsonWriter,
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'bin': BinaryWriter,
+}
+
+
+def read_serial_numbers(path_file: str) -> Iterator[int]:
+    """
+    Read back the serial numbers written by any of the writers, one at a time, the format going by the extension.
+
+    Args:
+        path_file (str): the path and file name
+
+    Returns:
+        Iterator[int]: the serial numbers in the order they were written
+    """
+    extension = os.path.splitext(path_file)[1]
+    if extension == JsonWriter.extension:
+        with open(path_file, 'r') as f:
+            yield from json.load(f)
+    elif extension == BinaryWriter.extension:
+        with open(path_file, 'rb') as f:
+            while True:
+                data = f.read(8 * 8192)
+                if not data:
+                    break
+                packed = array('Q', data)
+                if sys.byteorder == 'big':
+                    packed.byteswap()
+                yield from packed
+    elif extension == CsvWriter.extension:
+        with open(path_file, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                yield int(row[CsvWriter.header])
+    elif extension == JsonLinesWriter.extension:
+        with open(path_file, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown serial number file extension {extension}.")
+
+
+def find_serial_file(path: str) -> str:
+    """
+    Find the complete serial number file in a batch directory, whatever its format.
+
+    Args:
+        path (str): the batch directory
+
+    Returns:
+        str: the path and file name, or raises FileNotFoundError
+    """
+    for writer in WRITERS.values():
+        path_file = os.path.join(path, writer.name + writer.extension)
+        if os.path.isfile(path_file):
+            return path_file
+    raise FileNotFoundError(f"No serial number file in {path}.")
@@ -0,0 +1,210 @@
+# standard libraries
+import asyncio
+import json
+import os
+import signal
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .config import Config
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from config import Config
+
+
+class IssuanceServer:
+    """
+    Hand out serial numbers to several stations from one process, which holds the config and generator in memory.
+    The numbers are journaled before they are sent, and the journal writes of requests that arrive together are
+    shared, so a request costs far less than starting rand-sn.
+
+    It speaks just enough HTTP/1.1 for curl and keep-alive connections:
+    GET /issue?count=10 answers {"serial_numbers": [...]} and GET /status answers {"issued": ..., "remaining": ...}.
+    """
+
+    max_count: int = 100000     # the most serial numbers per request
+
+    def __init__(self, config: Config) -> None:
+        """
+        Initialize IssuanceServer instance.
+
+        Args:
+            config (Config): the loaded config, hold its lock while serving
+
+        Returns:
+            None
+        """
+        self.config = config
+        self.issued = 0
+        self._fcr = config.generator()
+        self._version = 0       # counts the requests that changed the seed
+        self._journaled = 0     # the version the journal is up to date with
+        self._journal_lock: Optional[asyncio.Lock] = None
+        self._issue_lock: Optional[asyncio.Lock] = None
+
+    async def issue(self, count: int) -> List[int]:
+        """
+        Take the next serial numbers from the cycle, in memory. They must be journaled before they are handed out.
+        They are generated in a thread, one request at a time, so other clients aren't kept waiting meanwhile. The
+        seed is updated back on the event loop, where the journal records are made.
+
+        Args:
+            count (int): how many serial numbers
+
+        Returns:
+            List[int]: the serial numbers, or raises OverflowError when the cycle runs out, leaving the seed as it was
+        """
+        if self._issue_lock is None:
+            self._issue_lock = asyncio.Lock()   # made here, on the event loop it is used with
+        async with self._issue_lock:
+            if count > self.config.remaining():
+                raise OverflowError
+            try:
+                numbers = await asyncio.get_running_loop().run_in_executor(None, self._generate, count)
+            except BaseException:
+                self._fcr = self.config.generator()     # the generator may have moved on, start again from the seed
+                raise
+            self.config.seed_cycle_many(numbers)    # update the seed
+            self.issued += count
+            self._version += 1
+            return numbers
+
+    def _generate(self, count: int) -> List[int]:
+        return [int(number) for number in self._fcr.batch(count)]
+
+    async def journal(self) -> None:
+        """
+        Wait until the journal holds the seed as it is now. One write at a time, a write covers every request that
+        came in while the one before it was being flushed to disk.
+
+        Returns:
+            None
+        """
+        version = self._version
+        async with self._journal_lock:
+            if self._journaled >= version:
+                return
+            # the record is made here, the seed and count can change while it is written in the thread
+            version = self._version
+            record = self.config.journal_record(None, self.issued)
+            await asyncio.get_running_loop().run_in_executor(None, self.config.append_journal, record)
+            self._journaled = version
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answer the requests on a connection until the client closes it.
+
+        Args:
+            reader (asyncio.StreamReader): the connection's incoming side
+            writer (asyncio.StreamWriter): the connection's outgoing side
+
+        Returns:
+            None
+        """
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                status, body = await self._respond(*request)
+                reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                          409: 'Conflict'}[status]
+                data = json.dumps(body).encode()
+                writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass    # the client went away or didn't speak HTTP
+        finally:
+            writer.close()
+
+    async def serve(self, address: str) -> None:
+        """
+        Listen until cancelled or terminated, then save the config.
+
+        Args:
+            address (str): host:port, or the path of a Unix socket
+
+        Returns:
+            None
+        """
+        self._journal_lock = asyncio.Lock()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, AttributeError):
+            pass    # Windows has no SIGTERM handlers in asyncio, Ctrl+C still stops the server
+        if os.sep in address:
+            server = await asyncio.start_unix_server(self.handle, path=address)
+        else:
+            host, _, port = address.rpartition(':')
+            server = await asyncio.start_server(self.handle, host=host or None, port=int(port))
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.config.save()
+            if os.sep in address and os.path.exists(address):
+                os.remove(address)
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str]]:
+        """
+        Read a request's method and target, skipping its headers and body.
+
+        Args:
+            reader (asyncio.StreamReader): the connection's incoming side
+
+        Returns:
+            Tuple[str, str]: the method and target, or None when the client closed the connection
+        """
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+        length = 0
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        return method, target
+
+    async def _respond(self, method: str, target: str) -> Tuple[int, Dict[str, Any]]:
+        """
+        Work out the answer to a request.
+
+        Args:
+            method (str): the HTTP method
+            target (str): the path and query
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: the HTTP status and the JSON body
+        """
+        url = urlsplit(target)
+        if url.path not in ('/issue', '/status'):
+            return 404, {'error': f"Unknown path {url.path}, use /issue or /status."}
+        if method not in ('GET', 'POST'):
+            return 405, {'error': "Use GET or POST."}
+        if url.path == '/status':
+            return 200, {'issued': self.issued, 'remaining': self.config.remaining()}
+
+        try:
+            count = int(parse_qs(url.query).get('count', ['1'])[0])
+        except ValueError:
+            count = 0
+        if not 1 <= count <= self.max_count:
+            return 400, {'error': f"The count must be from 1 to {self.max_count}."}
+        try:
+            numbers = await self.issue(count)
+        except OverflowError:
+            return 409, {'error': "Not enough serial numbers are left in the cycle."}
+        await self.journal()
+        return 200, {'serial_numbers': numbers}
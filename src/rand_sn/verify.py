@@ -0,0 +1,216 @@
+# standard libraries
+from itertools import islice
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# 3rd party libraries, optional
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# local imports
+try:
+    # attempt relative import (assuming running as part of a package)
+    from .batch import Batch
+    from .config import Config
+    from .serial_file import find_serial_file, read_serial_numbers
+except ImportError:
+    # fallback to absolute import (assuming running as standalone script)
+    from batch import Batch
+    from config import Config
+    from serial_file import find_serial_file, read_serial_numbers
+
+
+class VerifyIndex:
+    """
+    Tell which batch a serial number was issued in, for example when a label is scanned, without opening the batches.
+
+    The index is a table on disk with the batch number of every serial number in the config's range, 0 when it isn't
+    in a batch, so a lookup reads 4 bytes of a memory-mapped file. Where nothing was issued yet, the file is sparse.
+    It is brought up to date from the batch index, a batch counts as indexed once its first serial number is, which is
+    written last, so an update cut short is simply done again.
+    """
+
+    max_capacity: int = 1 << 32     # the most serial numbers in the range, the table would be 16 GiB
+    _magic: bytes = b'RSNV'
+    _header = struct.Struct('<4sQ')     # the magic and the capacity, the table follows
+    _cell = struct.Struct('<I')         # a batch number
+    _chunk_size: int = 1 << 20
+
+    def __init__(self, config: Config, path: Optional[str] = None) -> None:
+        """
+        Initialize VerifyIndex instance.
+
+        Args:
+            config (Config): the loaded config, the index is stored next to it
+            path (str): the path where the batches are, defaults to the current working directory
+
+        Returns:
+            None
+        """
+        if config.capacity > self.max_capacity:
+            raise ValueError(f"A verification index holds up to {self.max_capacity} serial numbers, look them up "
+                             f"with Config.index_of instead.")
+        self.config = config
+        self.path = os.getcwd() if path is None else path
+        self.path_file = config.path_verify
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+
+    def lookup(self, number: int) -> Optional[int]:
+        """
+        Find the batch a serial number is in.
+
+        Args:
+            number (int): the serial number
+
+        Returns:
+            int: the batch number, or None when it isn't in a batch that was indexed
+        """
+        if not isinstance(number, int) or not self.config.smallest <= number <= self.config.biggest:
+            return None
+        self._open()
+        batch, = self._cell.unpack_from(self._map, self._offset(number))
+        return batch or None
+
+    def position(self, number: int) -> Optional[int]:
+        """
+        Find how many serial numbers were issued before one in a batch, by going through that batch alone.
+
+        Args:
+            number (int): the serial number
+
+        Returns:
+            int: the position, or None when it isn't in a batch that was indexed, or the batch's position is unknown
+        """
+        batch = self.lookup(number)
+        if batch is None:
+            return None
+        for entry in Batch.entries(self.path):
+            if entry['number'] == batch and 'position_from' in entry:
+                position = entry['position_from']
+                for chunk in self._chunks(entry, self._chunk_size):
+                    found = np.flatnonzero(chunk == number) if np is not None and isinstance(chunk, np.ndarray) else \
+                        [i for i, serial_number in enumerate(chunk) if serial_number == number]
+                    if len(found) > 0:
+                        return position + int(found[0])
+                    position += len(chunk)
+        return None
+
+    def sync(self) -> List[int]:
+        """
+        Index the finished batches that aren't yet. Batches rebuilt by a rescan of the directory have no seeds, their
+        serial numbers file is read instead, and archives among them are left out.
+
+        Returns:
+            List[int]: the numbers of the batches that were indexed
+        """
+        self._open()
+        indexed = []
+        for entry in Batch.entries(self.path):
+            first = next(self._chunks(entry, 1), None)
+            if first is None or self.lookup(int(first[0])) == entry['number']:
+                continue
+            chunks = self._chunks(entry, self._chunk_size)
+            self._write(next(chunks)[1:], entry['number'])
+            for chunk in chunks:
+                self._write(chunk, entry['number'])
+            self._write(first, entry['number'])     # last, it marks the batch as indexed
+            indexed.append(entry['number'])
+        if indexed:
+            self._map.flush()
+        return indexed
+
+    def close(self) -> None:
+        """
+        Unmap and close the index file.
+
+        Returns:
+            None
+        """
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+    def __enter__(self) -> "VerifyIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _open(self) -> None:
+        """
+        Map the index file, creating it when it is missing or belongs to a different range.
+
+        Returns:
+            None
+        """
+        if self._map is not None:
+            return
+        size = self._header.size + self._cell.size * self.config.capacity
+        try:
+            with open(self.path_file, 'rb') as f:
+                valid = f.read(self._header.size) == self._header.pack(self._magic, self.config.capacity)
+        except FileNotFoundError:
+            valid = False
+        if not valid or os.path.getsize(self.path_file) != size:
+            # a new, empty table, the rename makes sure a half made one is never used
+            path_part = self.path_file + '.part'
+            with open(path_part, 'wb') as f:
+                f.write(self._header.pack(self._magic, self.config.capacity))
+                f.truncate(size)    # sparse, the zeros aren't written
+            os.replace(path_part, self.path_file)
+        self._file = open(self.path_file, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _offset(self, number: int) -> int:
+        return self._header.size + self._cell.size * (number - self.config.smallest)
+
+    def _chunks(self, entry: Dict[str, Any], size: int) -> Iterator[Sequence[int]]:
+        """
+        Go through a finished batch's serial numbers, regenerated from its seed, otherwise read from its file.
+
+        Args:
+            entry (Dict[str, Any]): the batch's entry in the batch index
+            size (int): the most serial numbers in a chunk
+
+        Returns:
+            Iterator[Sequence[int]]: the serial numbers, a chunk at a time, none when the batch isn't finished
+        """
+        if 'count' in entry and 'seed_from' in entry and (self.config.key is None or 'position_from' in entry):
+            fcr = self.config.generator(entry['seed_from'], entry.get('position_from', 0))
+            remaining = entry['count']
+            while remaining > 0:
+                chunk = fcr.batch(min(remaining, size))
+                remaining -= len(chunk)
+                yield chunk
+        elif 'count' not in entry and os.path.isdir(os.path.join(self.path, entry.get('name', ''))):
+            try:
+                serial_numbers = read_serial_numbers(find_serial_file(os.path.join(self.path, entry['name'])))
+            except FileNotFoundError:
+                return  # unfinished, its serial numbers file doesn't have its final name yet
+            yield from iter(lambda: list(islice(serial_numbers, size)), [])
+
+    def _write(self, numbers: Sequence[int], batch: int) -> None:
+        """
+        Set the batch of serial numbers in the table.
+
+        Args:
+            numbers (Sequence[int]): the serial numbers, a list or an array
+            batch (int): the batch number
+
+        Returns:
+            None
+        """
+        if np is not None and isinstance(numbers, np.ndarray):
+            table = np.frombuffer(self._map, dtype='<u4', offset=self._header.size)
+            table[numbers - np.uint64(self.config.smallest)] = batch
+            del table   # the map can't be closed while an array refers to it
+        else:
+            for number in numbers:
+                self._cell.pack_into(self._map, self._offset(int(number)), batch)
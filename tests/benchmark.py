@@ -0,0 +1,105 @@
+# *** A way to run these benchmarks. ***
+# 1. (Open a terminal, alternately known as go to the command line.)
+# 2. cd .. (Or, somehow make the project root the current directory.)
+# 3. python -m tests.benchmark
+
+# Standard library imports
+import importlib.util
+import shutil
+import tempfile
+import timeit
+
+# Local imports
+from src.rand_sn.full_cycle_random import FullCycleRandom, np
+from src.rand_sn.l_f_s_r import LFSR
+
+
+def report(name: str, seconds: float, count: int) -> None:
+    """
+    Print one line of benchmark results.
+
+    Args:
+        name (str): what was measured
+        seconds (float): how long it took
+        count (int): how many items were produced in that time
+
+    Returns:
+        None
+    """
+    print(f"{name:<48} {count / seconds:>14,.0f} per second {seconds * 1e9 / count:>10,.1f} ns each")
+
+
+def benchmark_lfsr(bits: int = 40, count: int = 1_000_000) -> None:
+    """ Compare stepping the LFSR one register at a time with taking registers in bulk. """
+    lfsr = LFSR(bits=bits)
+    seconds = timeit.timeit(lambda: [next(lfsr) for _ in range(count)], number=1)
+    report(f"LFSR next() {bits} bits", seconds, count)
+
+    lfsr = LFSR(bits=bits)
+    seconds = timeit.timeit(lambda: lfsr.take(count), number=1)
+    report(f"LFSR take() {bits} bits", seconds, count)
+
+
+def benchmark_full_cycle_random(max_int: int, count: int = 1_000_000) -> None:
+    """ Compare iterating FullCycleRandom with getting a batch. """
+    fcr = FullCycleRandom(max_int=max_int)
+    seconds = timeit.timeit(lambda: [next(fcr) for _ in range(count)], number=1)
+    report(f"FullCycleRandom next() 1..{max_int}", seconds, count)
+
+    fcr = FullCycleRandom(max_int=max_int)
+    seconds = timeit.timeit(lambda: fcr.batch(count), number=1)
+    report(f"FullCycleRandom batch() 1..{max_int} {'NumPy' if np else 'Python'}", seconds, count)
+
+
+def benchmark_renderers(count: int = 200) -> None:
+    """ Compare creating a renderer for every label with reusing one renderer for the whole batch. """
+    from src.rand_sn.renderers import BarcodeRenderer, QRRenderer
+    temp_dir = tempfile.mkdtemp()
+    try:
+        numbers = [int(n) for n in FullCycleRandom(min_int=100000, max_int=999999).batch(count)]
+        prefix = 'https://your-domain.com/serial-number/'
+
+        seconds = timeit.timeit(lambda: [BarcodeRenderer(direct=False).save(n, temp_dir) for n in numbers], number=1)
+        report("barcode, new renderer per label", seconds, count)
+        renderer = BarcodeRenderer(direct=False)
+        seconds = timeit.timeit(lambda: [renderer.save(n, temp_dir) for n in numbers], number=1)
+        report("barcode, one renderer per batch", seconds, count)
+        renderer = BarcodeRenderer()
+        seconds = timeit.timeit(lambda: [renderer.save(n, temp_dir) for n in numbers], number=1)
+        report("barcode, one direct renderer per batch", seconds, count)
+
+        seconds = timeit.timeit(lambda: [QRRenderer(prefix).save(n, temp_dir) for n in numbers], number=1)
+        report("QR code, new renderer per label", seconds, count)
+        renderer = QRRenderer(prefix)
+        seconds = timeit.timeit(lambda: [renderer.save(n, temp_dir) for n in numbers], number=1)
+        report("QR code, one renderer per batch", seconds, count)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def benchmark_image_formats(count: int = 200) -> None:
+    """ Compare the size and time of a label's images in each format, and the PNGs at a few zlib levels. """
+    from src.rand_sn.raster import default_compress_level
+    from src.rand_sn.renderers import BarcodeRenderer, QRRenderer, image_formats
+    numbers = FullCycleRandom(min_int=100000, max_int=999999).batch(count)
+    prefix = 'https://your-domain.com/serial-number/'
+    kinds = [("barcode", lambda image_format, level: BarcodeRenderer(image_format=image_format, compress_level=level))]
+    if importlib.util.find_spec('qrcode') is not None:
+        kinds.append(("QR code", lambda image_format, level: QRRenderer(prefix, 6, image_format, level)))
+    for kind, renderer_for in kinds:
+        for image_format in image_formats:
+            for level in ((1, default_compress_level, 6, 9) if image_format == 'png' else (None,)):
+                renderer = renderer_for(image_format, level)
+                sizes = []
+                seconds = timeit.timeit(lambda: sizes.extend(len(renderer.render(int(n))) for n in numbers), number=1)
+                name = f"{kind} {image_format}" + (f" level {level}" if level is not None else "")
+                print(f"{name:<48} {sum(sizes) / count:>10,.0f} bytes {seconds * 1e3 / count:>10,.3f} ms per label")
+
+
+if __name__ == "__main__":
+    for lfsr_bits in (16, 40, 63):
+        benchmark_lfsr(bits=lfsr_bits)
+    for fcr_max_int in (99999, 2 ** 33):
+        benchmark_full_cycle_random(max_int=fcr_max_int)
+    benchmark_renderers()
+    benchmark_image_formats()
@@ -4,22 +4,54 @@
 # 3. python -m unittest tests/tests
 
 # Standard library imports
+from argparse import Namespace
+import asyncio
+from contextlib import redirect_stdout
+import io
+import json
 import os
 from pathlib import Path
 import random
+import re
 import tempfile
 import time
 import shutil
+import struct
+import subprocess
+import sys
+import threading
 import unittest
+from unittest import mock
+import zipfile
+import zlib
 
 # 3rd party libraries
-
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import qrcode
+except ImportError:
+    qrcode = None
 
 # Local imports
 from src.rand_sn.batch import Batch
+from src.rand_sn.batch_generator import BatchGenerator
+from src.rand_sn.code128 import Code128CImage, PATTERNS, modules, symbols
 from src.rand_sn.config import Config
+from src.rand_sn.feistel import FeistelPermutation
 from src.rand_sn.full_cycle_random import FullCycleRandom
+from src.rand_sn.label_sheet import LabelSheet, SheetLayout
 from src.rand_sn.l_f_s_r import LFSR
+from src.rand_sn.lease import Lease, leases, take_lease
+from src.rand_sn.main import generate_batch, render_batch, verify
+from src.rand_sn import primitive
+from src.rand_sn.raster import png_complete, svg_complete
+from src.rand_sn.renderers import ImageSink, QRRenderer, render_chunk
+from src.rand_sn.serial_file import JsonWriter, SerialWriter, WRITERS, find_serial_file, read_serial_numbers
+from src.rand_sn.server import IssuanceServer
+from src.rand_sn.verify import VerifyIndex
 
 
 class TestBatch(unittest.TestCase):
@@ -36,6 +68,14 @@ class TestBatch(unittest.TestCase):
         self.assertIsNone(batch.path_directory)
         self.assertFalse(Path(path_directory).exists())
 
+    def test_delete_with_contents(self):
+        """ An aborted batch can already have files in it. """
+        batch = Batch(path=self.temp_dir)
+        path_directory = batch.path_directory
+        Path(path_directory, 'bar1234.png').write_bytes(b'')
+        batch.delete()
+        self.assertFalse(Path(path_directory).exists())
+
     def test_one_two_three(self):
         """ Test that the first three batches are created correctly. """
         max_batch = 3
@@ -48,7 +88,342 @@ class TestBatch(unittest.TestCase):
             self.assertEqual(batch.path_directory, os.path.join(self.temp_dir, directory))
             batch.delete()
 
+    def test_index(self):
+        batch = Batch(path=self.temp_dir)
+        batch.record(10, 5, 7)
+        Batch(path=self.temp_dir).delete()
+        batch = Batch(path=self.temp_dir, digits=7)
+        self.assertEqual(batch.number, 2)
+        self.assertEqual(batch.directory, 'batch0000002')
+        self.assertEqual(Batch(path=self.temp_dir).directory, 'batch0000003')
+        with open(os.path.join(self.temp_dir, Batch.index_name)) as f:
+            self.assertEqual({'last': 3, 'digits': 7}, json.load(f))
+        self.assertEqual([{'number': 1, 'name': 'batch00001', 'count': 10, 'seed_from': 5, 'seed_to': 7},
+                          {'number': 2, 'name': 'batch0000002'}, {'number': 3, 'name': 'batch0000003'}],
+                         Batch.entries(self.temp_dir))
+
+    def test_log(self):
+        """ Starting a batch doesn't rewrite the others' entries, and a record cut short by a crash is skipped. """
+        Batch(path=self.temp_dir).record(10, 5, 7)
+        with open(os.path.join(self.temp_dir, Batch.log_name), 'a') as f:
+            f.write('{"number": 1, "cou')
+        size = os.path.getsize(os.path.join(self.temp_dir, Batch.log_name))
+        batch = Batch(path=self.temp_dir)
+        with open(os.path.join(self.temp_dir, Batch.log_name), 'rb') as f:
+            f.seek(size)
+            self.assertEqual(b'\n{"number": 2, "name": "batch00002"}\n', f.read())
+        batch.delete()
+        self.assertEqual([{'number': 1, 'name': 'batch00001', 'count': 10, 'seed_from': 5, 'seed_to': 7}],
+                         Batch.entries(self.temp_dir))
+        self.assertEqual(2, Batch(path=self.temp_dir).number)
+
+    def test_reopen(self):
+        batch = Batch(path=self.temp_dir)
+        Batch(path=self.temp_dir)
+        reopened = Batch(path=self.temp_dir, number=1)
+        self.assertEqual((reopened.number, reopened.path_directory), (1, batch.path_directory))
+        self.assertEqual(Batch(path=self.temp_dir).number, 3)
+        with self.assertRaises(FileNotFoundError):
+            Batch(path=self.temp_dir, number=9)
+
+    def test_index_rescan(self):
+        """ A missing or broken index is rebuilt from the batches found, and numbers go past the digits. """
+        os.mkdir(os.path.join(self.temp_dir, 'batch99999'))
+        Path(self.temp_dir, Batch.index_name).write_text('{')
+        batch = Batch(path=self.temp_dir)
+        self.assertEqual(batch.number, 100000)
+        self.assertEqual(batch.directory, 'batch100000')
+        os.remove(os.path.join(self.temp_dir, Batch.index_name))
+        self.assertEqual(Batch(path=self.temp_dir).number, 100001)
+
+    def test_batch_tree(self):
+        """ Batch directories made before there was an index or log are found, and numbering carries on after them. """
+        for name in ('batch00001', 'batch00002'):
+            os.mkdir(os.path.join(self.temp_dir, name))
+        self.assertEqual([{'number': 1, 'name': 'batch00001'}, {'number': 2, 'name': 'batch00002'}],
+                         Batch.entries(self.temp_dir))
+        self.assertEqual(3, Batch(path=self.temp_dir).number)
+
+    def test_archive(self):
+        batch = Batch(path=self.temp_dir, archive=True)
+        self.assertEqual(batch.path_archive, os.path.join(self.temp_dir, 'batch00001.zip'))
+        batch.write('bar1234.png', b'png')
+        with JsonWriter(batch.path_directory) as writer:
+            writer.write_many([1234])
+        self.assertFalse(Path(batch.path_archive).exists())
+        batch.close()
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['batch00001.zip', Batch.index_name, Batch.log_name])
+        with zipfile.ZipFile(batch.path_archive) as archive:
+            self.assertEqual(archive.read('bar1234.png'), b'png')
+            self.assertEqual(archive.getinfo('bar1234.png').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(json.loads(archive.read('serial-numbers.json')), [1234])
+            self.assertEqual(archive.getinfo('serial-numbers.json').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(Batch(path=self.temp_dir).number, 2)
+
+    def test_archive_delete(self):
+        """ An aborted archive leaves nothing behind, yet the next number accounts for unfinished archives. """
+        batch = Batch(path=self.temp_dir, archive=True)
+        batch.write('bar1234.png', b'png')
+        self.assertEqual(Batch(path=self.temp_dir, archive=True).number, 2)
+        batch.delete()
+        self.assertFalse(any(name.startswith(('batch00001', '.batch00001')) for name in os.listdir(self.temp_dir)))
+
+    def test_archive_delete_closed(self):
+        """ An archive deleted after it was closed, when finishing the batch failed, is removed with its entry. """
+        batch = Batch(path=self.temp_dir, archive=True)
+        batch.write('bar1234.png', b'png')
+        batch.close()
+        self.assertIsNone(batch.path_directory)
+        batch.delete()
+        self.assertEqual([Batch.index_name, Batch.log_name], sorted(os.listdir(self.temp_dir)))
+        self.assertEqual([], Batch.entries(self.temp_dir))
+        self.assertEqual(1, Batch(path=self.temp_dir, archive=True).number)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestBatchGenerator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=1000, engine='feistel')
+        config.save()
+        self.expected = [int(number) for number in config.generator().batch(1000)]
+
+    def test_issue(self):
+        """ Serial numbers carry on from call to call, and from one opening to the next. """
+        with BatchGenerator(path=self.temp_dir) as generator:
+            numbers = generator.issue(10)
+            numbers += [number for chunk in generator.serial_numbers(25, chunk_size=10) for number in chunk]
+            batch = generator.batch(100)
+            self.assertEqual(865, generator.remaining())
+        with open(os.path.join(batch.path_directory, 'serial-numbers.json')) as f:
+            numbers += json.load(f)
+        with BatchGenerator(path=self.temp_dir) as generator:
+            numbers += generator.issue(15)
+        self.assertEqual(self.expected[:150], numbers)
+        self.assertEqual([{'number': 1, 'name': 'batch00001', 'count': 100, 'seed_from': self.expected[34],
+                           'seed_to': self.expected[134], 'position_from': 35}], Batch.entries(self.temp_dir))
+        # every record counts the serial numbers it issued, like the batch records
+        config = Config(path=self.temp_dir)
+        config.load()
+        self.assertEqual([(None, 10), (None, 10), (None, 10), (None, 5), (1, 100), (None, 15)],
+                         [(record['batch'], record['count']) for record in config.records()])
+
+    def test_failed_batch(self):
+        """ A batch that fails is deleted and its serial numbers go to the next one. """
+        class Failing:
+            def __init__(self, path):
+                pass
+
+            def write_many(self, numbers):
+                raise OSError("disk full")
+
+            def close(self):
+                pass
+
+        with BatchGenerator(path=self.temp_dir) as generator:
+            with self.assertRaises(OSError):
+                generator.batch(100, sinks=(JsonWriter, Failing))
+            self.assertEqual([], [name for name in os.listdir(self.temp_dir) if name.startswith('batch')])
+            batch = generator.batch(100)
+        with open(os.path.join(batch.path_directory, 'serial-numbers.json')) as f:
+            self.assertEqual(self.expected[:100], json.load(f))
+
+    def test_batch_async(self):
+        """ The barcodes are rendered and written while the serial numbers are made, and a failure rolls back. """
+        class Failing(JsonWriter):
+            def write_many(self, numbers):
+                raise OSError("disk full")
+
+        with BatchGenerator(path=self.temp_dir) as generator:
+            with self.assertRaises(OSError):
+                asyncio.run(generator.batch_async(900, sinks=(Failing,), barcodes=True))
+            batch = asyncio.run(generator.batch_async(900, barcodes=True))
+            self.assertEqual(100, generator.remaining())
+        with open(os.path.join(batch.path_directory, 'serial-numbers.json')) as f:
+            self.assertEqual(self.expected[:900], json.load(f))
+        names = sorted(name for name in os.listdir(batch.path_directory) if name.endswith('.png'))
+        self.assertEqual(sorted(f"bar{number}.png" for number in self.expected[:900]), names)
+        self.assertTrue(all(png_complete(os.path.join(batch.path_directory, name)) for name in names))
+
+    def test_batch_async_finish(self):
+        """ The batch is finished in a thread rather than on the event loop, and rolled back should that fail. """
+        class FailingClose(JsonWriter):
+            def close(self):
+                raise OSError("disk full")
+
+        async def run(sinks):
+            loop_thread = threading.get_ident()
+            with mock.patch('src.rand_sn.batch_generator.finish_batch', autospec=True) as finish:
+                finish.side_effect = lambda *args: threads.append(threading.get_ident())
+                await generator.batch_async(100, sinks=sinks)
+            return loop_thread
+
+        threads = []
+        with BatchGenerator(path=self.temp_dir) as generator:
+            with self.assertRaises(OSError):
+                asyncio.run(run((FailingClose,)))
+            self.assertEqual(1000, generator.remaining())
+            self.assertEqual([], [name for name in os.listdir(self.temp_dir) if name.startswith('batch')])
+            loop_thread = asyncio.run(run((JsonWriter,)))
+        self.assertEqual(1, len(threads))
+        self.assertNotEqual(loop_thread, threads[0])
+
+    def test_errors(self):
+        generator = BatchGenerator(path=self.temp_dir)
+        with self.assertRaises(RuntimeError):
+            generator.issue(1)      # not opened
+        with generator:
+            with self.assertRaises(RuntimeError):
+                BatchGenerator(path=self.temp_dir).open()   # locked
+            with self.assertRaises(ValueError):
+                generator.issue(0)
+            with self.assertRaises(OverflowError):
+                generator.batch(1001)
+            self.assertEqual(1000, generator.remaining())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestGenerateBatch(unittest.TestCase):
+    """ Batches the way the command line makes them, in a temporary working directory. """
+
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=10000)
+        config.save()
+        self.seed = config.seed
+        self.expected = [int(number) for number in config.generator().batch(1000)]
+
+    def _args(self, **options) -> Namespace:
+        """ The arguments of a batch, as validate_args returns them. """
+        args = dict(config=None, number=None, workers=None, no_images=False, barcode_only=False, qr_only=False,
+                    image_format=None, compress_level=None, sheet=None, page=None, archive=False, digits=None,
+                    format=None, render=None, resume=False)
+        args.update(options)
+        return Namespace(**args)
+
+    def _config(self) -> Config:
+        config = Config(path=self.temp_dir)
+        config.load()
+        return config
+
+    def test_workers_failure(self):
+        """ A render failure in a worker process deletes the batch and leaves the config unsaved. """
+        config_file = Path(self.temp_dir, 'rand-sn-config.json').read_text()
+        with self.assertRaises(zlib.error):
+            # zlib has no level 10, so every chunk fails in the process rendering it
+            generate_batch(self._args(number=500, workers=2, barcode_only=True, compress_level=10), self._config())
+        self.assertEqual([], [name for name in os.listdir(self.temp_dir) if name.startswith('batch')])
+        self.assertEqual(config_file, Path(self.temp_dir, 'rand-sn-config.json').read_text())
+        self.assertIsNone(self._config().last_record())
+
+        # the next batch issues the same serial numbers
+        generate_batch(self._args(number=500, workers=2, barcode_only=True), self._config())
+        path_directory = os.path.join(self.temp_dir, 'batch00001')
+        self.assertEqual(self.expected[:500], list(read_serial_numbers(find_serial_file(path_directory))))
+        names = [name for name in os.listdir(path_directory) if name.endswith('.png')]
+        self.assertEqual(sorted(f"bar{number}.png" for number in self.expected[:500]), sorted(names))
+        self.assertEqual(500, self._config().issued)
+
+    def test_image_options(self):
+        """ --no-images issues only the serial numbers, --barcode-only and --qr-only one kind of image each. """
+        cases = [({'no_images': True}, ()), ({'barcode_only': True}, ('bar',))]
+        if qrcode is not None:
+            cases += [({'qr_only': True}, ('qr',)), ({}, ('bar', 'qr'))]
+        for number, (options, kinds) in enumerate(cases, 1):
+            generate_batch(self._args(number=10, **options), self._config())
+            numbers = self.expected[(number - 1) * 10:number * 10]
+            self.assertEqual({'serial-numbers.json'} | {f"{kind}{n}.png" for kind in kinds for n in numbers},
+                             set(os.listdir(os.path.join(self.temp_dir, f"batch{number:05}"))), options)
+
+    def test_render(self):
+        """ A batch issued with --no-images gets its images later with --render, without issuing any more. """
+        kinds = ('bar',) if qrcode is None else ('bar', 'qr')
+        generate_batch(self._args(number=300, no_images=True), self._config())
+        render_batch(self._args(render='batch00001', barcode_only=qrcode is None, workers=2))
+        path_directory = os.path.join(self.temp_dir, 'batch00001')
+        names = [f"{kind}{number}.png" for kind in kinds for number in self.expected[:300]]
+        self.assertEqual(sorted(names + ['serial-numbers.json']), sorted(os.listdir(path_directory)))
+        self.assertTrue(all(png_complete(os.path.join(path_directory, name)) for name in names))
+        self.assertEqual(300, self._config().issued)
+
+    def test_archive_failure(self):
+        """ A failure once the archive is closed deletes it, and the config isn't saved. """
+        class FailingJournal(Config):
+            def journal(self, *args, **kwargs):
+                raise OSError("disk full")
+
+        config_file = Path(self.temp_dir, 'rand-sn-config.json').read_text()
+        config = FailingJournal(path=self.temp_dir)
+        config.load()
+        with self.assertRaisesRegex(OSError, "disk full"):
+            generate_batch(self._args(number=50, archive=True, no_images=True), config)
+        self.assertEqual([], [name for name in os.listdir(self.temp_dir) if 'batch0' in name])
+        self.assertEqual([], Batch.entries(self.temp_dir))
+        self.assertEqual(config_file, Path(self.temp_dir, 'rand-sn-config.json').read_text())
+
+    @mock.patch('src.rand_sn.main._checkpoint_seconds', 0.0)
+    def test_resume(self):
+        """ An interrupted batch resumes from its last checkpoint, rendering again the images missing or cut short. """
+        class Interrupted(Config):
+            chunks = 0
+
+            def seed_cycle_many(self, numbers):
+                self.chunks += 1
+                if self.chunks == 3:
+                    raise OSError("disk full")
+                super().seed_cycle_many(numbers)
+
+        config = Interrupted(path=self.temp_dir)
+        config.load()
+        output = io.StringIO()
+        with self.assertRaisesRegex(OSError, "disk full"), redirect_stdout(output):
+            # 4 chunks of 250, checkpointed after each, the third never issued
+            generate_batch(self._args(number=1000, barcode_only=True), config)
+        self.assertIn("continue it with --resume", output.getvalue())
+        path_directory = os.path.join(self.temp_dir, 'batch00001')
+        self.assertEqual(500, self._config().last_record()['count'])
+        # the images of what was issued may not all be rendered, and some can be cut short
+        Path(path_directory, f"bar{self.expected[0]}.png").write_bytes(b'\x89PNG\r\n\x1a\n')
+
+        with redirect_stdout(io.StringIO()):
+            generate_batch(self._args(resume=True), self._config())
+        self.assertEqual(self.expected, list(read_serial_numbers(find_serial_file(path_directory))))
+        names = [f"bar{number}.png" for number in self.expected]
+        self.assertEqual(sorted(names + ['serial-numbers.json']), sorted(os.listdir(path_directory)))
+        self.assertTrue(all(png_complete(os.path.join(path_directory, name)) for name in names))
+        config = self._config()
+        self.assertEqual(1000, config.issued)
+        self.assertEqual(self.expected[-1], config.seed)
+        self.assertEqual([{'number': 1, 'name': 'batch00001', 'count': 1000, 'seed_from': self.seed,
+                           'seed_to': self.expected[-1], 'position_from': 0}], Batch.entries(self.temp_dir))
+
+    @mock.patch('src.rand_sn.main._checkpoint_seconds', 0.0)
+    def test_failure_after_close(self):
+        """ Once the serial numbers file has its final name the batch can't be resumed, so it is deleted. """
+        class FailingJournal(Config):
+            def journal(self, batch, count, checkpoint=None, lease=None):
+                if checkpoint is None:
+                    raise OSError("disk full")
+                super().journal(batch, count, checkpoint, lease)
+
+        config = FailingJournal(path=self.temp_dir)
+        config.load()
+        output = io.StringIO()
+        with self.assertRaisesRegex(OSError, "disk full"), redirect_stdout(output):
+            generate_batch(self._args(number=100, no_images=True), config)
+        self.assertNotIn("--resume", output.getvalue())
+        self.assertEqual([], [name for name in os.listdir(self.temp_dir) if name.startswith('batch')])
+
     def tearDown(self):
+        os.chdir(self.cwd)
         shutil.rmtree(self.temp_dir)
 
 
@@ -82,19 +457,204 @@ class TestConfig(unittest.TestCase):
         config = Config(path=self.temp_dir)
         config.configure(biggest=10)
         config.seed_cycle(first)        # establish the first
-        config.seed_cycle(first + 1)    # different should be permitted
+        self.assertEqual((first, 1, 9), (config.first, config.issued, config.remaining()))
+        for number in range(first + 1, 11):
+            config.seed_cycle(number)   # the rest of the cycle should be permitted
+        self.assertEqual(0, config.remaining())
         with self.assertRaises(OverflowError):
             config.seed_cycle(first)  # simulate cycling back to the first
 
+    def test_save_atomic(self):
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=10)
+        config.save()
+        self.assertEqual(os.listdir(self.temp_dir), [self.file])
+
+    def test_journal(self):
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=1000)
+        config.save()
+        config.first, config.seed = 5, 6
+        config.journal(1, 10)
+        config.seed = 7
+        config.journal(2, 10)
+        with open(config.path_journal, 'a') as f:
+            f.write('{"batch": 3, "co')    # a crash mid-write
+
+        # the config on disk is behind, loading catches up with the last complete record
+        config = Config(path=self.temp_dir)
+        config.load()
+        self.assertEqual((config.first, config.seed), (5, 7))
+        self.assertEqual(config.last_record(), {'batch': 2, 'count': 10, 'first': 5, 'seed': 7, 'issued': 0})
+        config.seed = 8
+        config.journal(3, 10)
+        self.assertEqual(config.last_record()['seed'], 8)
+
+        # a checkpoint is a record too
+        config.seed = 9
+        config.journal(4, 5, {'offset': 20})
+        self.assertEqual(config.last_record()['checkpoint'], {'offset': 20})
+
+        # a record made before the seed moves on is written as it was made, the way the server journals
+        record = config.journal_record(None, 3)
+        config.seed = 10
+        config.append_journal(record)
+        self.assertEqual({'batch': None, 'count': 3, 'first': 5, 'seed': 9, 'issued': 0}, config.last_record())
+
+        # configuring starts over
+        config.configure(biggest=1000)
+        config.save()
+        self.assertIsNone(config.last_record())
+
+    def test_journal_long(self):
+        """ The last record is found when the journal is longer than what is read at a time. """
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=10 ** 6)
+        config.save()
+        config.first = 1
+        for seed in range(1, 1001):
+            config.seed = seed
+            config.journal(seed, 1)
+        self.assertEqual(Config(path=self.temp_dir).last_record()['seed'], 1000)
+
+    def test_seed_cycle_many(self):
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=10)
+        config.seed_cycle_many([3, 4, 5])
+        self.assertEqual((3, 5, 3), (config.first, config.seed, config.issued))
+        with self.assertRaises(OverflowError):
+            config.seed_cycle_many([6] * 8)
+        self.assertEqual((3, 5, 3), (config.first, config.seed, config.issued))
+        config.seed_cycle_many([6, 7, 8, 9, 10, 1, 2])
+        self.assertEqual((3, 2, 10), (config.first, config.seed, config.issued))
+        with self.assertRaises(OverflowError):
+            config.seed_cycle_many([3])
+
+    def test_count_issued(self):
+        """ A config saved before the count was kept gets it counted. """
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=1000)
+        numbers = [int(number) for number in FullCycleRandom(min_int=1, seed=config.seed, max_int=1000).batch(600)]
+        config.seed_cycle_many(numbers)
+        config.save()
+        with open(config.path_file) as f:
+            config_dict = json.load(f)
+        del config_dict['issued']
+        with open(config.path_file, 'w') as f:
+            json.dump(config_dict, f)
+        config = Config(path=self.temp_dir)
+        config.load()
+        self.assertEqual((600, 400), (config.issued, config.remaining()))
+
+    def test_taps(self):
+        """ The taps are kept. A config from before gets those it was made with, the old ones if they were replaced. """
+        def rewrite(**changes):
+            with open(self.path_file) as f:
+                config_dict = json.load(f)
+            config_dict.update(changes)
+            for key in [key for key, value in changes.items() if value is None]:
+                del config_dict[key]
+            with open(self.path_file, 'w') as f:
+                json.dump(config_dict, f)
+
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=1000)
+        self.assertEqual([10, 7], config.taps)
+        config.save()
+        rewrite(taps=None)
+        config = Config(path=self.temp_dir)
+        config.load()
+        self.assertEqual([10, 7], config.taps)
+
+        # 40 bits, one of the widths whose old taps weren't maximal-length, carries on the sequence it was made with
+        config.configure(biggest=2 ** 39 + 5)
+        config.seed = 123456789012
+        config.save()
+        rewrite(taps=None)
+        config = Config(path=self.temp_dir)
+        with self.assertWarnsRegex(UserWarning, "older rand-sn"):
+            config.load()
+        self.assertEqual(list(LFSR.replaced_taps[40]), config.taps)
+        numbers = [int(number) for number in config.generator().batch(4)]
+        self.assertEqual([488752386465, 244376193232, 122188096616, 488673093190], numbers)  # as an older rand-sn
+        config.seed_cycle_many(numbers)
+        config.save()
+        config = Config(path=self.temp_dir)
+        with self.assertWarnsRegex(UserWarning, "older rand-sn"):
+            config.load()
+        self.assertEqual(list(LFSR.replaced_taps[40]), config.taps)
+
+        # its cycle is shorter than the range, so it stops when the cycle comes back to the first number, as before
+        with self.assertRaises(OverflowError):
+            config.seed_cycle_many([5, numbers[0]])
+        self.assertEqual((numbers[0], numbers[-1], 4), (config.first, config.seed, config.issued))
+        config.first, config.issued = None, 0
+        with self.assertRaises(OverflowError):
+            config.seed_cycle_many([5, 6, 5])
+        config.seed_cycle_many([5, 6])
+        self.assertEqual((5, 6), (config.first, config.seed))
+
+        # a lease follows the old taps too
+        expected = [int(number) for number in config.generator().batch(3)]
+        lease = take_lease(config, 3)
+        self.assertEqual((list(LFSR.replaced_taps[40]), expected), (lease.taps, list(lease.serial_numbers())))
+
+    def test_feistel(self):
+        """ The key is saved, and the generator continues the sequence from the count issued. """
+        config = Config(path=self.temp_dir)
+        with self.assertRaises(ValueError):
+            config.configure(biggest=1025, engine='aes')
+        config.configure(biggest=1025, engine='feistel')
+        self.assertIsInstance(config.key, int)
+        numbers = [int(number) for number in config.generator().batch(1025)]
+        config.seed_cycle_many(numbers[:100])
+        config.save()
+
+        config = Config(path=self.temp_dir)
+        config.load()
+        self.assertEqual(numbers[100:110], [int(number) for number in config.generator().batch(10)])
+        config.configure(biggest=1025)
+        self.assertIsNone(config.key)
+
+    def test_serial_at(self):
+        """ Both engines look up issued serial numbers by index, and back, but not the ones still to come. """
+        for engine in Config.engines:
+            config = Config(path=self.temp_dir)
+            config.configure(biggest=1025, engine=engine)
+            fcr = config.generator()
+            numbers = [int(number) for number in fcr.batch(1025)]
+            config.seed_cycle_many(numbers[:300])
+            config.journal(None, 300)   # the shift register steps from here for the later ones
+            config.seed_cycle_many(numbers[300:700])
+            for index in (0, 1, 2, 299, 300, 350, 699):
+                self.assertEqual(numbers[index], config.serial_at(index))
+                self.assertEqual(index, config.index_of(numbers[index]))
+            for number in (numbers[700], numbers[1024], 0, 1026, True):
+                self.assertIsNone(config.index_of(number))
+            if np is not None:
+                self.assertEqual(350, config.index_of(np.uint64(numbers[350])))
+            with self.assertRaises(IndexError):
+                config.serial_at(700)
+            os.remove(config.path_journal)
+
+    def test_lock(self):
+        config = Config(path=self.temp_dir)
+        with config.lock():
+            with self.assertRaises(RuntimeError):
+                with Config(path=self.temp_dir).lock():
+                    pass
+        with config.lock():
+            pass
+
     def _validate_config(self, config: Config):
         self.assertIsInstance(config.smallest, int)
         self.assertIsInstance(config.seed, int)
         self.assertIsInstance(config.biggest, int)
-        self.assertGreater(config.smallest,0)
+        self.assertGreater(config.smallest, 0)
         self.assertLessEqual(config.smallest, config.seed)
         self.assertLessEqual(config.seed, config.biggest)
         if config.first is not None:
-            self.assertIsInstance(config.first, int,"should be None or int")
+            self.assertIsInstance(config.first, int, "should be None or int")
             self.assertLessEqual(config.smallest, config.first)
             self.assertLessEqual(config.first, config.biggest)
         self.assertEqual(config._file, self.file)
@@ -104,6 +664,263 @@ class TestConfig(unittest.TestCase):
         shutil.rmtree(self.temp_dir)
 
 
+class TestLease(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+        self.config = Config(path=self.temp_dir)
+        self.config.configure(biggest=1000)
+
+    def test_take_lease(self):
+        """ Leases and what follows them are the cycle in order, without overlaps. """
+        seed = self.config.seed
+        first = take_lease(self.config, 300, 'factory-1')
+        second = take_lease(self.config, 200)
+        expected = [int(number) for number in FullCycleRandom(min_int=1, seed=seed, max_int=1000).batch(600)]
+        self.assertEqual(expected[:300], list(first.serial_numbers()))
+        self.assertEqual(expected[300:500], list(second.serial_numbers()))
+        self.assertEqual((expected[0], expected[499]), (self.config.first, self.config.seed))
+
+        # the leases are in the journal, and a lease file gives the same serial numbers
+        self.assertEqual([(seed, 300, 'factory-1'), (expected[299], 200, None)],
+                         [(lease.seed, lease.count, lease.holder) for lease in leases(self.config)])
+        path_file = os.path.join(self.temp_dir, 'lease.json')
+        first.save(path_file)
+        self.assertEqual(expected[:300], list(Lease.load(path_file).serial_numbers()))
+
+    def test_take_lease_feistel(self):
+        """ With the Feistel engine the block's ends are computed rather than stepped through, to the same effect. """
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=1000, engine='feistel')
+        expected = [int(number) for number in config.generator().batch(600)]
+        take_lease(config, 100)
+        lease = take_lease(config, 400)
+        self.assertEqual(expected[100:500], list(lease.serial_numbers()))
+        self.assertEqual((expected[0], expected[499], 500), (config.first, config.seed, config.issued))
+        self.assertEqual(expected[500:510], [int(number) for number in config.generator().batch(10)])
+        lease.save(os.path.join(self.temp_dir, 'lease.json'))
+        self.assertEqual([], [name for name in os.listdir(self.temp_dir) if name.endswith('.part')])
+
+    def test_take_lease_raises(self):
+        seed = self.config.seed
+        with self.assertRaises(ValueError):
+            take_lease(self.config, 0)
+        with self.assertRaises(OverflowError):
+            take_lease(self.config, 1001)
+        self.assertEqual((None, seed), (self.config.first, self.config.seed))
+        self.assertEqual([], leases(self.config))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestVerifyIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+
+    def _batch(self, config: Config, count: int) -> list:
+        """ Issue a finished batch, the way next_batch does. """
+        batch = Batch(path=self.temp_dir)
+        seed_from, position_from = config.seed, config.issued
+        numbers = [int(number) for number in config.generator().batch(count)]
+        config.seed_cycle_many(numbers)
+        with JsonWriter(batch.path_directory) as writer:
+            writer.write_many(numbers)
+        batch.record(count, seed_from, config.seed, position_from)
+        return numbers
+
+    def test_verify_locked(self):
+        """ --verify waits its turn rather than syncing the index while another process issues. """
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=5000)
+        config.save()
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            with config.lock(), self.assertRaises(RuntimeError):
+                verify(Namespace(config=None, verify=[1]))
+            self.assertFalse(os.path.exists(config.path_verify))
+            self._batch(config, 10)
+            with redirect_stdout(io.StringIO()) as out:
+                verify(Namespace(config=None, verify=[1]))
+            self.assertTrue(os.path.exists(config.path_verify))
+            self.assertIn("1: ", out.getvalue())
+        finally:
+            os.chdir(cwd)
+
+    def test_sync(self):
+        """ Batches are indexed once, again when cut short, and from their files when the batch index is lost. """
+        for engine in Config.engines:
+            config = Config(path=self.temp_dir)
+            config.configure(biggest=5000, engine=engine)
+            config.save()
+            first = self._batch(config, 700)
+            with VerifyIndex(config, self.temp_dir) as index:
+                self.assertEqual([1], index.sync())
+                second = self._batch(config, 1500)
+                self.assertEqual([2], index.sync())
+                self.assertEqual([], index.sync())
+                self.assertEqual([1] * 700 + [2] * 1500, [index.lookup(number) for number in first + second])
+                issued = set(first + second)
+                self.assertEqual([None] * 10, [index.lookup(n) for n in range(0, 5002) if n not in issued][-10:])
+
+                # an update cut short before the first serial number was written
+                index._cell.pack_into(index._map, index._offset(second[0]), 0)
+                self.assertEqual([2], index.sync())
+
+            os.remove(os.path.join(self.temp_dir, Batch.index_name))
+            os.remove(os.path.join(self.temp_dir, Batch.log_name))
+            os.remove(config.path_verify)
+            with VerifyIndex(config, self.temp_dir) as index:
+                self.assertEqual([1, 2], index.sync())
+                self.assertEqual([1, 2], [index.lookup(first[-1]), index.lookup(second[-1])])
+            shutil.rmtree(self.temp_dir)
+            os.mkdir(self.temp_dir)
+
+    def test_index_of(self):
+        """ With the shift register, a serial number in a batch is found in the batch, the others from the first. """
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=5000)
+        config.save()
+        first = self._batch(config, 700)
+        lease = list(take_lease(config, 300).serial_numbers())
+        second = self._batch(config, 1500)
+        with VerifyIndex(config, self.temp_dir) as index:
+            index.sync()
+        with mock.patch.object(VerifyIndex, 'position', autospec=True, side_effect=VerifyIndex.position) as position:
+            for index, number in ((699, first[-1]), (1000, second[0]), (2499, second[-1])):
+                self.assertEqual(index, config.index_of(number, self.temp_dir))
+            self.assertEqual(3, position.call_count)
+        self.assertEqual(850, config.index_of(lease[150], self.temp_dir))
+
+    def test_too_wide(self):
+        config = Config(path=self.temp_dir)
+        config.configure(biggest=VerifyIndex.max_capacity + 1)
+        with self.assertRaises(ValueError):
+            VerifyIndex(config)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+@unittest.skipUnless(hasattr(asyncio, 'start_unix_server'), "needs Unix sockets")
+class TestIssuanceServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+        self.config = Config(path=self.temp_dir)
+        self.config.configure(biggest=1000)
+        self.config.save()
+
+    def test_concurrent(self):
+        """ Clients asking at the same time get different serial numbers, all journaled and saved. """
+        address = os.path.join(self.temp_dir, 'sock')
+        server = IssuanceServer(self.config)
+
+        async def request(target):
+            reader, writer = await asyncio.open_unix_connection(address)
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            status = (await reader.readline()).split()[1]
+            length = 0
+            while True:
+                header = await reader.readline()
+                if header == b'\r\n':
+                    break
+                if header.lower().startswith(b'content-length:'):
+                    length = int(header.split(b':')[1])
+            body = json.loads(await reader.readexactly(length))
+            writer.close()
+            return int(status), body
+
+        async def run():
+            task = asyncio.ensure_future(server.serve(address))
+            while not os.path.exists(address):
+                await asyncio.sleep(0.01)
+            results = await asyncio.gather(*[request('/issue?count=10') for _ in range(20)])
+            errors = [await request(target) for target in ('/issue?count=0', '/issue?count=x', '/other')]
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return results, errors
+
+        results, errors = asyncio.run(run())
+        numbers = [number for status, body in results for number in body['serial_numbers']]
+        self.assertEqual(200, results[0][0])
+        self.assertEqual(200, len(set(numbers)))
+        self.assertEqual([400, 400, 404], [status for status, _ in errors])
+        self.assertEqual(200, self.config.last_record()['count'])
+        config = Config(path=self.temp_dir)
+        config.load()
+        self.assertEqual(self.config.seed, config.seed)
+        fcr = FullCycleRandom(min_int=1, seed=config.seed, max_int=1000)
+        self.assertFalse(set(numbers) & {int(n) for n in fcr.batch(100)})
+
+    def test_overflow(self):
+        server = IssuanceServer(self.config)
+        seed = self.config.seed
+
+        async def run():
+            with self.assertRaises(OverflowError):
+                await server.issue(1001)
+            self.assertEqual((None, seed, 0), (self.config.first, self.config.seed, server.issued))
+            return await server.issue(1000)
+
+        self.assertEqual(1000, len(set(asyncio.run(run()))))
+
+    def test_issue_thread(self):
+        """ The serial numbers are generated in a thread rather than on the event loop, one request at a time. """
+        server = IssuanceServer(self.config)
+        threads = []
+        batch = server._fcr.batch
+
+        def generate(count):
+            threads.append(threading.get_ident())
+            return batch(count)
+
+        async def run():
+            with mock.patch.object(server._fcr, 'batch', side_effect=generate):
+                results = await asyncio.gather(*[server.issue(100) for _ in range(5)])
+            return threading.get_ident(), results
+
+        loop_thread, results = asyncio.run(run())
+        self.assertEqual(5, len(threads))
+        self.assertNotIn(loop_thread, threads)
+        self.assertEqual(500, len({number for numbers in results for number in numbers}))
+        self.assertEqual((500, 500), (server.issued, self.config.issued))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestStartup(unittest.TestCase):
+    """ Configuring and issuing numbers only must start quickly, without loading what renders or serves. """
+
+    budget: float = 0.3     # seconds to import rand_sn.main, with room for slow machines
+    heavy = ('PIL', 'qrcode', 'barcode', 'asyncio', 'concurrent', 'zipfile')
+
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+
+    def import_times(self, *args: str) -> dict:
+        """ Run rand-sn with -X importtime, return the cumulative seconds of each module imported. """
+        env = dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'rand_sn', *args], cwd=self.temp_dir,
+                                env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(0, result.returncode, result.stderr[-2000:])
+        times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and not line.endswith('imported package'):
+                _, cumulative, name = line[len('import time:'):].split('|')
+                times[name.strip()] = int(cumulative) / 1e6
+        return times
+
+    def test_import_time(self):
+        for args in (('--help',), ('-s', '1', '-b', '9999'), ('-n', '10', '--no-images')):
+            times = self.import_times(*args)
+            self.assertEqual([], [name for name in times if name.startswith(self.heavy)], args)
+            self.assertLess(times['rand_sn.main'], self.budget, args)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
 class TestLFSR(unittest.TestCase):
 
     def setUp(self):
@@ -152,6 +969,52 @@ class TestLFSR(unittest.TestCase):
         result_b_2 = next(lfsr)
         self.assertEqual(result_b_1, result_b_2)
 
+    def test_jump(self):
+        """ Jumping ahead should land on the same register as stepping. """
+        for bits in (2, 3, 8, 16, 32, 40, 64):
+            seed = random.randint(1, 2 ** bits - 1)
+            stepped = LFSR(seed=seed, bits=bits)
+            jumped = LFSR(seed=seed, bits=bits)
+            position = 0
+            for n in (0, 1, bits - 1, bits, bits + 1, 100, 1000):
+                for _ in range(n):
+                    next(stepped)
+                position += n
+                self.assertEqual(stepped._register, jumped.jump(n), f"{bits} bits, position {position}")
+                self.assertEqual(next(stepped), next(jumped))
+                position += 1
+
+    def test_jump_full_cycle(self):
+        """ Jumping a whole period should return to the seed, and big jumps should be quick. """
+        for bits in (12, 20, 47, 63):
+            lfsr = LFSR(bits=bits)
+            seed = lfsr._register
+            self.assertEqual(seed, lfsr.jump(2 ** bits - 1))
+            self.assertNotEqual(seed, lfsr.jump(10 ** 12))
+
+    def test_take(self):
+        """ Taking in bulk should return the same registers as stepping, and leave the register in the same place. """
+        for bits in (2, 3, 8, 13, 16, 20, 47, 63):
+            seed = random.randint(1, 2 ** bits - 1)
+            stepped = LFSR(seed=seed, bits=bits)
+            taken = LFSR(seed=seed, bits=bits)
+            for k in (0, 1, 2, bits, 1000):
+                expected = [next(stepped) for _ in range(k)]
+                self.assertEqual(expected, list(taken.take(k)), f"{bits} bits")
+                self.assertEqual(stepped._register, taken._register)
+
+    def test_take_raises(self):
+        with self.assertRaises(TypeError):
+            LFSR().take(None)
+        with self.assertRaises(ValueError):
+            LFSR().take(-1)
+
+    def test_jump_raises(self):
+        with self.assertRaises(TypeError):
+            LFSR().jump(1.5)
+        with self.assertRaises(ValueError):
+            LFSR().jump(-1)
+
     def test_series_lengths(self):
         """ all possible numbers should be generated before repeating """
         start_time = time.time()
@@ -180,6 +1043,35 @@ class TestLFSR(unittest.TestCase):
         for key in LFSR._optimal_taps.keys():
             self.assertEqual(last + 1, key)
             last = key
+        self.assertEqual(list(range(2, primitive.max_bits + 1)), sorted(LFSR._taps_available()))
+        self.assertIsNone(LFSR.taps_of(primitive.max_bits + 1))
+
+    def test_primitive(self):
+        """ Every width's polynomial is primitive, proven by the order of x with the factors in the data file. """
+        for bits, entry in primitive.load().items():
+            taps = LFSR.taps_of(bits)
+            self.assertEqual(tuple(entry['taps']), taps)
+            remainder = 2 ** bits - 1
+            for factor in entry['factors']:
+                self.assertTrue(primitive.is_prime(factor), f"{factor} isn't prime")
+                self.assertEqual(0, remainder % factor)
+                while remainder % factor == 0:
+                    remainder //= factor
+            self.assertEqual(1, remainder, f"the factors of 2^{bits} - 1 are incomplete")
+            self.assertEqual(LFSR(bits=bits)._polynomial, primitive.polynomial(taps))
+            self.assertTrue(primitive.is_primitive(primitive.polynomial(taps), entry['factors']), f"{bits} bits")
+        self.assertFalse(primitive.is_primitive(primitive.polynomial((8, 7)), [3, 5, 17]))
+        self.assertEqual([3, 5, 17, 257, 641, 65537, 6700417], primitive.mersenne_factors(64))
+
+    def test_wide(self):
+        """ Registers wider than 64 bits step, take and jump alike, and come back after 2^bits - 1 steps. """
+        for bits in (65, 100, 128):
+            lfsr = LFSR(seed=12345, bits=bits)
+            stepped = [next(lfsr) for _ in range(300)]
+            taken = LFSR(seed=12345, bits=bits)
+            self.assertEqual(stepped, list(taken.take(300)))
+            self.assertEqual(stepped[-1], LFSR(seed=12345, bits=bits).jump(300))
+            self.assertEqual(12345, LFSR(seed=12345, bits=bits).jump(2 ** bits - 1))
 
 
 class TestFullCycleRandom(unittest.TestCase):
@@ -225,6 +1117,46 @@ class TestFullCycleRandom(unittest.TestCase):
         result_b_2 = next(fcr)
         self.assertEqual(result_b_1, result_b_2)
 
+    def test_batch(self):
+        """ A batch should be the same numbers as iterating, and resume where iterating would. """
+        for (min_int, max_int) in ((1, 1), (1, 8), (1, 1025), (50, 99999), (1000, 2 ** 40), (2 ** 70, 2 ** 70 + 5)):
+            seed = random.randint(min_int, max_int)
+            iterated = FullCycleRandom(seed=seed, min_int=min_int, max_int=max_int)
+            batched = FullCycleRandom(seed=seed, min_int=min_int, max_int=max_int)
+            for k in (0, 1, 10, 3000):
+                expected = [next(iterated) for _ in range(k)]
+                numbers = batched.batch(k)
+                self.assertEqual(k, len(numbers))
+                self.assertEqual(expected, [int(number) for number in numbers])
+            self.assertEqual(next(iterated), next(batched))
+
+    def test_wide(self):
+        """ Ranges wider than 64 bits use the generated taps. """
+        fcr = FullCycleRandom(min_int=10 ** 20, max_int=2 ** 100)
+        numbers = [int(number) for number in fcr.batch(1000)]
+        self.assertEqual(1000, len(set(numbers)))
+        self.assertTrue(all(10 ** 20 <= number <= 2 ** 100 for number in numbers))
+        self.assertEqual(numbers[500:510], [int(number) for number in
+                                            FullCycleRandom(min_int=10 ** 20, max_int=2 ** 100,
+                                                            seed=numbers[499]).batch(10)])
+        with self.assertRaises(ValueError):
+            FullCycleRandom(max_int=2 ** 128)
+
+    def test_remaining(self):
+        fcr = FullCycleRandom(min_int=11, max_int=20, position=3)
+        self.assertEqual(7, fcr.remaining())
+        next(fcr)
+        fcr.batch(4)
+        self.assertEqual((8, 2), (fcr.position, fcr.remaining()))
+        fcr.batch(5)
+        self.assertEqual(0, fcr.remaining())
+
+    def test_batch_raises(self):
+        with self.assertRaises(TypeError):
+            FullCycleRandom().batch('10')
+        with self.assertRaises(ValueError):
+            FullCycleRandom().batch(-1)
+
     def test_series_length(self):
         """ All possible numbers should be generated before repeating """
         for (min_int, max_int) in ((1, 1),  # smallest possible
@@ -246,6 +1178,388 @@ class TestFullCycleRandom(unittest.TestCase):
                     self.assertEqual(unique_values, len(generated))
                     break   # series complete
 
+    def test_key(self):
+        """ With a key, the cycle is full, batches match iterating, and the position alone resumes it. """
+        for (min_int, max_int) in ((1, 1), (1, 1025), (50, 9999), (2 ** 70, 2 ** 70 + 5)):
+            fcr = FullCycleRandom(min_int=min_int, max_int=max_int, key=12345)
+            self.assertIsNone(fcr._lfsr)
+            iterated = [next(fcr) for _ in range(max_int - min_int + 1)]
+            self.assertEqual(list(range(min_int, max_int + 1)), sorted(iterated))
+            self.assertEqual(iterated[0], next(fcr))    # the cycle repeats
+            for position in (0, 1, (max_int - min_int) // 2):
+                resumed = FullCycleRandom(min_int=min_int, max_int=max_int, position=position, key=12345)
+                expected = [iterated[(position + i) % len(iterated)] for i in range(5)]
+                self.assertEqual(expected, [int(number) for number in resumed.batch(5)])
+        self.assertNotEqual([next(FullCycleRandom(max_int=10 ** 6, key=key)) for key in range(2)], [1, 1])
+
+    def test_serial_at(self):
+        fcr = FullCycleRandom(min_int=1000, max_int=5000, key=99)
+        numbers = [next(fcr) for _ in range(10)]
+        self.assertEqual(numbers, [fcr.serial_at(index) for index in range(10)])
+        self.assertEqual(list(range(10)), [fcr.index_of(number) for number in numbers])
+        self.assertEqual(numbers[0], fcr.serial_at(4001))   # wraps around
+        with self.assertRaises(ValueError):
+            fcr.index_of(999)
+        with self.assertRaises(ValueError):
+            FullCycleRandom(min_int=1000, max_int=5000).serial_at(0)
+
+
+class TestFeistelPermutation(unittest.TestCase):
+
+    def test_init_raises(self):
+        for (size, key) in ((0, 1), (10, -1), (10, '1'), (1.5, 1)):
+            with self.assertRaises(ValueError):
+                FeistelPermutation(size, key)
+
+    def test_permutation(self):
+        """ Every number is mapped to exactly once, and inverse undoes forward. """
+        for size in (1, 2, 3, 7, 1025, 4096, 10007):
+            permutation = FeistelPermutation(size, key=random.getrandbits(128))
+            numbers = [permutation.forward(x) for x in range(size)]
+            self.assertEqual(list(range(size)), sorted(numbers))
+            self.assertEqual(list(range(size)), [permutation.inverse(y) for y in numbers])
+            self.assertEqual(numbers, [int(y) for y in permutation.forward_many(0, size)])
+            expected = [numbers[(size - 2 + i) % size] for i in range(4)]
+            self.assertEqual(expected, [int(y) for y in permutation.forward_many(size - 2, 4)])
+
+    def test_wide(self):
+        """ Ranges beyond 64 bits hash with BLAKE2 instead, and still map back. """
+        for size in (2 ** 64, 10 ** 30):
+            permutation = FeistelPermutation(size, key=7)
+            for x in (0, 1, size // 3, size - 1):
+                y = permutation.forward(x)
+                self.assertLess(y, size)
+                self.assertEqual(x, permutation.inverse(y))
+
+
+def png_rows(png: bytes) -> list:
+    """ Decode a 1-bit PNG made by encode_png into rows of pixels, '1' is dark. """
+    chunks = {}
+    position = 8
+    while position < len(png):
+        length, kind = struct.unpack('>I4s', png[position:position + 8])
+        chunks[kind] = png[position + 8:position + 8 + length]
+        position += 12 + length
+    width, height = struct.unpack('>II', chunks[b'IHDR'][:8])
+    raw = zlib.decompress(chunks[b'IDAT'])
+    stride = 1 + (width + 7) // 8
+    return [''.join(format(byte ^ 0xff, '08b') for byte in raw[y * stride + 1:(y + 1) * stride])[:width]
+            for y in range(height)]
+
+
+def svg_rows(svg: bytes) -> list:
+    """ Fill in the rectangles of an SVG made by encode_svg, into rows of pixels, '1' is dark. """
+    text = svg.decode()
+    width, height = map(int, re.search(r'viewBox="0 0 (\d+) (\d+)"', text).groups())
+    grid = [['0'] * width for _ in range(height)]
+    for x, y, length, rows in re.findall(r'M(\d+) (\d+)h(\d+)v(\d+)h-\d+z', text):
+        for row in grid[int(y):int(y) + int(rows)]:
+            row[int(x):int(x) + int(length)] = ['1'] * int(length)
+    return [''.join(row) for row in grid]
+
+
+def read_qr(modules: list) -> str:
+    """
+    Read the text of a QR code's modules, as a scanner would. Only for the undamaged, single block codes of error
+    correction level L in these tests, so there is nothing to correct or deinterleave.
+    """
+    size = len(modules)
+    version = (size - 17) // 4
+    data_codewords = {1: 19, 2: 34, 3: 55, 4: 80, 5: 108}[version]
+    masks = [lambda r, c: (r + c) % 2 == 0, lambda r, c: r % 2 == 0, lambda r, c: c % 3 == 0,
+             lambda r, c: (r + c) % 3 == 0, lambda r, c: (r // 2 + c // 3) % 2 == 0,
+             lambda r, c: (r * c) % 2 + (r * c) % 3 == 0, lambda r, c: ((r * c) % 2 + (r * c) % 3) % 2 == 0,
+             lambda r, c: ((r + c) % 2 + (r * c) % 3) % 2 == 0]
+
+    # the format, next to the top left finder, gives the mask
+    rows = [0, 1, 2, 3, 4, 5, 7, 8] + list(range(size - 7, size))
+    format_bits = sum(modules[row][8] << i for i, row in enumerate(rows[:15])) ^ 0b101010000010010
+    mask = masks[(format_bits >> 10) & 7]
+
+    # the function patterns: finders with their separators and the format, timing, and alignment for version 2 on
+    def reserved(r, c):
+        if (r < 9 and c < 9) or (r < 9 and c >= size - 8) or (r >= size - 8 and c < 9) or r == 6 or c == 6:
+            return True
+        return version > 1 and abs(r - (size - 7)) <= 2 and abs(c - (size - 7)) <= 2
+
+    # the data goes up and down two columns at a time from the bottom right, skipping the vertical timing pattern
+    bits = []
+    upward = True
+    for right in range(size - 1, 0, -2):
+        if right <= 6:
+            right -= 1
+        for r in (range(size - 1, -1, -1) if upward else range(size)):
+            for c in (right, right - 1):
+                if not reserved(r, c):
+                    bits.append(modules[r][c] ^ mask(r, c))
+        upward = not upward
+    bits = bits[:data_codewords * 8]
+
+    def take(count):
+        value = int(''.join('1' if bit else '0' for bit in bits[:count]), 2)
+        del bits[:count]
+        return value
+
+    alphanumeric = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+    text = b''
+    while len(bits) >= 4:
+        mode = take(4)
+        if mode == 0b0001:      # numeric, 3 digits in 10 bits
+            count = take(10)
+            for i in range(0, count, 3):
+                digits = min(3, count - i)
+                text += str(take({3: 10, 2: 7, 1: 4}[digits])).zfill(digits).encode()
+        elif mode == 0b0010:    # alphanumeric, 2 characters in 11 bits
+            count = take(9)
+            for i in range(0, count, 2):
+                if count - i > 1:
+                    pair = take(11)
+                    text += (alphanumeric[pair // 45] + alphanumeric[pair % 45]).encode()
+                else:
+                    text += alphanumeric[take(6)].encode()
+        elif mode == 0b0100:    # bytes
+            text += bytes(take(8) for _ in range(take(8)))
+        else:
+            break               # the terminator
+    return text.decode()
+
+
+@unittest.skipIf(qrcode is None, "needs qrcode")
+class TestQRRenderer(unittest.TestCase):
+    def test_decodable(self):
+        """ Codes made with the version, mask and encoded prefix of the first read as the prefix and number. """
+        random.seed(2)
+        for prefix in (None, 'https://mydomain.com/c/', 'HTTPS://X.CO/', '0042-'):
+            renderer = QRRenderer(prefix, digits=7)
+            version, mask = renderer._qr.version, renderer._mask
+            numbers = [1, 42, 999, 1000000, 9999999] + [random.randrange(1, 10 ** 7) for _ in range(50)]
+            for number in numbers:
+                self.assertEqual(renderer.data(number), read_qr(renderer.make(number).modules), (prefix, number))
+            self.assertEqual((version, mask), (renderer._qr.version, renderer._mask))
+
+            # a longer number than the version was fitted to gets a bigger one
+            number = 10 ** 60 + 7
+            self.assertEqual(renderer.data(number), read_qr(renderer.make(number).modules))
+            self.assertGreater(renderer._qr.version, version)
+            self.assertEqual(renderer.data(5), read_qr(renderer.make(5).modules))
+
+    def test_image_formats(self):
+        """ The PNG and SVG have the code's modules, with the quiet zone, and the PNG scans. """
+        png = QRRenderer('https://mydomain.com/c/')
+        svg = QRRenderer('https://mydomain.com/c/', image_format='svg')
+        rows = png.rows(1234567)
+        self.assertEqual(rows, svg.rows(1234567))
+        self.assertEqual(rows, svg_rows(svg.render(1234567)))
+        pixels = png_rows(png.render(1234567))
+        box_size = png._qr.box_size
+        self.assertEqual([row[::box_size] for row in pixels[::box_size]], rows)
+        border = png._qr.border
+        modules = [[pixel == '1' for pixel in row[border:-border]] for row in rows[border:-border]]
+        self.assertEqual(png.data(1234567), read_qr(modules))
+        self.assertEqual('qr1234567.svg', svg.file_name(1234567, svg.image_format))
+
+    def test_numeric(self):
+        """ The number is encoded in numeric mode, so a prefix and number fit a smaller version than as text. """
+        renderer = QRRenderer('https://mydomain.com/c/')
+        renderer.make(1234567890123)
+        reference = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L)
+        reference.add_data(renderer.data(1234567890123))
+        reference.make()
+        self.assertLess(renderer._qr.version, reference.version)
+
+    def test_batch_version(self):
+        """ Every QR code of a batch is the version its biggest serial number needs, whatever the chunk. """
+        prefix = 'https://mydomain.com/c/'
+        digits = 30
+        size = len(QRRenderer(prefix).rows(10 ** (digits - 1)))
+        self.assertGreater(size, len(QRRenderer(prefix).rows(5)))
+        images = dict(render_chunk([5, 42], None, prefix, barcodes=False, image_format='svg', digits=digits))
+        self.assertEqual([size, size], [len(svg_rows(image)) for image in images.values()])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ImageSink(temp_dir, prefix, barcodes=False, image_format='svg', digits=digits).write_many([5])
+            with open(os.path.join(temp_dir, 'qr5.svg'), 'rb') as f:
+                self.assertEqual(size, len(svg_rows(f.read())))
+            with LabelSheet(temp_dir, prefix, digits=digits) as sheet:
+                self.assertEqual(size, len(sheet._qr.rows(5)))
+
+
+class TestCode128(unittest.TestCase):
+
+    def test_patterns(self):
+        """ Every symbol is 11 modules of three bars and three spaces, with an even number of bar modules. """
+        self.assertEqual(107, len(PATTERNS))
+        self.assertEqual(107, len(set(PATTERNS)))
+        for value, pattern in enumerate(PATTERNS[:-1]):
+            widths = [int(width) for width in pattern]
+            self.assertEqual(11, sum(widths), f"symbol {value}")
+            self.assertEqual(0, sum(widths[::2]) % 2, f"symbol {value}")
+        self.assertEqual(13, sum(int(width) for width in PATTERNS[-1]))
+
+    def test_symbols(self):
+        self.assertEqual([105, 12, 34, 82, 106], symbols('1234'))
+        self.assertEqual([105, 0, 5, 12, 106], symbols('0005'))
+        with self.assertRaises(ValueError):
+            symbols('123')
+        with self.assertRaises(ValueError):
+            symbols('12a4')
+
+    def test_render(self):
+        """ The PNG should decode to the modules, one scanline repeated for the height of the bars. """
+        data = '3780'
+        image = Code128CImage(font_size=0)
+        png = image.render(data)
+        self.assertEqual(b'\x89PNG\r\n\x1a\n', png[:8])
+
+        # read the chunks back
+        chunks = {}
+        position = 8
+        while position < len(png):
+            length, kind = struct.unpack('>I4s', png[position:position + 8])
+            chunks[kind] = png[position + 8:position + 8 + length]
+            position += 12 + length
+        width, height, bit_depth, color_type = struct.unpack('>IIBB', chunks[b'IHDR'][:10])
+        self.assertEqual((1, 0), (bit_depth, color_type))
+        raw = zlib.decompress(chunks[b'IDAT'])
+        stride = 1 + (width + 7) // 8
+        self.assertEqual(height * stride, len(raw))
+
+        # the middle row goes through the bars, 1 bits are white
+        row = raw[(height // 2) * stride + 1:(height // 2 + 1) * stride]
+        pixels = ''.join(format(byte, '08b') for byte in row)[:width]
+        dark = ''.join('1' if pixel == '0' else '0' for pixel in pixels).strip('0')
+        expected = ''.join(module * image._module_px for module in modules(data))
+        self.assertEqual(expected.strip('0'), dark)
+
+    def test_svg(self):
+        """ The PNG and SVG have the same pixels, the SVG's bars being a rectangle each. """
+        image = Code128CImage()
+        rows = image.rows('3780')
+        self.assertEqual(rows, png_rows(image.render('3780')))
+        svg = image.render_svg('3780')
+        self.assertEqual(rows, svg_rows(svg))
+        bars = re.findall(r'1+', modules('3780'))
+        self.assertEqual(len(bars), svg.count(f'v{image._bars_px}h'.encode()))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path_file = os.path.join(temp_dir, 'bar3780.svg')
+            Path(path_file).write_bytes(svg[:-2])
+            self.assertFalse(svg_complete(path_file))
+            Path(path_file).write_bytes(svg)
+            self.assertTrue(svg_complete(path_file))
+
+    def test_compress_level(self):
+        self.assertLess(len(Code128CImage(compress_level=9).render('3780')),
+                        len(Code128CImage(compress_level=0).render('3780')))
+
+    def test_png_complete(self):
+        png = Code128CImage().render('3780')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path_file = os.path.join(temp_dir, 'bar3780.png')
+            self.assertFalse(png_complete(path_file))
+            Path(path_file).write_bytes(png[:-1])
+            self.assertFalse(png_complete(path_file))
+            Path(path_file).write_bytes(png)
+            self.assertTrue(png_complete(path_file))
+
+
+class TestSerialFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+
+    def test_round_trip(self):
+        """ Every format reads back what was written, and is only visible under its final name once closed. """
+        numbers = [3780, 4066, 2 ** 64 - 1, 1]
+        for name, writer_class in WRITERS.items():
+            path = tempfile.mkdtemp(dir=self.temp_dir)
+            writer = writer_class(path)
+            writer.write(numbers[0])
+            writer.write_many(numbers[1:])
+            with self.assertRaises(FileNotFoundError):
+                find_serial_file(path)
+            writer.close()
+            self.assertEqual(len(numbers), writer.count)
+            self.assertEqual(writer.path_file, find_serial_file(path))
+            self.assertEqual(numbers, list(read_serial_numbers(writer.path_file)), name)
+            self.assertEqual([writer.path_file], [os.path.join(path, file) for file in os.listdir(path)])
+
+    def test_json_like_dump(self):
+        """ The JSON format is the same as it was before it was streamed. """
+        for numbers in ([], [1], [3780, 4066, 5861]):
+            with JsonWriter(self.temp_dir) as writer:
+                writer.write_many(numbers)
+            with open(writer.path_file) as f:
+                self.assertEqual(json.dumps(numbers, indent=4), f.read())
+
+    def test_resume(self):
+        """ Carrying on from a checkpoint drops what was written after it. """
+        numbers = [3780, 4066, 5861, 1]
+        for name, writer_class in WRITERS.items():
+            path = tempfile.mkdtemp(dir=self.temp_dir)
+            writer = writer_class(path)
+            writer.write_many(numbers[:2])
+            offset = writer.checkpoint()
+            writer.write(7)
+            writer.pause()
+            with writer_class(path, 2, offset) as writer:
+                writer.write_many(numbers[2:])
+            self.assertEqual(numbers, list(read_serial_numbers(writer.path_file)), name)
+
+    def test_abort(self):
+        with self.assertRaises(RuntimeError):
+            with JsonWriter(self.temp_dir) as writer:
+                writer.write(1)
+                raise RuntimeError
+        self.assertEqual([], os.listdir(self.temp_dir))
+
+    def test_incomplete_writer(self):
+        """ A format that doesn't write serial numbers fails before its file is made. """
+        class NoFormat(SerialWriter):
+            extension = '.txt'
+
+        with self.assertRaises(TypeError):
+            NoFormat(self.temp_dir)
+        self.assertEqual([], os.listdir(self.temp_dir))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestLabelSheet(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir: str = tempfile.mkdtemp()
+
+    def test_layout(self):
+        layout = SheetLayout.parse('3x8', 'letter')
+        self.assertEqual(24, layout.labels_per_page)
+        self.assertEqual((layout.margin, layout.page_height - layout.margin - layout.label_height),
+                         layout.position(0))
+        x, y = layout.position(23)
+        self.assertAlmostEqual(layout.page_width - layout.margin, x + layout.label_width)
+        self.assertAlmostEqual(layout.margin, y)
+        for grid in ('3', '3x', 'axb', '0x8', '100x1'):
+            with self.assertRaises(ValueError):
+                SheetLayout.parse(grid)
+
+    def test_pdf(self):
+        """ Pages are added as they fill up, and every object in the cross-reference table is where it says. """
+        layout = SheetLayout(columns=2, rows=5)
+        with LabelSheet(self.temp_dir, layout=layout, qr_codes=False) as sheet:
+            sheet.add_many(range(1000, 1025))
+        self.assertEqual([LabelSheet.name], os.listdir(self.temp_dir))
+        self.assertEqual(25, sheet.count)
+        with open(sheet.path_file, 'rb') as f:
+            pdf = f.read()
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertIn(b'/Count 3 >>', pdf)
+        xref = int(pdf[pdf.rindex(b'startxref') + len(b'startxref'):].split()[0])
+        lines = pdf[xref:].split(b'\n')
+        size = int(lines[1].split()[1])
+        for number in range(1, size):
+            offset = int(lines[2 + number][:10])
+            self.assertTrue(pdf[offset:].startswith(f"{number} 0 obj".encode()), f"object {number}")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
 
 if __name__ == "__main__":
     unittest.main()